@@ -0,0 +1,391 @@
+"""
+Incremental aggregate store for the analytics charts
+Keeps every aggregate the charts read (listing counts by category, city,
+year, month and views range; views and price sums; per-category price
+histograms for exact medians and quantiles; a top-K table of the most viewed
+listings) in SQLite, keyed by ad_id. Adding, updating or removing a listing
+applies only its delta, so chart generation reads O(categories) rows instead
+of rescanning the whole table.
+"""
+
+import bisect
+import csv
+import logging
+import os
+import sqlite3
+
+from normalize import parse_date, parse_price, parse_views
+from sinks import BatchedSink
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 15
+VIEW_BIN_EDGES = (1000, 2000, 3000, 5000, 10000, 30000)
+VIEW_BIN_LABELS = ('0-1K', '1K-2K', '2K-3K', '3K-5K', '5K-10K', '10K+')
+
+# Group dimensions maintained for every listing; 'all' holds the totals
+DIMENSIONS = ('all', 'category', 'city', 'year', 'year_month', 'view_bin')
+LISTING_COLUMNS = ('category', 'city', 'views', 'price', 'year', 'year_month', 'view_bin', 'title')
+
+
+def view_bin(views):
+    """Label of the chart's views range (right-inclusive bins, like pd.cut)"""
+    if views is None or views < 0 or views > VIEW_BIN_EDGES[-1]:
+        return None
+    return VIEW_BIN_LABELS[bisect.bisect_left(VIEW_BIN_EDGES, views)]
+
+
+def listing_contributions(record):
+    """The values one listing contributes to the aggregates, in LISTING_COLUMNS order"""
+    views = parse_views(record.get('views'))
+    posted = parse_date(record.get('date_posted'))
+    return (
+        record.get('category') or None,
+        record.get('city') or None,
+        views,
+        parse_price(record.get('price'))[0],
+        int(posted[:4]) if posted else None,
+        posted[:7] if posted else None,
+        view_bin(views),
+        record.get('title'),
+    )
+
+
+class AggregateStore:
+    """SQLite-backed chart aggregates updated one listing delta at a time"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS listings (
+            ad_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            category TEXT,
+            city TEXT,
+            views INTEGER,
+            price REAL,
+            year INTEGER,
+            year_month TEXT,
+            view_bin TEXT,
+            title TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_listings_views ON listings (views DESC, seq);
+        CREATE TABLE IF NOT EXISTS groups (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            listings INTEGER NOT NULL DEFAULT 0,
+            views_count INTEGER NOT NULL DEFAULT 0,
+            views_sum INTEGER NOT NULL DEFAULT 0,
+            price_count INTEGER NOT NULL DEFAULT 0,
+            price_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        );
+        CREATE TABLE IF NOT EXISTS price_histogram (
+            category TEXT NOT NULL,
+            price REAL NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (category, price)
+        );
+        CREATE TABLE IF NOT EXISTS top_views (
+            ad_id INTEGER PRIMARY KEY,
+            views INTEGER NOT NULL,
+            seq INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    '''
+
+    def __init__(self, path='temirci_aggregates.sqlite', top_k=TOP_K, top_capacity=None):
+        self.path = path
+        self.top_k = top_k
+        # Slack above top_k so a listing dropping out rarely forces a refill from the index
+        self.top_capacity = top_capacity or top_k * 4
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self.next_listing_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM listings').fetchone()[0]
+        self.next_group_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM groups').fetchone()[0]
+        self.deltas_applied = 0
+
+    def apply(self, record):
+        """Fold one scraped record into the aggregates; returns False when nothing changed"""
+        try:
+            ad_id = int(record['ad_id'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        new = listing_contributions(record)
+        row = self.conn.execute(
+            f'SELECT seq, {", ".join(LISTING_COLUMNS)} FROM listings WHERE ad_id = ?', (ad_id,)
+        ).fetchone()
+        if row is not None and tuple(row[1:]) == new:
+            return False
+
+        if row is not None:
+            seq = row[0]
+            self.adjust(row[1:], -1)
+        else:
+            seq = self.next_listing_seq
+            self.next_listing_seq += 1
+        self.conn.execute(
+            f'INSERT OR REPLACE INTO listings (ad_id, seq, {", ".join(LISTING_COLUMNS)}) '
+            f'VALUES (?, ?, {", ".join("?" * len(LISTING_COLUMNS))})',
+            (ad_id, seq, *new)
+        )
+        self.adjust(new, 1)
+        self.update_top(ad_id, new[2], seq)
+        self.deltas_applied += 1
+        return True
+
+    def remove(self, ad_id):
+        row = self.conn.execute(
+            f'SELECT {", ".join(LISTING_COLUMNS)} FROM listings WHERE ad_id = ?', (ad_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        self.adjust(row, -1)
+        self.conn.execute('DELETE FROM listings WHERE ad_id = ?', (ad_id,))
+        self.update_top(ad_id, None, None)
+        self.deltas_applied += 1
+        return True
+
+    def adjust(self, values, sign):
+        """Add (sign=1) or subtract (sign=-1) one listing's contribution to every group"""
+        category, city, views, price, year, year_month, bin_label, _ = values
+        keys = {'all': '', 'category': category, 'city': city, 'year': year,
+                'year_month': year_month, 'view_bin': bin_label}
+        has_views = views is not None
+        has_price = price is not None
+        for dimension in DIMENSIONS:
+            key = keys[dimension]
+            if key is None:
+                continue
+            # Only the category groups carry the price aggregates the charts use
+            priced = has_price and dimension == 'category'
+            self.conn.execute(
+                'INSERT INTO groups (dimension, key, seq) VALUES (?, ?, ?) '
+                'ON CONFLICT (dimension, key) DO NOTHING',
+                (dimension, str(key), self.next_group_seq)
+            )
+            self.next_group_seq += 1
+            self.conn.execute(
+                'UPDATE groups SET listings = listings + ?, views_count = views_count + ?, '
+                'views_sum = views_sum + ?, price_count = price_count + ?, price_sum = price_sum + ? '
+                'WHERE dimension = ? AND key = ?',
+                (sign, sign * has_views, sign * (views or 0), sign * priced,
+                 sign * (price or 0) if priced else 0, dimension, str(key))
+            )
+        if category is not None and has_price:
+            self.conn.execute(
+                'INSERT INTO price_histogram (category, price, n) VALUES (?, ?, ?) '
+                'ON CONFLICT (category, price) DO UPDATE SET n = n + excluded.n',
+                (category, price, sign)
+            )
+            self.conn.execute('DELETE FROM price_histogram WHERE category = ? AND price = ? AND n <= 0',
+                              (category, price))
+
+    def update_top(self, ad_id, views, seq):
+        """Keep top_views equal to the exact top rows (views desc, first seen first) of listings"""
+        self.conn.execute('DELETE FROM top_views WHERE ad_id = ?', (ad_id,))
+        size = self.conn.execute('SELECT COUNT(*) FROM top_views').fetchone()[0]
+        with_views = self.total('views_count')
+        if views is not None:
+            lowest = self.conn.execute(
+                'SELECT views, seq FROM top_views ORDER BY views ASC, seq DESC LIMIT 1'
+            ).fetchone()
+            # Every other listing is already in the table, or this one outranks its last row
+            if size == with_views - 1 or (lowest and (views, -seq) > (lowest[0], -lowest[1])):
+                self.conn.execute('INSERT INTO top_views (ad_id, views, seq) VALUES (?, ?, ?)',
+                                  (ad_id, views, seq))
+                size += 1
+                if size > self.top_capacity:
+                    self.conn.execute(
+                        'DELETE FROM top_views WHERE ad_id IN '
+                        '(SELECT ad_id FROM top_views ORDER BY views ASC, seq DESC LIMIT ?)',
+                        (size - self.top_capacity,)
+                    )
+                    size = self.top_capacity
+        if size < self.top_k and size < with_views:
+            self.refill_top()
+
+    def refill_top(self):
+        self.conn.execute('DELETE FROM top_views')
+        self.conn.execute(
+            'INSERT INTO top_views (ad_id, views, seq) SELECT ad_id, views, seq FROM listings '
+            'WHERE views IS NOT NULL ORDER BY views DESC, seq ASC LIMIT ?',
+            (self.top_capacity,)
+        )
+
+    def total(self, column='listings'):
+        row = self.conn.execute(
+            f"SELECT {column} FROM groups WHERE dimension = 'all' AND key = ''"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def commit(self):
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def sync_csv(self, csv_path):
+        """Apply a full listings CSV as deltas (listings missing from it are removed)
+
+        Skipped when the file's size and mtime match the last synced copy.
+        Returns the number of listings that changed.
+        """
+        stat = os.stat(csv_path)
+        signature = f'{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        if self.get_meta('csv_signature') == signature:
+            return 0
+        before = self.deltas_applied
+        seen = set()
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                self.apply(record)
+                try:
+                    seen.add(int(record['ad_id']))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        stale = [ad_id for (ad_id,) in self.conn.execute('SELECT ad_id FROM listings') if ad_id not in seen]
+        for ad_id in stale:
+            self.remove(ad_id)
+        self.set_meta('csv_signature', signature)
+        self.commit()
+        changed = self.deltas_applied - before
+        logger.info(f"Synced {csv_path} into {self.path}: {changed} listings changed, {len(stale)} removed")
+        return changed
+
+    def groups(self, dimension):
+        """Rows of one dimension with listings, in first-seen order"""
+        return self.conn.execute(
+            'SELECT key, listings, views_count, views_sum, price_count, price_sum FROM groups '
+            'WHERE dimension = ? AND listings > 0 ORDER BY seq',
+            (dimension,)
+        ).fetchall()
+
+    def listing_keys(self, dimension):
+        """(ad_id, key) of every listing for one dimension (key is None when the listing has none)"""
+        return self.conn.execute(f'SELECT ad_id, {dimension} FROM listings').fetchall()
+
+    def price_quantile(self, category, q):
+        """Exact price quantile (linear interpolation, as pandas) from the category histogram"""
+        histogram = self.conn.execute(
+            'SELECT price, n FROM price_histogram WHERE category = ? ORDER BY price', (category,)
+        ).fetchall()
+        count = sum(n for _, n in histogram)
+        if not count:
+            return None
+        position = q * (count - 1)
+
+        def value_at(rank):
+            seen = 0
+            for price, n in histogram:
+                seen += n
+                if rank < seen:
+                    return price
+
+        lower = value_at(int(position))
+        upper = value_at(min(int(position) + 1, count - 1))
+        return lower + (upper - lower) * (position - int(position))
+
+    def top_listings(self, k=None):
+        return self.conn.execute(
+            'SELECT l.ad_id, l.title, l.views, l.category FROM top_views t '
+            'JOIN listings l ON l.ad_id = t.ad_id ORDER BY t.views DESC, t.seq ASC LIMIT ?',
+            (k or self.top_k,)
+        ).fetchall()
+
+    def snapshot(self):
+        """All chart inputs as small pandas objects"""
+        return ChartAggregates(self)
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+class ChartAggregates:
+    """Picklable chart inputs read from an AggregateStore in O(groups) rows"""
+
+    def __init__(self, store):
+        import pandas as pd
+
+        self.total = store.total()
+        # What the listing counts count: 'Providers' when read through dedup.ProviderCounts
+        self.unit = getattr(store, 'unit', 'Listings')
+
+        def counts(dimension, convert=str):
+            rows = store.groups(dimension)
+            return pd.Series([row[1] for row in rows], index=[convert(row[0]) for row in rows],
+                             name='count', dtype='int64')
+
+        # Same ordering as value_counts: most listings first, ties in first-seen order
+        self.category_counts = counts('category').sort_values(ascending=False, kind='stable')
+        self.city_counts = counts('city').sort_values(ascending=False, kind='stable')
+        self.yearly_counts = counts('year', int).sort_index()
+        self.monthly_counts = counts('year_month').sort_index()
+        self.view_bin_counts = counts('view_bin').reindex(list(VIEW_BIN_LABELS), fill_value=0)
+        self.categories = list(counts('category').index)
+
+        rows = store.groups('category')
+        self.category_stats = pd.DataFrame(
+            {
+                'listings': [row[1] for row in rows],
+                'views': [row[3] for row in rows],
+                'avg_views': [row[3] / row[2] if row[2] else float('nan') for row in rows],
+                'price_mean': [row[5] / row[4] if row[4] else float('nan') for row in rows],
+                'price_median': [store.price_quantile(row[0], 0.5) if row[4] else float('nan')
+                                 for row in rows],
+                'price_count': [row[4] for row in rows],
+            },
+            index=pd.Index([row[0] for row in rows], name='category'),
+        )
+        self.top_listings = pd.DataFrame(store.top_listings(), columns=['ad_id', 'title', 'views', 'category'])
+
+
+class AggregateSink(BatchedSink):
+    """Streaming sink that applies every scraped listing to an AggregateStore"""
+
+    def __init__(self, path='temirci_aggregates.sqlite', batch_size=100, **kwargs):
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.store = AggregateStore(path)
+
+    def write_batch(self, records):
+        for record in records:
+            self.store.apply(record)
+        self.store.commit()
+
+    def close(self):
+        super().close()
+        self.store.close()
+
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Sync and inspect the chart aggregate store')
+    parser.add_argument('--csv', default='temirci_listings.csv')
+    parser.add_argument('--store', default='temirci_aggregates.sqlite')
+    args = parser.parse_args()
+
+    import pandas  # noqa: F401  (so the snapshot timing below excludes the import)
+    store = AggregateStore(args.store)
+    started = time.perf_counter()
+    changed = store.sync_csv(args.csv)
+    synced = time.perf_counter() - started
+    started = time.perf_counter()
+    aggregates = store.snapshot()
+    read = time.perf_counter() - started
+    store.close()
+
+    print(f"{aggregates.total} listings, {changed} changed by this sync ({synced * 1000:.1f} ms)")
+    print(f"Read chart aggregates in {read * 1000:.1f} ms")
+    print(aggregates.category_stats.to_string())
+
+
+if __name__ == '__main__':
+    main()
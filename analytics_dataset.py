@@ -0,0 +1,169 @@
+"""
+Typed analytics dataset for the listings CSV
+Preprocesses temirci_listings.csv once into a columnar artifact (Parquet or
+Feather via pyarrow, pickle otherwise) with categorical category/city, int32
+views, datetime date_posted and the price min/max/currency columns from
+normalize.py. The artifact is rebuilt only when the source file's size/mtime
+and content hash change.
+
+This is the load path for ad-hoc analysis of individual listings, and for
+any chart that needs row-level data rather than the aggregates:
+
+    from analytics_dataset import load_dataset
+    df = load_dataset('temirci_listings.csv')
+
+Run directly to build the artifact and print its schema, memory use and load time.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+from normalize import normalize_frame
+
+ARTIFACT_VERSION = 2
+CACHE_DIR = '.analytics_cache'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+        return 'parquet'
+    except ImportError:
+        return 'pickle'
+
+
+def preprocess(df):
+    """Add the derived columns the charts use and narrow every column's dtype"""
+    normalize_frame(df)
+    df['date_posted'] = pd.to_datetime(df['date_posted'], format='ISO8601')
+    df['year'] = df['date_posted'].dt.year.astype('Int16')
+    df['year_month'] = df['date_posted'].dt.strftime('%Y-%m').astype('category')
+
+    # Lower bound of the price (or range), as the charts have always used
+    df['price_numeric'] = df['price_min']
+    df['price_currency'] = df['price_currency'].astype('category')
+
+    views = df['views']
+    df['views'] = views.astype('int32') if views.notna().all() else views.astype('Int32')
+    for column in ('category', 'city'):
+        # Categories in order of first appearance, so value_counts ties break as they do on strings
+        df[column] = pd.Categorical(df[column], categories=df[column].dropna().unique())
+    df['ad_id'] = pd.to_numeric(df['ad_id'], errors='coerce').astype('Int64')
+    return df
+
+
+class AnalyticsDataset:
+    """Artifact + metadata pair for one source CSV"""
+
+    def __init__(self, csv_path='temirci_listings.csv', cache_dir=CACHE_DIR, fmt=None):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.format = fmt or default_format()
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+        extension = {'parquet': 'parquet', 'feather': 'feather', 'pickle': 'pkl'}[self.format]
+        self.artifact_path = os.path.join(cache_dir, f'{name}.{extension}')
+        self.meta_path = os.path.join(cache_dir, f'{name}.meta.json')
+
+    def source_signature(self):
+        stat = os.stat(self.csv_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def is_fresh(self):
+        """Cheap size/mtime check first; fall back to the content hash when only mtime moved"""
+        if not (os.path.exists(self.artifact_path) and os.path.exists(self.meta_path)):
+            return False
+        with open(self.meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != ARTIFACT_VERSION or meta.get('format') != self.format:
+            return False
+        signature = self.source_signature()
+        if meta['size'] == signature['size'] and meta['mtime_ns'] == signature['mtime_ns']:
+            return True
+        if meta['size'] == signature['size'] and meta['sha256'] == file_sha256(self.csv_path):
+            self.write_meta(meta['sha256'])
+            return True
+        return False
+
+    def write_meta(self, sha256):
+        meta = {'version': ARTIFACT_VERSION, 'format': self.format, 'source': self.csv_path,
+                'sha256': sha256, **self.source_signature()}
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def build(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        df = preprocess(pd.read_csv(self.csv_path))
+        tmp_path = self.artifact_path + '.tmp'
+        if self.format == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        elif self.format == 'feather':
+            df.to_feather(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, self.artifact_path)
+        self.write_meta(file_sha256(self.csv_path))
+        return df
+
+    def load(self):
+        """Typed DataFrame, rebuilding the artifact first if the CSV changed"""
+        if not self.is_fresh():
+            return self.build()
+        return read_artifact(self.artifact_path)
+
+
+def read_artifact(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return pd.read_pickle(path)
+
+
+def load_dataset(csv_path='temirci_listings.csv', cache_dir=CACHE_DIR):
+    """Load the typed listings dataset, using the cached artifact when it is current"""
+    return AnalyticsDataset(csv_path, cache_dir).load()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Build and inspect the typed analytics dataset')
+    parser.add_argument('--csv', default='temirci_listings.csv')
+    parser.add_argument('--format', choices=['parquet', 'feather', 'pickle'])
+    parser.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+
+    dataset = AnalyticsDataset(args.csv, fmt=args.format)
+    if args.rebuild or not dataset.is_fresh():
+        started = time.perf_counter()
+        dataset.build()
+        print(f"Built {dataset.artifact_path} in {time.perf_counter() - started:.3f}s")
+
+    started = time.perf_counter()
+    raw = pd.read_csv(args.csv)
+    csv_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    df = dataset.load()
+    artifact_seconds = time.perf_counter() - started
+
+    print(df.dtypes.to_string())
+    print(f"\nRows: {len(df)}")
+    print(f"Raw CSV:  {csv_seconds * 1000:.1f} ms to read (before preprocessing), "
+          f"{raw.memory_usage(deep=True).sum() / 1024:.0f} KiB")
+    print(f"Artifact: {artifact_seconds * 1000:.1f} ms to load, "
+          f"{df.memory_usage(deep=True).sum() / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Crawl benchmark against the local stub server
+Runs the original category-by-category crawl and the work-queue crawl over the
+same synthetic catalog and reports wall-clock time and pages/sec for each
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from scraper import TemirciScraper
+from stub_server import StubCatalog, start_stub_server
+
+
+async def run_crawl(base_url, mode, max_concurrent, rate):
+    scraper = TemirciScraper(base_url=base_url, max_concurrent=max_concurrent,
+                             requests_per_second=rate)
+    started = time.monotonic()
+    if mode == 'sequential':
+        await scraper.scrape_all_sequential()
+    else:
+        await scraper.scrape_all()
+    elapsed = time.monotonic() - started
+    return {
+        'mode': mode,
+        'listings': len(scraper.all_listings),
+        'pages': scraper.pages_fetched,
+        'seconds': elapsed,
+        'pages_per_sec': scraper.pages_per_second(),
+    }
+
+
+async def run_benchmark(args):
+    catalog = StubCatalog(
+        categories=args.categories,
+        ads_per_page=args.ads_per_page,
+        max_pages=args.max_pages,
+    )
+    runner, base_url = await start_stub_server(catalog, latency=args.latency)
+    try:
+        results = []
+        for mode in ('sequential', 'pipeline'):
+            results.append(await run_crawl(base_url, mode, args.max_concurrent, args.rate))
+    finally:
+        await runner.cleanup()
+
+    print(f"Catalog: {len(catalog.categories)} categories, {catalog.total_ads} ads, "
+          f"latency {args.latency * 1000:.0f} ms, max_concurrent {args.max_concurrent}, "
+          f"rate {args.rate:g} req/s")
+    print(f"{'mode':<12}{'listings':>10}{'pages':>8}{'seconds':>10}{'pages/sec':>12}")
+    for result in results:
+        print(f"{result['mode']:<12}{result['listings']:>10}{result['pages']:>8}"
+              f"{result['seconds']:>10.2f}{result['pages_per_sec']:>12.2f}")
+    speedup = results[0]['seconds'] / results[1]['seconds']
+    print(f"Wall-clock speedup: {speedup:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--ads-per-page', type=int, default=12)
+    parser.add_argument('--max-pages', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub response delay in seconds')
+    parser.add_argument('--max-concurrent', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=1000,
+                        help='Scraper requests/sec limit; the default is well above what the stub serves, '
+                             'so neither crawl is throttled')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+End-to-end crawl benchmark suite
+Runs scrape_all against the local stub server for each catalog size and
+reports throughput, p50/p99 fetch latency, peak RSS and CPU time per listing.
+The stub server and every crawl run in their own processes, so the numbers
+belong to the scraper alone. Results can be saved as a baseline and later runs
+compared against it, failing when a metric regresses beyond --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+
+def serve_stub(options, ready):
+    """Process target: serve the stub catalog until terminated"""
+    from stub_server import StubCatalog, start_stub_server
+
+    async def run():
+        catalog = StubCatalog(categories=options['categories'], ads_per_page=options['ads_per_page'],
+                              ads=options['ads'])
+        runner, base_url = await start_stub_server(
+            catalog, latency=options['latency'], jitter=options['jitter'],
+            error_rate=options['error_rate'])
+        ready.put((base_url, catalog.total_ads, catalog.total_pages))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def run_crawl(base_url, options, results):
+    """Process target: one scrape_all over the stub, reporting its own resource usage"""
+    from scraper import TemirciScraper
+    from sinks import JsonlSink
+    logging.getLogger().setLevel(logging.WARNING)
+
+    sinks = []
+    if options['stream']:
+        sinks.append(JsonlSink(os.path.join(options['workdir'], 'listings.jsonl'), batch_size=500))
+    scraper = TemirciScraper(base_url=base_url, max_concurrent=options['max_concurrent'],
+                             requests_per_second=options['rate'], parser=options['parser'],
+                             parse_executor=options['parse_executor'], sinks=sinks,
+                             keep_listings=False)
+    started = time.perf_counter()
+    asyncio.run(scraper.scrape_all())
+    elapsed = time.perf_counter() - started
+    for sink in sinks:
+        sink.close()
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)  # parse pool workers
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    network = scraper.metrics.histograms.get(('network_seconds', ()))
+    listings = scraper.listings_scraped
+    errors = sum(count for (name, labels), count in scraper.metrics.counters.items()
+                 if name == 'request_errors' or (name == 'responses' and dict(labels)['status'] != 200))
+    results.put({
+        'listings': listings,
+        'pages': scraper.pages_fetched,
+        'seconds': elapsed,
+        'listings_per_sec': listings / elapsed if elapsed else 0.0,
+        'pages_per_sec': scraper.pages_per_second(),
+        'fetch_p50_ms': network.quantile(0.5) * 1000 if network else None,
+        'fetch_p99_ms': network.quantile(0.99) * 1000 if network else None,
+        'peak_rss_mb': own.ru_maxrss / 1024,
+        'worker_peak_rss_mb': children.ru_maxrss / 1024,
+        'cpu_ms_per_listing': cpu / listings * 1000 if listings else None,
+        'errors': errors,
+    })
+
+
+def run_size(context, args, ads, workdir):
+    ready = context.Queue()
+    stub = context.Process(target=serve_stub, daemon=True, args=({
+        'ads': ads, 'categories': args.categories, 'ads_per_page': args.ads_per_page,
+        'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+    }, ready))
+    stub.start()
+    try:
+        base_url, total_ads, total_pages = ready.get(timeout=60)
+        results = context.Queue()
+        crawl = context.Process(target=run_crawl, args=(base_url, {
+            'max_concurrent': args.max_concurrent, 'rate': args.rate, 'parser': args.parser,
+            'parse_executor': args.parse_executor, 'stream': args.stream, 'workdir': workdir,
+        }, results))
+        crawl.start()
+        result = results.get()
+        crawl.join()
+    finally:
+        stub.terminate()
+        stub.join()
+    result.update({'ads': total_ads, 'expected_pages': total_pages})
+    return result
+
+
+# Metric -> True when higher is better
+COMPARED_METRICS = {
+    'listings_per_sec': True,
+    'fetch_p99_ms': False,
+    'peak_rss_mb': False,
+    'cpu_ms_per_listing': False,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a saved baseline, as printable lines"""
+    regressions = []
+    for ads, result in results.items():
+        previous = baseline.get(str(ads))
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{ads} ads: {metric} {old:.2f} -> {new:.2f} ({change:+.0%})")
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(float(size.lower().replace('k', 'e3').replace('m', 'e6'))) for size in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end scrape_all benchmark against the stub server')
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes('1k,10k'),
+                        help='Comma-separated catalog sizes, e.g. 1k,10k,100k,1m')
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--ads-per-page', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=0.01, help='Stub response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Latency variation as a fraction of --latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that fail')
+    parser.add_argument('--max-concurrent', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=2000, help='Scraper requests/sec limit')
+    parser.add_argument('--parser', default='auto')
+    parser.add_argument('--parse-executor', default='process', choices=['process', 'thread', 'inline'])
+    parser.add_argument('--stream', action='store_true', help='Include a JSONL sink, as production crawls do')
+    parser.add_argument('--save', metavar='PATH', help='Write results as JSON (e.g. a new baseline)')
+    parser.add_argument('--compare', metavar='PATH', help='Baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative regression per metric before failing')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for ads in args.sizes:
+            results[ads] = run_size(context, args, ads, workdir)
+
+    print(f"Stub latency {args.latency * 1000:.0f} ms (+/-{args.jitter:.0%}), error rate {args.error_rate:.1%}; "
+          f"max_concurrent {args.max_concurrent}, rate {args.rate:g} req/s, parser {args.parser}, "
+          f"{args.parse_executor} parse executor")
+    print(f"{'ads':>9}{'listings':>10}{'seconds':>9}{'listings/s':>12}{'pages/s':>9}"
+          f"{'p50 ms':>8}{'p99 ms':>8}{'RSS MB':>8}{'wkr MB':>8}{'CPU ms/lst':>11}{'errors':>8}")
+    for ads, r in results.items():
+        print(f"{ads:>9}{r['listings']:>10}{r['seconds']:>9.2f}{r['listings_per_sec']:>12.1f}"
+              f"{r['pages_per_sec']:>9.1f}{r['fetch_p50_ms'] or 0:>8.1f}{r['fetch_p99_ms'] or 0:>8.1f}"
+              f"{r['peak_rss_mb']:>8.1f}{r['worker_peak_rss_mb']:>8.1f}"
+              f"{r['cpu_ms_per_listing'] or 0:>11.3f}{r['errors']:>8}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({str(ads): result for ads, result in results.items()}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
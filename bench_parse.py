@@ -0,0 +1,175 @@
+"""
+Parsing micro-benchmark for the engines in parsers.py
+Measures CPU time per page for ad pages and category pages and checks that
+every engine extracts exactly what the BeautifulSoup reference engine does.
+
+The partial_fetch.py field scanner used by refresh crawls gets its own row:
+CPU time for the default refresh fields and the share of each page a
+streamed read would download before stopping.
+
+Pages come from a fixtures directory (DIR/ads/*.html and DIR/pages/*.html),
+from an HTTP cache file written by `scraper.py --http-cache`, or, when neither
+is given, from the stub server's synthetic markup.
+"""
+
+import argparse
+import codecs
+import glob
+import os
+import time
+
+from parsers import PARSER_ENGINES, SoupParser
+from partial_fetch import DEFAULT_FIELDS, FIELD_RULES, FieldScanner, scan_fields
+
+
+# Always part of the mismatch checks: nested divs inside the containers the fields are read from
+NESTED_AD_PAGE = '''<html><head>
+<meta content="https://www.temirci.az/image/elan/1.jpg" property="og:image">
+</head><body>
+<h1>usta xidmeti</h1>
+<div class="gallery-price"><div class="badge">Yeni</div><span class="price-val">30</span> <span class="price-cur">AZN</span></div>
+<div class="city"><div class="icon"></div>Şəhər: <span><b>Gəncə</b></span></div>
+<div class="text">Temir xidmeti</div>
+<div class="info">
+<div class="row"><div class="label">Elan</div></div>
+<p class="views">Baxış: <b>123</b></p>
+<div class="row"></div>
+<p class="date">Tarix: <b>2024-02-03 10:00</b></p>
+</div>
+</body></html>'''
+
+
+def load_fixture_dir(path):
+    pages = {'ads': [], 'pages': []}
+    for kind in pages:
+        for filename in sorted(glob.glob(os.path.join(path, kind, '*.html'))):
+            with open(filename, encoding='utf-8') as f:
+                pages[kind].append(f.read())
+    return pages
+
+
+def load_http_cache(path):
+    from http_cache import HttpCache
+    cache = HttpCache(path, offline=True)
+    pages = {'ads': [], 'pages': []}
+    for (url,) in cache.conn.execute('SELECT url FROM responses').fetchall():
+        kind = 'ads' if '/ads/' in url else 'pages'
+        pages[kind].append(cache.get(url)['body'])
+    cache.conn.close()
+    return pages
+
+
+def load_stub_pages(count):
+    from stub_server import StubCatalog, render_ad_page, render_category_page
+    catalog = StubCatalog(categories=1, min_pages=5, max_pages=5)
+    category = catalog.categories[0]
+    return {
+        'ads': [render_ad_page(ad_id) for ad_id in range(1000, 1000 + count)],
+        'pages': [render_category_page(catalog, category, num) for num in range(1, 6)],
+    }
+
+
+def time_engine(engine, pages, repeat):
+    """CPU seconds per page for detail pages and for listing/pagination pages"""
+    started = time.process_time()
+    for _ in range(repeat):
+        for html in pages['ads']:
+            engine.listing_detail(html)
+    detail = (time.process_time() - started) / max(1, repeat * len(pages['ads']))
+
+    started = time.process_time()
+    for _ in range(repeat):
+        for html in pages['pages']:
+            engine.listing_urls(html, 'https://www.temirci.az')
+            engine.total_pages(html)
+    listing = (time.process_time() - started) / max(1, repeat * len(pages['pages']))
+    return detail, listing
+
+
+def count_mismatches(engine, reference, pages):
+    mismatches = 0
+    for html in [*pages['ads'], NESTED_AD_PAGE]:
+        if engine.listing_detail(html) != reference.listing_detail(html):
+            mismatches += 1
+    for html in pages['pages']:
+        if (engine.listing_urls(html, 'https://www.temirci.az') != reference.listing_urls(html, 'https://www.temirci.az')
+                or engine.total_pages(html) != reference.total_pages(html)):
+            mismatches += 1
+    return mismatches
+
+
+def bytes_until_found(html, fields, chunk_size=16384):
+    """Body bytes a streamed read of html takes before every field is found"""
+    body = html.encode('utf-8')
+    scanner = FieldScanner(fields)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for offset in range(0, len(body), chunk_size):
+        if scanner.feed(decoder.decode(body[offset:offset + chunk_size])):
+            return min(offset + chunk_size, len(body))
+    return len(body)
+
+
+def time_field_scan(reference, pages, repeat, fields=DEFAULT_FIELDS):
+    """(CPU seconds per ad page, mismatches against reference, share of body bytes read)
+
+    The mismatch check covers every scannable field, not only the timed ones.
+    """
+    started = time.process_time()
+    for _ in range(repeat):
+        for html in pages['ads']:
+            scan_fields(html, fields)
+    per_page = (time.process_time() - started) / max(1, repeat * len(pages['ads']))
+    mismatches = 0
+    for html in [*pages['ads'], NESTED_AD_PAGE]:
+        expected = reference.listing_detail(html)
+        if scan_fields(html, FIELD_RULES) != {field: expected[field] for field in FIELD_RULES}:
+            mismatches += 1
+    read = sum(bytes_until_found(html, fields) for html in pages['ads'])
+    total = sum(len(html.encode('utf-8')) for html in pages['ads'])
+    return per_page, mismatches, read / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-page CPU cost of each HTML parsing engine')
+    parser.add_argument('--fixtures', help='Directory with ads/*.html and pages/*.html')
+    parser.add_argument('--http-cache', help='Read pages from a scraper HTTP cache file')
+    parser.add_argument('--stub-pages', type=int, default=200, help='Synthetic ad pages when no fixtures are given')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = load_fixture_dir(args.fixtures)
+    elif args.http_cache:
+        pages = load_http_cache(args.http_cache)
+    else:
+        pages = load_stub_pages(args.stub_pages)
+    print(f"{len(pages['ads'])} ad pages, {len(pages['pages'])} category pages, repeat {args.repeat}")
+
+    reference = SoupParser()
+    results = {}
+    for name, factory in PARSER_ENGINES.items():
+        try:
+            engine = factory()
+        except ImportError:
+            results[name] = None
+            continue
+        detail, listing = time_engine(engine, pages, args.repeat)
+        results[name] = (detail, listing, count_mismatches(engine, reference, pages))
+
+    baseline = results['soup'][0]
+    print(f"{'engine':<12}{'detail us/page':>16}{'list us/page':>14}{'speedup':>9}{'mismatches':>12}")
+    for name, result in results.items():
+        if result is None:
+            print(f"{name:<12}{'not installed':>16}")
+            continue
+        detail, listing, mismatches = result
+        print(f"{name:<12}{detail * 1e6:>16.0f}{listing * 1e6:>14.0f}"
+              f"{baseline / detail:>8.1f}x{mismatches:>12}")
+
+    scan, mismatches, read_share = time_field_scan(reference, pages, args.repeat)
+    print(f"{'scan':<12}{scan * 1e6:>16.0f}{'-':>14}{baseline / scan:>8.1f}x{mismatches:>12}"
+          f"   ({', '.join(DEFAULT_FIELDS)}; {read_share:.0%} of body bytes read)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Startup benchmark for the temirci.py subcommands
+Runs each subcommand in a fresh interpreter under `python -X importtime`
+and reports the wall time, the total time spent importing, the heaviest
+top-level imports and which of the heavy dependencies were loaded. The quick
+commands (stats, export --format jsonl, crawl --help) are checked against
+--budget.
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('aiohttp', 'bs4', 'lxml', 'numpy', 'pandas', 'matplotlib', 'seaborn', 'pyarrow')
+
+
+def parse_importtime(stderr):
+    """({module: (self_us, cumulative_us)}, [(cumulative_us, module)] of the top-level imports)"""
+    modules = {}
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        module = name.strip()
+        modules[module] = (int(self_us), int(cumulative_us))
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(' '):
+            top_level.append((int(cumulative_us), module))
+    return modules, sorted(top_level, reverse=True)
+
+
+def run(command, repeat):
+    """Best wall time of repeat runs and the import profile of the last one"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', 'temirci.py', *command],
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise SystemExit(f"temirci.py {' '.join(command)} failed:\n{result.stderr[-2000:]}")
+        best = elapsed if best is None else min(best, elapsed)
+    return best, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time and imports of each temirci.py subcommand')
+    parser.add_argument('--csv', default='temirci_listings.csv', help='Listings the commands read')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per command (the best is reported)')
+    parser.add_argument('--budget', type=float, default=1.0, help='Seconds allowed for the quick commands')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        stream = os.path.join(workdir, 'listings.jsonl')
+        with open(args.csv, newline='', encoding='utf-8') as f, open(stream, 'w', encoding='utf-8') as out:
+            for record in csv.DictReader(f):
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        quick = {
+            'stats': ['stats', '--csv', args.csv, '--aggregates', os.path.join(workdir, 'aggregates.sqlite')],
+            'export --format jsonl': ['export', '--stream', stream, '--format', 'jsonl',
+                                      '-o', os.path.join(workdir, 'latest.jsonl')],
+            'crawl --help': ['crawl', '--help'],
+        }
+        others = {
+            'charts --help': ['charts', '--help'],
+        }
+
+        print(f"{'command':<24}{'wall s':>8}{'import s':>10}{'modules':>9}  heavy dependencies loaded")
+        failed = []
+        for label, command in {**quick, **others}.items():
+            elapsed, (modules, top_level) = run(command, args.repeat)
+            imported = sum(self_us for self_us, _ in modules.values()) / 1e6
+            heavy = [name for name in HEAVY_MODULES if name in modules]
+            print(f"{label:<24}{elapsed:>8.3f}{imported:>10.3f}{len(modules):>9}  {', '.join(heavy) or '-'}")
+            print(' ' * 26 + 'slowest: ' + ', '.join(f"{module} {us / 1000:.0f} ms" for us, module in top_level[:4]))
+            if label in quick and elapsed > args.budget:
+                failed.append(label)
+
+    if failed:
+        raise SystemExit(f"Over the {args.budget:.1f}s budget: {', '.join(failed)}")
+    print(f"Quick commands start in under {args.budget:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+"""
+Near-duplicate listing detection and provider clustering
+Each listing's title and description are folded (see search_index.fold),
+cut into character shingles and summarized by a MinHash signature. The
+signatures are split into LSH bands stored in SQLite, so a new listing is
+only compared with the listings that share a band bucket with it, never with
+the whole catalog, and a candidate pair is kept when the signatures agree on
+at least --threshold of their positions (the estimated Jaccard similarity).
+
+Listings joined by kept pairs form near-duplicate clusters; clusters that
+share a phone number form providers. Both ids are the smallest ad_id in the
+group. generate_charts.py --providers counts providers instead of listings.
+
+    python dedup.py build temirci_listings.csv
+    python dedup.py providers --top 10
+"""
+
+import argparse
+import csv
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from aggregate_store import ChartAggregates
+from normalize import parse_phone
+from search_index import fold
+from sinks import BatchedSink, read_jsonl
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 61) - 1
+# Site prefix and the trailing ad number that every scraped title carries
+TITLE_NOISE = re.compile(r'^\s*temirci\s*-\s*|\s+\d+\s*$', re.IGNORECASE)
+WORD = re.compile(r'\w+')
+
+
+def listing_text(record):
+    """Folded title and description with punctuation and site boilerplate removed"""
+    title = TITLE_NOISE.sub('', record.get('title') or '')
+    return ' '.join(WORD.findall(fold(f"{title} {record.get('description') or ''}")))
+
+
+def shingles(text, size=5):
+    """Set of overlapping character n-grams of text"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from num_perm universal hash permutations of the shingle CRCs"""
+
+    def __init__(self, num_perm=128, seed=1):
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = generator.randint(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, items):
+        """uint32 signature of a set of strings; None for an empty set"""
+        if not items:
+            return None
+        hashes = np.fromiter((zlib.crc32(item.encode('utf-8')) for item in items), dtype=np.uint64,
+                             count=len(items))
+        # (a * x + b) wraps modulo 2**64 before the prime; still a fixed permutation per column
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(MERSENNE_PRIME)
+        return (permuted & np.uint64(0xffffffff)).min(axis=0).astype(np.uint32)
+
+
+def similarity(signature, others):
+    """Estimated Jaccard similarity of signature to each row of others"""
+    return (others == signature).mean(axis=1)
+
+
+class DedupIndex:
+    """MinHash signatures, LSH band buckets, verified near-duplicate pairs and the cluster assignment"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS signatures (
+            ad_id INTEGER PRIMARY KEY,
+            phone TEXT,
+            text_hash TEXT,
+            signature BLOB
+        );
+        CREATE INDEX IF NOT EXISTS idx_signatures_phone ON signatures (phone);
+        CREATE TABLE IF NOT EXISTS buckets (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            ad_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, ad_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_buckets_ad_id ON buckets (ad_id);
+        CREATE TABLE IF NOT EXISTS pairs (
+            a INTEGER NOT NULL,
+            b INTEGER NOT NULL,
+            similarity REAL NOT NULL,
+            PRIMARY KEY (a, b)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_pairs_b ON pairs (b);
+        CREATE TABLE IF NOT EXISTS clusters (
+            ad_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER NOT NULL,
+            provider_id INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_clusters_provider ON clusters (provider_id);
+    '''
+
+    def __init__(self, path='temirci_dedup.sqlite', threshold=0.7, num_perm=128, bands=16,
+                 shingle_size=5, max_bucket=8):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Listings compared per bucket: a new copy of a text posted thousands of times links to
+        # its newest copies only, which keeps inserts O(bands * max_bucket) and the cluster intact
+        self.max_bucket = max_bucket
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.check_parameters(num_perm, shingle_size)
+        self.hasher = MinHasher(num_perm)
+        self.dirty = False
+
+    def check_parameters(self, num_perm, shingle_size):
+        """Signatures and buckets are only comparable under the parameters they were built with"""
+        stored = dict(self.conn.execute('SELECT key, value FROM meta'))
+        wanted = {'num_perm': str(num_perm), 'bands': str(self.bands), 'shingle_size': str(shingle_size)}
+        if not stored:
+            with self.conn:
+                self.conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', wanted.items())
+        elif stored != wanted:
+            raise ValueError(f"{self.path} was built with {stored}, not {wanted}; use a new index file")
+
+    def band_keys(self, signature):
+        return [
+            int.from_bytes(hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                           digest_size=8).digest(), 'big', signed=True)
+            for band in range(self.bands)
+        ]
+
+    def upsert_many(self, records):
+        """Add or update a batch of listings in one transaction; returns how many were (re)hashed"""
+        listings = {}
+        for record in records:
+            try:
+                ad_id = int(record['ad_id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            text = listing_text(record)
+            listings[ad_id] = (parse_phone(record.get('phone')), text,
+                               hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest())
+        if not listings:
+            return 0
+
+        with self.conn:
+            previous = dict(self.conn.execute(
+                f'SELECT ad_id, text_hash FROM signatures WHERE ad_id IN ({",".join("?" * len(listings))})',
+                list(listings)
+            ))
+            self.conn.executemany('UPDATE signatures SET phone = ? WHERE ad_id = ?',
+                                  [(phone, ad_id) for ad_id, (phone, _, _) in listings.items() if ad_id in previous])
+            changed = [ad_id for ad_id, listing in listings.items() if previous.get(ad_id, '') != listing[2]]
+            for ad_id in changed:
+                phone, text, text_hash = listings[ad_id]
+                if ad_id in previous:
+                    self.forget(ad_id)
+                signature = self.hasher.signature(shingles(text, self.shingle_size))
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO signatures (ad_id, phone, text_hash, signature) VALUES (?, ?, ?, ?)',
+                    (ad_id, phone, text_hash, None if signature is None else signature.tobytes())
+                )
+                if signature is not None:
+                    self.link(ad_id, signature)
+        self.dirty = True
+        return len(changed)
+
+    def link(self, ad_id, signature):
+        """Record ad_id's band buckets and its verified pairs with the listings already in them"""
+        keys = self.band_keys(signature)
+        candidates = set()
+        for band, bucket in enumerate(keys):
+            candidates.update(candidate for (candidate,) in self.conn.execute(
+                'SELECT ad_id FROM buckets WHERE band = ? AND bucket = ? ORDER BY ad_id DESC LIMIT ?',
+                (band, bucket, self.max_bucket)
+            ))
+        self.conn.executemany('INSERT OR IGNORE INTO buckets (band, bucket, ad_id) VALUES (?, ?, ?)',
+                              [(band, bucket, ad_id) for band, bucket in enumerate(keys)])
+        candidates.discard(ad_id)
+        if not candidates:
+            return
+        rows = self.conn.execute(
+            f'SELECT ad_id, signature FROM signatures WHERE ad_id IN ({",".join("?" * len(candidates))})',
+            list(candidates)
+        ).fetchall()
+        others = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint32).reshape(len(rows), -1)
+        scores = similarity(signature, others)
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO pairs (a, b, similarity) VALUES (?, ?, ?)',
+            [(min(ad_id, row[0]), max(ad_id, row[0]), float(score))
+             for row, score in zip(rows, scores) if score >= self.threshold]
+        )
+
+    def forget(self, ad_id):
+        self.conn.execute('DELETE FROM buckets WHERE ad_id = ?', (ad_id,))
+        self.conn.execute('DELETE FROM pairs WHERE a = ? OR b = ?', (ad_id, ad_id))
+
+    def remove(self, ad_id):
+        with self.conn:
+            self.forget(ad_id)
+            self.conn.execute('DELETE FROM signatures WHERE ad_id = ?', (ad_id,))
+        self.dirty = True
+
+    def import_file(self, path, batch_size=1000):
+        """Add every record of a listings CSV or JSONL file; returns how many were (re)hashed"""
+        if path.endswith('.jsonl'):
+            return self.upsert_all(read_jsonl(path), batch_size)
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.upsert_all(csv.DictReader(f), batch_size)
+
+    def upsert_all(self, records, batch_size=1000):
+        count = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                count += self.upsert_many(batch)
+                batch = []
+        return count + self.upsert_many(batch)
+
+    def assign(self):
+        """Recompute cluster and provider ids with union-find over pairs and phones; O(listings + pairs)"""
+        parent = {}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        def union(x, y):
+            x, y = find(x), find(y)
+            if x != y:
+                # The smaller ad_id is the root, so ids are stable as listings are added
+                parent[max(x, y)] = min(x, y)
+
+        phones = {}
+        for ad_id, phone in self.conn.execute('SELECT ad_id, phone FROM signatures'):
+            parent[ad_id] = ad_id
+            phones[ad_id] = phone
+        for a, b in self.conn.execute('SELECT a, b FROM pairs'):
+            if a in parent and b in parent:
+                union(a, b)
+        clusters = {ad_id: find(ad_id) for ad_id in parent}
+
+        first_with_phone = {}
+        for ad_id, phone in phones.items():
+            if phone:
+                union(ad_id, first_with_phone.setdefault(phone, ad_id))
+        with self.conn:
+            self.conn.execute('DELETE FROM clusters')
+            self.conn.executemany('INSERT INTO clusters (ad_id, cluster_id, provider_id) VALUES (?, ?, ?)',
+                                  [(ad_id, cluster_id, find(ad_id)) for ad_id, cluster_id in clusters.items()])
+        self.dirty = False
+        return len(set(clusters.values())), len({find(ad_id) for ad_id in parent})
+
+    def providers(self):
+        """{ad_id: provider_id} for every indexed listing"""
+        if self.dirty:
+            self.assign()
+        return dict(self.conn.execute('SELECT ad_id, provider_id FROM clusters'))
+
+    def largest_providers(self, k=10):
+        """(provider_id, listings, clusters, phones) of the k providers with the most listings"""
+        if self.dirty:
+            self.assign()
+        return self.conn.execute(
+            'SELECT c.provider_id, COUNT(*), COUNT(DISTINCT c.cluster_id), GROUP_CONCAT(DISTINCT s.phone) '
+            'FROM clusters c JOIN signatures s ON s.ad_id = c.ad_id '
+            'GROUP BY c.provider_id ORDER BY COUNT(*) DESC, c.provider_id LIMIT ?', (k,)
+        ).fetchall()
+
+    def close(self):
+        if self.dirty:
+            self.assign()
+        self.conn.commit()
+        self.conn.close()
+
+
+class ProviderCounts:
+    """Chart store wrapper that counts distinct providers instead of listings per category and city
+
+    Everything else (views, prices, time series, top listings) is read from
+    the wrapped AggregateStore or ListingDatabase unchanged. A listing missing
+    from the dedup index counts as its own provider.
+    """
+
+    unit = 'Providers'
+    DIMENSIONS = ('category', 'city')
+
+    def __init__(self, store, providers):
+        self.store = store
+        self.providers = providers
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def provider(self, ad_id):
+        return self.providers.get(ad_id, ad_id)
+
+    def total(self):
+        return len({self.provider(ad_id) for ad_id, _ in self.store.listing_keys('category')})
+
+    def groups(self, dimension):
+        rows = self.store.groups(dimension)
+        if dimension not in self.DIMENSIONS:
+            return rows
+        providers = defaultdict(set)
+        for ad_id, key in self.store.listing_keys(dimension):
+            if key is not None:
+                providers[key].add(self.provider(ad_id))
+        return [(row[0], len(providers[row[0]]), *row[2:]) for row in rows]
+
+    def snapshot(self):
+        return ChartAggregates(self)
+
+
+class DedupSink(BatchedSink):
+    """Streaming sink that adds every scraped listing to a DedupIndex"""
+
+    def __init__(self, path='temirci_dedup.sqlite', batch_size=100, **kwargs):
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.index = DedupIndex(path)
+
+    def write_batch(self, records):
+        self.index.upsert_many(records)
+
+    def close(self):
+        super().close()
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster near-duplicate listings into providers')
+    parser.add_argument('--index', default='temirci_dedup.sqlite')
+    parser.add_argument('--threshold', type=float, default=0.7,
+                        help='Minimum estimated Jaccard similarity of a near-duplicate pair')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Add listings CSV/JSONL files to the index (incremental)')
+    build.add_argument('files', nargs='+')
+    providers = commands.add_parser('providers', help='Show the providers with the most listings')
+    providers.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    index = DedupIndex(args.index, threshold=args.threshold)
+    if args.command == 'build':
+        for path in args.files:
+            started = time.perf_counter()
+            count = index.import_file(path)
+            elapsed = time.perf_counter() - started
+            print(f"{path}: {count} listings hashed in {elapsed:.2f}s")
+        started = time.perf_counter()
+        clusters, provider_count = index.assign()
+        listings = index.conn.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+        pairs = index.conn.execute('SELECT COUNT(*) FROM pairs').fetchone()[0]
+        print(f"{args.index}: {listings} listings, {pairs} near-duplicate pairs, {clusters} clusters, "
+              f"{provider_count} providers (assigned in {time.perf_counter() - started:.2f}s)")
+    else:
+        for provider_id, listings, clusters, phones in index.largest_providers(args.top):
+            print(f"{provider_id:>9}  {listings:>6} listings  {clusters:>5} clusters  {phones or '-'}")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
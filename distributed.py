@@ -0,0 +1,556 @@
+"""
+Distributed crawl: one coordinator, many workers
+The coordinator owns the frontier (categories from get_categories, category
+pages and ad URLs) in SQLite. Workers on this or other hosts lease batches
+of jobs over HTTP, fetch and parse them with a TemirciScraper, and send back
+the records and newly discovered jobs with their next lease request. The
+coordinator writes records to the sinks and holds the global rate limit: a
+job is only leased against a token from its bucket, and a Retry-After seen
+by any worker pauses every worker. Leases expire, so the jobs of a crashed
+worker are handed out again.
+
+    python distributed.py coordinator --port 8770 --rate 20
+    python distributed.py worker --coordinator http://127.0.0.1:8770   # on each host
+    python distributed.py local --workers 4   # coordinator plus 4 worker processes
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+
+from aggregate_store import AggregateSink
+from frontier import DONE, FAILED, IN_FLIGHT, PENDING, Frontier
+from http_cache import HttpCache
+from listing_db import ListingDatabaseSink
+from metrics import CrawlMetrics
+from rate_limit import TokenBucket
+from scraper import TemirciScraper
+from search_index import SearchSink
+from sinks import JsonlSink, ParquetSink, export_stream
+from transport import create_session
+
+logger = logging.getLogger(__name__)
+
+# How long an idle worker waits before asking for jobs again
+POLL_INTERVAL = 0.2
+
+
+class LeasedFrontier(Frontier):
+    """Frontier whose in-flight jobs are leased to a worker until lease_expires"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            kind TEXT NOT NULL,
+            url TEXT NOT NULL,
+            category TEXT NOT NULL,
+            extra TEXT NOT NULL DEFAULT '{}',
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            PRIMARY KEY (kind, url, category)
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, priority);
+    '''
+
+    def __init__(self, path='distributed_frontier.sqlite', priorities=None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.priorities = priorities or {}
+
+    def add(self, job):
+        """Record a job as pending unless it is already known; True if it was new"""
+        extra = {key: value for key, value in job.items() if key not in ('kind', 'url', 'category')}
+        cursor = self.conn.execute(
+            'INSERT OR IGNORE INTO jobs (kind, url, category, extra, state, updated_at, priority) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job['kind'], job['url'], job['category'] or '', json.dumps(extra), PENDING, time.time(),
+             self.priorities.get(job['kind'], 0))
+        )
+        self.pending_writes += 1
+        return cursor.rowcount > 0
+
+    def lease(self, owner, limit, lease_seconds):
+        """Hand up to limit pending jobs (highest priority first) to owner"""
+        if limit <= 0:
+            return []
+        rows = self.conn.execute(
+            'SELECT kind, url, category, extra FROM jobs WHERE state = ? ORDER BY priority, rowid LIMIT ?',
+            (PENDING, limit)
+        ).fetchall()
+        now = time.time()
+        self.conn.executemany(
+            'UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, '
+            'updated_at = ? WHERE kind = ? AND url = ? AND category = ?',
+            [(IN_FLIGHT, owner, now + lease_seconds, now, kind, url, category) for kind, url, category, _ in rows]
+        )
+        self.pending_writes += len(rows)
+        return [
+            {'kind': kind, 'url': url, 'category': category, **json.loads(extra)}
+            for kind, url, category, extra in rows
+        ]
+
+    def renew(self, owner, lease_seconds):
+        """Extend every lease held by owner (each lease request doubles as a heartbeat)"""
+        self.conn.execute('UPDATE jobs SET lease_expires = ? WHERE state = ? AND lease_owner = ?',
+                          (time.time() + lease_seconds, IN_FLIGHT, owner))
+
+    def holds(self, owner, job):
+        return self.conn.execute(
+            'SELECT 1 FROM jobs WHERE kind = ? AND url = ? AND category = ? AND state = ? AND lease_owner = ?',
+            (job['kind'], job['url'], job['category'] or '', IN_FLIGHT, owner)
+        ).fetchone() is not None
+
+    def settle(self, job, state, max_attempts):
+        """Close a job's lease; a failed job goes back to pending until max_attempts. Returns the new state"""
+        if state == FAILED:
+            attempts = self.conn.execute(
+                'SELECT attempts FROM jobs WHERE kind = ? AND url = ? AND category = ?',
+                (job['kind'], job['url'], job['category'] or '')
+            ).fetchone()[0]
+            if attempts < max_attempts:
+                state = PENDING
+        self.conn.execute(
+            'UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? '
+            'WHERE kind = ? AND url = ? AND category = ?',
+            (state, time.time(), job['kind'], job['url'], job['category'] or '')
+        )
+        self.pending_writes += 1
+        return state
+
+    def reap_expired(self, max_attempts):
+        """Take back the jobs of workers whose leases ran out; returns how many"""
+        now = time.time()
+        expired = self.conn.execute(
+            'UPDATE jobs SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, lease_owner = NULL, '
+            'lease_expires = NULL, updated_at = ? WHERE state = ? AND lease_expires < ?',
+            (max_attempts, PENDING, FAILED, now, IN_FLIGHT, now)
+        ).rowcount
+        if expired:
+            self.commit()
+        return expired
+
+    def resume(self):
+        """Release leases and retry failed jobs left by an interrupted crawl"""
+        self.conn.execute(
+            'UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, '
+            'attempts = CASE WHEN state = ? THEN 0 ELSE attempts END WHERE state IN (?, ?)',
+            (PENDING, FAILED, IN_FLIGHT, FAILED)
+        )
+        self.commit()
+
+    def outstanding(self):
+        """Jobs not yet done or failed for good"""
+        return self.conn.execute('SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)',
+                                 (PENDING, IN_FLIGHT)).fetchone()[0]
+
+
+class Coordinator:
+    """Serves leases over HTTP and writes the records workers send back to the sinks"""
+
+    def __init__(self, frontier, sinks=None, base_url='https://www.temirci.az', requests_per_second=20,
+                 burst=None, lease_seconds=60.0, max_attempts=3, metrics=None):
+        self.frontier = frontier
+        self.sinks = sinks or []
+        self.base_url = base_url
+        # One token per leased job: each job is one page fetch
+        self.rate_limiter = TokenBucket(requests_per_second, burst=burst)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.metrics = metrics or CrawlMetrics()
+        self.workers = {}  # worker id -> last time it asked for jobs
+        self.listings_scraped = 0
+        self.finished = None
+        self.register_gauges()
+
+    def register_gauges(self):
+        metrics = self.metrics
+        metrics.gauge('listings_scraped', lambda: self.listings_scraped, 'Listings handed to the sinks')
+        metrics.gauge('active_workers', lambda: len(self.active_workers()), 'Workers seen within a lease period')
+        metrics.gauge('outstanding_jobs', self.frontier.outstanding, 'Jobs pending or leased')
+
+    async def seed(self, transport=None):
+        """Queue every category from the homepage, fetched once by the coordinator itself"""
+        scraper = TemirciScraper(base_url=self.base_url, max_concurrent=1, parse_executor='inline',
+                                 keep_listings=False)
+        async with create_session(transport or scraper.transport, scraper.transport_stats) as session:
+            categories = await scraper.get_categories(session)
+        await scraper.parse_stage.close()
+        if not categories:
+            raise RuntimeError(f"no categories found on {self.base_url}")
+        for category in categories:
+            self.frontier.add({'kind': 'category', 'url': category['url'], 'category': category['name']})
+        self.frontier.commit()
+        logger.info(f"Seeded the frontier with {len(categories)} categories")
+
+    def active_workers(self):
+        cutoff = time.monotonic() - self.lease_seconds
+        return [worker for worker, seen in self.workers.items() if seen >= cutoff]
+
+    def exchange(self, worker, want, results, pause=None):
+        """Take a worker's results, renew its leases and lease it up to `want` new jobs"""
+        self.workers[worker] = time.monotonic()
+        for result in results:
+            self.handle_result(worker, result)
+        if pause:
+            # Retry-After seen by one worker holds back all of them
+            self.rate_limiter.pause(pause)
+        self.frontier.renew(worker, self.lease_seconds)
+
+        jobs = []
+        if not self.finished.is_set():
+            granted = self.rate_limiter.take(want)
+            jobs = self.frontier.lease(worker, granted, self.lease_seconds)
+            self.rate_limiter.refund(granted - len(jobs))
+            self.metrics.increment('leased_jobs', len(jobs))
+            if not self.frontier.outstanding():
+                self.finished.set()
+        if self.frontier.needs_commit():
+            self.checkpoint()
+
+        if self.finished.is_set():
+            self.workers.pop(worker, None)
+        if jobs or self.finished.is_set():
+            retry_in = 0.0
+        elif want and self.rate_limiter.delay():
+            retry_in = self.rate_limiter.delay()
+        else:
+            retry_in = POLL_INTERVAL
+        return {'jobs': jobs, 'retry_in': retry_in, 'finished': self.finished.is_set()}
+
+    def handle_result(self, worker, result):
+        job = result['job']
+        if not self.frontier.holds(worker, job):
+            # The lease expired and the job went to another worker; that one's result counts
+            self.metrics.increment('stale_results')
+            return
+        for new_job in result['jobs']:
+            self.frontier.add(new_job)
+        if result['record'] is not None:
+            self.emit(result['record'])
+        state = self.frontier.settle(job, result['state'], self.max_attempts)
+        self.metrics.increment('completed_jobs', kind=job['kind'], state=state)
+
+    def emit(self, record):
+        self.listings_scraped += 1
+        for sink in self.sinks:
+            sink.write(record)
+
+    def checkpoint(self):
+        """Flush sinks before committing the frontier, so a job marked done is never lost"""
+        for sink in self.sinks:
+            sink.flush()
+        self.frontier.commit()
+
+    async def reap_leases_periodically(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.lease_seconds / 4))
+            expired = self.frontier.reap_expired(self.max_attempts)
+            if expired:
+                self.metrics.increment('expired_leases', expired)
+                logger.warning(f"Took back {expired} jobs from expired leases")
+            if not self.frontier.outstanding():
+                self.finished.set()
+
+    def create_app(self):
+        async def config(request):
+            return web.json_response({'base_url': self.base_url, 'lease_seconds': self.lease_seconds,
+                                      'rate': self.rate_limiter.rate})
+
+        async def lease(request):
+            body = await request.json()
+            return web.json_response(self.exchange(body['worker'], body.get('want', 0),
+                                                   body.get('results', []), body.get('pause')))
+
+        async def status(request):
+            return web.json_response({'jobs': self.frontier.counts(), 'listings': self.listings_scraped,
+                                      'workers': self.active_workers()})
+
+        async def prometheus(request):
+            return web.Response(text=self.metrics.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get('/config', config)
+        app.router.add_post('/lease', lease)
+        app.router.add_get('/status', status)
+        app.router.add_get('/metrics', prometheus)
+        return app
+
+    async def start(self, host='127.0.0.1', port=8770):
+        """Serve the coordinator API; returns (runner, url)"""
+        self.finished = asyncio.Event()
+        runner = web.AppRunner(self.create_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return runner, f'http://{host}:{bound_port}'
+
+    async def run(self, runner):
+        """Serve leases until every job is settled and the workers have been told so"""
+        started = time.monotonic()
+        reaper = asyncio.create_task(self.reap_leases_periodically())
+        try:
+            await self.finished.wait()
+            # Workers learn the crawl is over from their next lease request
+            deadline = time.monotonic() + self.lease_seconds
+            while self.active_workers() and time.monotonic() < deadline:
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            reaper.cancel()
+            await asyncio.gather(reaper, return_exceptions=True)
+            await runner.cleanup()
+            self.checkpoint()
+        elapsed = time.monotonic() - started
+        logger.info(f"Distributed crawl finished in {elapsed:.1f}s: {self.listings_scraped} listings, "
+                    f"jobs {self.frontier.counts()}")
+        self.metrics.log_summary()
+
+
+class DiscoveredJobs:
+    """Stands in for the crawl queue, collecting the jobs a scraper method enqueues"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def put_nowait(self, item):
+        self.jobs.append(item[2])
+
+
+class Worker:
+    """Leases jobs from a coordinator and runs them with a TemirciScraper"""
+
+    def __init__(self, coordinator_url, worker_id=None, max_concurrent=10, requests_per_second=None,
+                 http_cache_path=None, **options):
+        self.coordinator_url = coordinator_url.rstrip('/')
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.max_concurrent = max_concurrent
+        # Per-worker cap on top of the coordinator's global limit (default: the global rate)
+        self.requests_per_second = requests_per_second
+        self.http_cache_path = http_cache_path
+        # Other TemirciScraper options (parser, parse_executor, transport, ...)
+        self.options = options
+        self.scraper = None
+        self.jobs_done = 0
+
+    async def call(self, client, method, path, payload=None, retries=5):
+        for attempt in range(retries):
+            try:
+                async with client.request(method, self.coordinator_url + path, json=payload) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except Exception as e:
+                if attempt == retries - 1:
+                    raise
+                logger.warning(f"Coordinator request {path} failed ({e}), retrying")
+                await asyncio.sleep(2 ** attempt)
+
+    async def run_job(self, session, job):
+        scraper = self.scraper
+        discovered = DiscoveredJobs()
+        record = None
+        state = DONE
+        try:
+            if job['kind'] == 'category':
+                await scraper.process_category_job(session, discovered, job)
+            elif job['kind'] == 'page':
+                await scraper.process_page_job(session, discovered, job)
+            else:
+                record = await scraper.scrape_listing_detail(session, job['url'], job['category'])
+                if record is None:
+                    state = FAILED
+        except Exception as e:
+            state = FAILED
+            logger.error(f"Error processing {job['kind']} job {job['url']}: {e}")
+        self.jobs_done += 1
+        return {'job': {key: job[key] for key in ('kind', 'url', 'category')}, 'state': state,
+                'jobs': discovered.jobs, 'record': record}
+
+    def pause_seconds(self):
+        """Remaining Retry-After pause of the local rate limiter, passed on to the coordinator"""
+        remaining = self.scraper.rate_limiter.paused_until - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    async def run(self):
+        async with aiohttp.ClientSession() as client:
+            config = await self.call(client, 'GET', '/config')
+            heartbeat = config['lease_seconds'] / 3
+            http_cache = HttpCache(self.http_cache_path) if self.http_cache_path else None
+            # The coordinator paces leases globally; the local bucket also paces this worker's retries
+            self.scraper = TemirciScraper(base_url=config['base_url'], max_concurrent=self.max_concurrent,
+                                          requests_per_second=self.requests_per_second or config['rate'],
+                                          http_cache=http_cache, keep_listings=False, **self.options)
+            logger.info(f"Worker {self.worker_id} connected to {self.coordinator_url}")
+            running = set()
+            results = []
+            async with create_session(self.scraper.transport, self.scraper.transport_stats) as session:
+                while True:
+                    reply = await self.call(client, 'POST', '/lease', {
+                        'worker': self.worker_id, 'want': self.max_concurrent - len(running),
+                        'results': results, 'pause': self.pause_seconds(),
+                    })
+                    results = []
+                    for job in reply['jobs']:
+                        running.add(asyncio.create_task(self.run_job(session, job)))
+                    if reply['finished'] and not running:
+                        break
+                    wait = min(heartbeat, reply['retry_in'] or POLL_INTERVAL)
+                    if running:
+                        done, running = await asyncio.wait(running, timeout=wait,
+                                                           return_when=asyncio.FIRST_COMPLETED)
+                        results.extend(task.result() for task in done)
+                    else:
+                        await asyncio.sleep(wait)
+            await self.scraper.parse_stage.close()
+            if http_cache:
+                http_cache.close()
+        logger.info(f"Worker {self.worker_id}: {self.jobs_done} jobs, {self.scraper.pages_fetched} pages fetched")
+        self.scraper.transport_stats.log_stats()
+
+
+def worker_process(coordinator_url, options, log_level):
+    """Process target for `local` mode"""
+    logging.getLogger().setLevel(log_level)
+    asyncio.run(Worker(coordinator_url, **options).run())
+
+
+def add_coordinator_arguments(parser):
+    parser.add_argument('--base-url', default='https://www.temirci.az')
+    parser.add_argument('--rate', type=float, default=20, help='Global request rate across all workers')
+    parser.add_argument('--burst', type=float, help='Token bucket size (default: one second of --rate)')
+    parser.add_argument('--lease-seconds', type=float, default=60,
+                        help='A worker that has not checked in for this long loses its jobs')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--frontier', default='distributed_frontier.sqlite', metavar='PATH')
+    parser.add_argument('--resume', action='store_true', help='Continue the crawl in --frontier')
+    parser.add_argument('--stream', default='temirci_listings.jsonl', metavar='PATH')
+    parser.add_argument('--parquet', metavar='PATH')
+    parser.add_argument('--aggregates', metavar='PATH')
+    parser.add_argument('--db', metavar='PATH')
+    parser.add_argument('--search-index', metavar='PATH')
+    parser.add_argument('--dedup', metavar='PATH')
+    parser.add_argument('--views-snapshots', metavar='DIR')
+    parser.add_argument('--flush-every', type=int, default=100)
+
+
+def add_worker_arguments(parser):
+    parser.add_argument('--max-concurrent', type=int, default=10, help='Jobs in flight per worker')
+    parser.add_argument('--worker-rate', type=float,
+                        help='Per-worker requests/sec cap, retries included (default: the global --rate)')
+    parser.add_argument('--parser', default='auto')
+    parser.add_argument('--parse-executor', default='inline', choices=['process', 'thread', 'inline'],
+                        help='Workers scale out by process, so parsing defaults to the event loop')
+    parser.add_argument('--http-cache', metavar='PATH', help='Per-worker HTTP cache file')
+
+
+def worker_options(args):
+    return {'max_concurrent': args.max_concurrent, 'requests_per_second': args.worker_rate,
+            'parser': args.parser, 'parse_executor': args.parse_executor}
+
+
+async def run_coordinator(args, worker_count=0):
+    frontier = LeasedFrontier(args.frontier, priorities=TemirciScraper.JOB_PRIORITY)
+    if not args.resume:
+        frontier.reset()
+    sinks = [JsonlSink(args.stream, append=args.resume, batch_size=args.flush_every)]
+    if args.parquet:
+        sinks.append(ParquetSink(args.parquet, batch_size=args.flush_every))
+    if args.aggregates:
+        sinks.append(AggregateSink(args.aggregates, batch_size=args.flush_every))
+    if args.db:
+        sinks.append(ListingDatabaseSink(args.db, batch_size=args.flush_every))
+    if args.search_index:
+        sinks.append(SearchSink(args.search_index, batch_size=args.flush_every))
+    if args.dedup:
+        from dedup import DedupSink  # numpy, only when deduplicating
+        sinks.append(DedupSink(args.dedup, batch_size=args.flush_every))
+    if args.views_snapshots:
+        from snapshot_store import SnapshotSink  # numpy, only when recording snapshots
+        sinks.append(SnapshotSink(args.views_snapshots, batch_size=args.flush_every))
+    coordinator = Coordinator(frontier, sinks, base_url=args.base_url, requests_per_second=args.rate,
+                              burst=args.burst, lease_seconds=args.lease_seconds,
+                              max_attempts=args.max_attempts)
+    processes = []
+    try:
+        if args.resume and not frontier.is_empty():
+            frontier.resume()
+            logger.info(f"Resuming distributed crawl: {frontier.counts()}")
+        else:
+            await coordinator.seed()
+        runner, url = await coordinator.start(args.host, args.port)
+        logger.info(f"Coordinator listening on {url}")
+        if worker_count:
+            context = multiprocessing.get_context('spawn')
+            for index in range(worker_count):
+                options = dict(worker_options(args), worker_id=f'local-{index + 1}')
+                if args.http_cache:
+                    root, ext = os.path.splitext(args.http_cache)
+                    options['http_cache_path'] = f'{root}-{index + 1}{ext}'
+                process = context.Process(target=worker_process, args=(url, options, args.log_level),
+                                          name=f'worker-{index + 1}')
+                process.start()
+                processes.append(process)
+        await coordinator.run(runner)
+    finally:
+        for process in processes:
+            process.join(timeout=coordinator.lease_seconds)
+            if process.is_alive():
+                process.terminate()
+        for sink in sinks:
+            sink.close()
+        frontier.close()
+    export_stream(args.stream)
+
+
+async def run_worker(args):
+    options = worker_options(args)
+    if args.http_cache:
+        options['http_cache_path'] = args.http_cache
+    await Worker(args.coordinator, worker_id=args.worker_id, **options).run()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Distributed temirci.az crawl')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = commands.add_parser('coordinator', help='Own the frontier and serve leases')
+    add_coordinator_arguments(coordinator)
+    coordinator.add_argument('--host', default='127.0.0.1')
+    coordinator.add_argument('--port', type=int, default=8770)
+
+    worker = commands.add_parser('worker', help='Lease and run jobs from a coordinator')
+    worker.add_argument('--coordinator', default='http://127.0.0.1:8770')
+    worker.add_argument('--worker-id', help='Default: hostname-pid')
+    add_worker_arguments(worker)
+
+    local = commands.add_parser('local', help='Coordinator plus worker processes on this machine')
+    add_coordinator_arguments(local)
+    add_worker_arguments(local)
+    local.add_argument('--workers', type=int, default=os.cpu_count())
+    local.add_argument('--host', default='127.0.0.1')
+    local.add_argument('--port', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.getLogger().setLevel(args.log_level)
+    if args.command == 'worker':
+        asyncio.run(run_worker(args))
+    else:
+        asyncio.run(run_coordinator(args, worker_count=args.workers if args.command == 'local' else 0))
+
+
+if __name__ == '__main__':
+    main()
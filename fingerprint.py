@@ -0,0 +1,182 @@
+"""
+Content fingerprints for listing pages
+Hashes each ad page's normalized HTML with volatile fragments (the view
+counter, scripts, CSRF tokens, whitespace) removed, so a recrawl can tell an
+unchanged page from a changed one without parsing it. The last parsed fields
+are kept with the fingerprint; unchanged pages reuse them, and what did change
+(a new ad, edited fields, a new view count) is appended to a change feed.
+
+Run directly to print the change feed as JSON Lines.
+"""
+
+import hashlib
+import html
+import json
+import logging
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+VIEWS_FRAGMENT = re.compile(r'<p\b[^>]*class="[^"]*\bviews\b[^"]*"[^>]*>(.*?)</p>', re.IGNORECASE | re.DOTALL)
+VIEWS_VALUE = re.compile(r'<b\b[^>]*>\s*(.*?)\s*</b>', re.IGNORECASE | re.DOTALL)
+VOLATILE_FRAGMENTS = re.compile(
+    r'<script\b.*?</script>'
+    r'|<input\b[^>]*name="_?(?:csrf|token)[^"]*"[^>]*>'
+    r'|<meta\b[^>]*name="csrf[^"]*"[^>]*>',
+    re.IGNORECASE | re.DOTALL
+)
+WHITESPACE = re.compile(r'\s+')
+
+NEW = 'new'
+CHANGED = 'changed'
+VIEWS = 'views'
+UNCHANGED = 'unchanged'
+
+
+def fingerprint(page):
+    """(hex digest of the page without volatile fragments, raw view counter text or None)"""
+    views = None
+    match = VIEWS_FRAGMENT.search(page)
+    if match:
+        value = VIEWS_VALUE.search(match.group(1))
+        if value:
+            views = html.unescape(value.group(1)).strip()
+            page = page[:match.start()] + page[match.end():]
+    page = WHITESPACE.sub(' ', VOLATILE_FRAGMENTS.sub('', page))
+    return hashlib.blake2b(page.encode('utf-8'), digest_size=16).hexdigest(), views
+
+
+def field_diff(old, new):
+    """{field: [old, new]} for every field whose value differs"""
+    return {key: [old.get(key), new.get(key)]
+            for key in sorted(set(old) | set(new)) if old.get(key) != new.get(key)}
+
+
+class FingerprintStore:
+    """SQLite table of page fingerprints and parsed fields, plus the change feed"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            fields TEXT NOT NULL,
+            checked_at REAL NOT NULL,
+            changed_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            diff TEXT NOT NULL,
+            detected_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, path='page_fingerprints.sqlite', commit_every=200):
+        self.path = path
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self.pending_writes = 0
+        self.counts = {NEW: 0, CHANGED: 0, VIEWS: 0, UNCHANGED: 0}
+
+    def lookup(self, url, page):
+        """Check a page against its stored fingerprint
+
+        Returns (state, fields, digest, views): for UNCHANGED and VIEWS the
+        stored fields are returned (with the new view counter), so the page
+        need not be parsed; for NEW and CHANGED fields is None and the caller
+        parses the page and hands the result to record().
+        """
+        digest, views = fingerprint(page)
+        row = self.conn.execute('SELECT fingerprint, fields FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return NEW, None, digest, views
+        if row[0] != digest:
+            return CHANGED, None, digest, views
+        fields = json.loads(row[1])
+        now = time.time()
+        if views is not None and fields.get('views') != views:
+            diff = {'views': [fields.get('views'), views]}
+            fields['views'] = views
+            self.conn.execute('UPDATE pages SET fields = ?, checked_at = ?, changed_at = ? WHERE url = ?',
+                              (json.dumps(fields, ensure_ascii=False), now, now, url))
+            self.add_change(url, VIEWS, diff, now)
+            self.counts[VIEWS] += 1
+            return VIEWS, fields, digest, views
+        self.conn.execute('UPDATE pages SET checked_at = ? WHERE url = ?', (now, url))
+        self._wrote()
+        self.counts[UNCHANGED] += 1
+        return UNCHANGED, fields, digest, views
+
+    def record(self, url, digest, fields):
+        """Store freshly parsed fields and log what changed since the last version"""
+        now = time.time()
+        row = self.conn.execute('SELECT fields FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            self.add_change(url, NEW, {}, now)
+            self.counts[NEW] += 1
+        else:
+            diff = field_diff(json.loads(row[0]), fields)
+            if diff:  # markup changes outside the parsed fields are not listing changes
+                self.add_change(url, CHANGED, diff, now)
+            self.counts[CHANGED] += 1
+        self.conn.execute(
+            'INSERT OR REPLACE INTO pages (url, fingerprint, fields, checked_at, changed_at) VALUES (?, ?, ?, ?, ?)',
+            (url, digest, json.dumps(fields, ensure_ascii=False), now, now)
+        )
+
+    def add_change(self, url, kind, diff, detected_at):
+        self.conn.execute('INSERT INTO changes (url, kind, diff, detected_at) VALUES (?, ?, ?, ?)',
+                          (url, kind, json.dumps(diff, ensure_ascii=False), detected_at))
+        self._wrote()
+
+    def _wrote(self):
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+
+    def changes(self, since_id=0):
+        """Change feed entries after since_id, oldest first"""
+        for change_id, url, kind, diff, detected_at in self.conn.execute(
+                'SELECT id, url, kind, diff, detected_at FROM changes WHERE id > ? ORDER BY id', (since_id,)):
+            yield {'id': change_id, 'url': url, 'kind': kind, 'diff': json.loads(diff), 'detected_at': detected_at}
+
+    def log_stats(self):
+        checked = sum(self.counts.values())
+        skipped = self.counts[UNCHANGED] + self.counts[VIEWS]
+        logger.info(
+            f"Fingerprints: {checked} ad pages checked, {skipped} not re-parsed "
+            f"({self.counts[UNCHANGED]} unchanged, {self.counts[VIEWS]} views only), "
+            f"{self.counts[CHANGED]} changed, {self.counts[NEW]} new"
+        )
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Print the listing change feed as JSON Lines')
+    parser.add_argument('--store', default='page_fingerprints.sqlite')
+    parser.add_argument('--since', type=int, default=0, help='Only changes with an id above this')
+    parser.add_argument('--kind', choices=[NEW, CHANGED, VIEWS], action='append',
+                        help='Only these kinds of change (repeatable)')
+    args = parser.parse_args()
+
+    store = FingerprintStore(args.store)
+    for change in store.changes(args.since):
+        if not args.kind or change['kind'] in args.kind:
+            print(json.dumps(change, ensure_ascii=False))
+    store.conn.close()
+
+
+if __name__ == '__main__':
+    main()
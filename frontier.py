@@ -0,0 +1,108 @@
+"""
+Durable crawl frontier for checkpoint/resume
+Every category, page and listing job is recorded in SQLite with a state
+(pending, in_flight, done, failed) so an interrupted crawl can pick up
+exactly where it stopped instead of starting again from the homepage
+"""
+
+import json
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Frontier:
+    """SQLite-backed job table keyed by (kind, url, category)"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            kind TEXT NOT NULL,
+            url TEXT NOT NULL,
+            category TEXT NOT NULL,
+            extra TEXT NOT NULL DEFAULT '{}',
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (kind, url, category)
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state);
+    '''
+
+    def __init__(self, path='crawl_frontier.sqlite', commit_every=200, commit_interval=5.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.last_commit = time.monotonic()
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self.pending_writes = 0
+
+    def reset(self):
+        """Forget every job (start of a fresh, non-resumed crawl)"""
+        self.conn.execute('DELETE FROM jobs')
+        self.conn.commit()
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM jobs LIMIT 1').fetchone() is None
+
+    def add(self, job):
+        """Record a job as pending unless it is already known"""
+        extra = {key: value for key, value in job.items() if key not in ('kind', 'url', 'category')}
+        self.conn.execute(
+            'INSERT OR IGNORE INTO jobs (kind, url, category, extra, state, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (job['kind'], job['url'], job['category'] or '', json.dumps(extra), PENDING, time.time())
+        )
+        self.pending_writes += 1
+
+    def mark(self, job, state):
+        attempts = ', attempts = attempts + 1' if state == IN_FLIGHT else ''
+        self.conn.execute(
+            f'UPDATE jobs SET state = ?, updated_at = ?{attempts} WHERE kind = ? AND url = ? AND category = ?',
+            (state, time.time(), job['kind'], job['url'], job['category'] or '')
+        )
+        self.pending_writes += 1
+
+    def needs_commit(self):
+        """True every commit_every writes or commit_interval seconds, whichever comes first"""
+        if not self.pending_writes:
+            return False
+        return (self.pending_writes >= self.commit_every
+                or time.monotonic() - self.last_commit >= self.commit_interval)
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_writes = 0
+        self.last_commit = time.monotonic()
+
+    def resume_jobs(self, retry_failed=True):
+        """Jobs to run after a restart: interrupted in-flight jobs and pending ones (and failed ones)"""
+        states = (PENDING, IN_FLIGHT, FAILED) if retry_failed else (PENDING, IN_FLIGHT)
+        rows = self.conn.execute(
+            f'SELECT kind, url, category, extra FROM jobs WHERE state IN ({",".join("?" * len(states))})',
+            states
+        ).fetchall()
+        self.conn.execute(
+            f'UPDATE jobs SET state = ? WHERE state IN ({",".join("?" * len(states))})',
+            (PENDING, *states)
+        )
+        self.commit()
+        return [
+            {'kind': kind, 'url': url, 'category': category, **json.loads(extra)}
+            for kind, url, category, extra in rows
+        ]
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def close(self):
+        self.commit()
+        logger.info(f"Frontier {self.path}: {self.counts()}")
+        self.conn.close()
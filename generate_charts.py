@@ -1,293 +1,375 @@
 """
 Business Analytics Chart Generator for Temirci.az Marketplace
 Generates business-focused visualizations for stakeholder presentations
+
+Each chart is an independent function of the precomputed aggregates in
+aggregate_store.py: the store applies only the listings that changed since the
+last run (or that the scraper already streamed into it), and every chart
+renders in its own worker process from the same small snapshot, so a full
+report takes about as long as the slowest chart. A chart that needs row-level listings instead
+loads the typed DataFrame with analytics_dataset.load_dataset() rather than
+reading the CSV itself.
 """
 
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg')
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime
 import numpy as np
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set style for professional business charts
-sns.set_style("whitegrid")
-plt.rcParams['figure.figsize'] = (12, 6)
-plt.rcParams['font.size'] = 10
-
-# Load data
-df = pd.read_csv('temirci_listings.csv')
-
-# Data preprocessing
-df['date_posted'] = pd.to_datetime(df['date_posted'])
-df['year'] = df['date_posted'].dt.year
-df['month'] = df['date_posted'].dt.to_period('M')
-df['year_month'] = df['date_posted'].dt.strftime('%Y-%m')
-
-# Extract numeric price values
-df['price_numeric'] = df['price'].str.extract(r'(\d+)').astype(float)
-
-print("Generating business analytics charts...")
-print(f"Total listings analyzed: {len(df)}")
-
-# ============================================
-# Chart 1: Market Composition by Category
-# ============================================
-plt.figure(figsize=(14, 7))
-category_counts = df['category'].value_counts()
-colors = sns.color_palette("husl", len(category_counts))
-bars = plt.barh(category_counts.index, category_counts.values, color=colors)
-plt.xlabel('Number of Listings', fontsize=12, fontweight='bold')
-plt.ylabel('Service Category', fontsize=12, fontweight='bold')
-plt.title('Market Composition: Active Listings by Service Category', fontsize=14, fontweight='bold', pad=20)
-for i, bar in enumerate(bars):
-    width = bar.get_width()
-    percentage = (width / len(df)) * 100
-    plt.text(width, bar.get_y() + bar.get_height()/2,
-             f' {int(width)} ({percentage:.1f}%)',
-             va='center', fontweight='bold')
-plt.tight_layout()
-plt.savefig('charts/01_market_composition_by_category.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 1: Market Composition by Category")
-
-# ============================================
-# Chart 2: Average Engagement by Category
-# ============================================
-plt.figure(figsize=(14, 7))
-avg_views = df.groupby('category')['views'].mean().sort_values(ascending=True)
-colors = sns.color_palette("rocket", len(avg_views))
-bars = plt.barh(avg_views.index, avg_views.values, color=colors)
-plt.xlabel('Average Views per Listing', fontsize=12, fontweight='bold')
-plt.ylabel('Service Category', fontsize=12, fontweight='bold')
-plt.title('Customer Engagement: Average Views by Service Category', fontsize=14, fontweight='bold', pad=20)
-for i, bar in enumerate(bars):
-    width = bar.get_width()
-    plt.text(width, bar.get_y() + bar.get_height()/2,
-             f' {int(width):,} views',
-             va='center', fontweight='bold')
-plt.tight_layout()
-plt.savefig('charts/02_average_engagement_by_category.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 2: Average Engagement by Category")
-
-# ============================================
-# Chart 3: Geographic Market Distribution
-# ============================================
-plt.figure(figsize=(12, 6))
-city_counts = df['city'].value_counts().head(10)
-colors = sns.color_palette("viridis", len(city_counts))
-bars = plt.bar(range(len(city_counts)), city_counts.values, color=colors)
-plt.xlabel('City', fontsize=12, fontweight='bold')
-plt.ylabel('Number of Active Listings', fontsize=12, fontweight='bold')
-plt.title('Geographic Distribution: Service Provider Concentration by City', fontsize=14, fontweight='bold', pad=20)
-plt.xticks(range(len(city_counts)), city_counts.index, rotation=45, ha='right')
-for i, bar in enumerate(bars):
-    height = bar.get_height()
-    percentage = (height / len(df)) * 100
-    plt.text(bar.get_x() + bar.get_width()/2, height,
-             f'{int(height)}\n({percentage:.1f}%)',
-             ha='center', va='bottom', fontweight='bold')
-plt.tight_layout()
-plt.savefig('charts/03_geographic_market_distribution.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 3: Geographic Market Distribution")
-
-# ============================================
-# Chart 4: Platform Growth Over Time
-# ============================================
-plt.figure(figsize=(14, 7))
-yearly_listings = df.groupby('year').size()
-plt.plot(yearly_listings.index, yearly_listings.values, marker='o', linewidth=3, markersize=10, color='#2E86AB')
-plt.fill_between(yearly_listings.index, yearly_listings.values, alpha=0.3, color='#2E86AB')
-plt.xlabel('Year', fontsize=12, fontweight='bold')
-plt.ylabel('New Listings Posted', fontsize=12, fontweight='bold')
-plt.title('Platform Growth: Annual Listing Activity Trend', fontsize=14, fontweight='bold', pad=20)
-plt.grid(True, alpha=0.3)
-for x, y in zip(yearly_listings.index, yearly_listings.values):
-    plt.text(x, y + 2, str(int(y)), ha='center', va='bottom', fontweight='bold', fontsize=11)
-plt.tight_layout()
-plt.savefig('charts/04_platform_growth_over_time.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 4: Platform Growth Over Time")
-
-# ============================================
-# Chart 5: Pricing Analysis by Top Categories
-# ============================================
-plt.figure(figsize=(14, 7))
-top_categories = df['category'].value_counts().head(6).index
-df_top = df[df['category'].isin(top_categories) & df['price_numeric'].notna()]
-category_prices = df_top.groupby('category')['price_numeric'].agg(['mean', 'median']).sort_values('mean', ascending=False)
-
-x = np.arange(len(category_prices))
-width = 0.35
-bars1 = plt.bar(x - width/2, category_prices['mean'], width, label='Average Price', color='#A23B72')
-bars2 = plt.bar(x + width/2, category_prices['median'], width, label='Median Price', color='#F18F01')
-
-plt.xlabel('Service Category', fontsize=12, fontweight='bold')
-plt.ylabel('Price (AZN)', fontsize=12, fontweight='bold')
-plt.title('Pricing Strategy: Average vs Median Prices in Top Service Categories', fontsize=14, fontweight='bold', pad=20)
-plt.xticks(x, category_prices.index, rotation=45, ha='right')
-plt.legend(fontsize=11)
-plt.grid(True, alpha=0.3, axis='y')
-
-for bars in [bars1, bars2]:
-    for bar in bars:
+from aggregate_store import AggregateStore
+from dedup import DedupIndex, ProviderCounts
+from listing_db import ListingDatabase
+
+
+def setup_style():
+    """Set style for professional business charts"""
+    sns.set_style("whitegrid")
+    plt.rcParams['figure.figsize'] = (12, 6)
+    plt.rcParams['font.size'] = 10
+
+
+def chart_01_market_composition_by_category(agg):
+    """Chart 1: Market Composition by Category"""
+    plt.figure(figsize=(14, 7))
+    category_counts = agg.category_counts
+    colors = sns.color_palette("husl", len(category_counts))
+    bars = plt.barh(category_counts.index, category_counts.values, color=colors)
+    plt.xlabel(f'Number of {agg.unit}', fontsize=12, fontweight='bold')
+    plt.ylabel('Service Category', fontsize=12, fontweight='bold')
+    plt.title(f'Market Composition: Active {agg.unit} by Service Category', fontsize=14, fontweight='bold', pad=20)
+    for i, bar in enumerate(bars):
+        width = bar.get_width()
+        percentage = (width / agg.total) * 100
+        plt.text(width, bar.get_y() + bar.get_height()/2,
+                 f' {int(width)} ({percentage:.1f}%)',
+                 va='center', fontweight='bold')
+    plt.tight_layout()
+    plt.savefig('charts/01_market_composition_by_category.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_02_average_engagement_by_category(agg):
+    """Chart 2: Average Engagement by Category"""
+    plt.figure(figsize=(14, 7))
+    avg_views = agg.category_stats['avg_views'].sort_values(ascending=True)
+    colors = sns.color_palette("rocket", len(avg_views))
+    bars = plt.barh(avg_views.index, avg_views.values, color=colors)
+    plt.xlabel('Average Views per Listing', fontsize=12, fontweight='bold')
+    plt.ylabel('Service Category', fontsize=12, fontweight='bold')
+    plt.title('Customer Engagement: Average Views by Service Category', fontsize=14, fontweight='bold', pad=20)
+    for i, bar in enumerate(bars):
+        width = bar.get_width()
+        plt.text(width, bar.get_y() + bar.get_height()/2,
+                 f' {int(width):,} views',
+                 va='center', fontweight='bold')
+    plt.tight_layout()
+    plt.savefig('charts/02_average_engagement_by_category.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_03_geographic_market_distribution(agg):
+    """Chart 3: Geographic Market Distribution"""
+    plt.figure(figsize=(12, 6))
+    city_counts = agg.city_counts.head(10)
+    colors = sns.color_palette("viridis", len(city_counts))
+    bars = plt.bar(range(len(city_counts)), city_counts.values, color=colors)
+    plt.xlabel('City', fontsize=12, fontweight='bold')
+    plt.ylabel(f'Number of Active {agg.unit}', fontsize=12, fontweight='bold')
+    plt.title('Geographic Distribution: Service Provider Concentration by City', fontsize=14, fontweight='bold', pad=20)
+    plt.xticks(range(len(city_counts)), city_counts.index, rotation=45, ha='right')
+    for i, bar in enumerate(bars):
+        height = bar.get_height()
+        percentage = (height / agg.total) * 100
+        plt.text(bar.get_x() + bar.get_width()/2, height,
+                 f'{int(height)}\n({percentage:.1f}%)',
+                 ha='center', va='bottom', fontweight='bold')
+    plt.tight_layout()
+    plt.savefig('charts/03_geographic_market_distribution.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_04_platform_growth_over_time(agg):
+    """Chart 4: Platform Growth Over Time"""
+    plt.figure(figsize=(14, 7))
+    yearly_listings = agg.yearly_counts
+    plt.plot(yearly_listings.index, yearly_listings.values, marker='o', linewidth=3, markersize=10, color='#2E86AB')
+    plt.fill_between(yearly_listings.index, yearly_listings.values, alpha=0.3, color='#2E86AB')
+    plt.xlabel('Year', fontsize=12, fontweight='bold')
+    plt.ylabel('New Listings Posted', fontsize=12, fontweight='bold')
+    plt.title('Platform Growth: Annual Listing Activity Trend', fontsize=14, fontweight='bold', pad=20)
+    plt.grid(True, alpha=0.3)
+    for x, y in zip(yearly_listings.index, yearly_listings.values):
+        plt.text(x, y + 2, str(int(y)), ha='center', va='bottom', fontweight='bold', fontsize=11)
+    plt.tight_layout()
+    plt.savefig('charts/04_platform_growth_over_time.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_05_pricing_analysis_top_categories(agg):
+    """Chart 5: Pricing Analysis by Top Categories"""
+    plt.figure(figsize=(14, 7))
+    top_categories = agg.category_counts.head(6).index
+    stats = agg.category_stats
+    stats = stats[stats.index.isin(top_categories) & (stats['price_count'] > 0)]
+    category_prices = stats[['price_mean', 'price_median']].set_axis(['mean', 'median'], axis=1).sort_values('mean', ascending=False)
+
+    x = np.arange(len(category_prices))
+    width = 0.35
+    bars1 = plt.bar(x - width/2, category_prices['mean'], width, label='Average Price', color='#A23B72')
+    bars2 = plt.bar(x + width/2, category_prices['median'], width, label='Median Price', color='#F18F01')
+
+    plt.xlabel('Service Category', fontsize=12, fontweight='bold')
+    plt.ylabel('Price (AZN)', fontsize=12, fontweight='bold')
+    plt.title('Pricing Strategy: Average vs Median Prices in Top Service Categories', fontsize=14, fontweight='bold', pad=20)
+    plt.xticks(x, category_prices.index, rotation=45, ha='right')
+    plt.legend(fontsize=11)
+    plt.grid(True, alpha=0.3, axis='y')
+
+    for bars in [bars1, bars2]:
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2, height,
+                     f'{int(height)} AZN',
+                     ha='center', va='bottom', fontsize=9, fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig('charts/05_pricing_analysis_top_categories.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_06_engagement_distribution(agg):
+    """Chart 6: Engagement Distribution"""
+    plt.figure(figsize=(12, 6))
+    view_distribution = agg.view_bin_counts
+
+    colors = sns.color_palette("coolwarm", len(view_distribution))
+    bars = plt.bar(range(len(view_distribution)), view_distribution.values, color=colors)
+    plt.xlabel('View Range', fontsize=12, fontweight='bold')
+    plt.ylabel('Number of Listings', fontsize=12, fontweight='bold')
+    plt.title('Engagement Distribution: Listings by View Count Range', fontsize=14, fontweight='bold', pad=20)
+    plt.xticks(range(len(view_distribution)), view_distribution.index, rotation=0)
+
+    for i, bar in enumerate(bars):
+        height = bar.get_height()
+        percentage = (height / agg.total) * 100
+        plt.text(bar.get_x() + bar.get_width()/2, height,
+                 f'{int(height)}\n({percentage:.1f}%)',
+                 ha='center', va='bottom', fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig('charts/06_engagement_distribution.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_07_monthly_activity_trends(agg):
+    """Chart 7: Monthly Activity Trends"""
+    plt.figure(figsize=(16, 7))
+    monthly_activity = agg.monthly_counts.rename_axis('year_month').reset_index(name='count')
+
+    plt.plot(range(len(monthly_activity)), monthly_activity['count'],
+             marker='o', linewidth=2, markersize=6, color='#06A77D')
+    plt.fill_between(range(len(monthly_activity)), monthly_activity['count'], alpha=0.2, color='#06A77D')
+    plt.xlabel('Month', fontsize=12, fontweight='bold')
+    plt.ylabel('New Listings', fontsize=12, fontweight='bold')
+    plt.title('Activity Trends: Monthly Listing Volume Over Time', fontsize=14, fontweight='bold', pad=20)
+    plt.xticks(range(0, len(monthly_activity), 6),
+               monthly_activity['year_month'].iloc[::6], rotation=45, ha='right')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig('charts/07_monthly_activity_trends.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_08_top_performing_listings(agg):
+    """Chart 8: Top Performing Listings"""
+    plt.figure(figsize=(14, 8))
+    top_listings = agg.top_listings.head(15)[['title', 'views', 'category']].copy()
+    top_listings['short_title'] = top_listings['title'].str[:50] + '...'
+
+    colors_map = {cat: color for cat, color in zip(agg.categories,
+                  sns.color_palette("Set2", len(agg.categories)))}
+    bar_colors = [colors_map[cat] for cat in top_listings['category']]
+
+    bars = plt.barh(range(len(top_listings)), top_listings['views'], color=bar_colors)
+    plt.yticks(range(len(top_listings)), top_listings['short_title'], fontsize=9)
+    plt.xlabel('Total Views', fontsize=12, fontweight='bold')
+    plt.ylabel('Listing', fontsize=12, fontweight='bold')
+    plt.title('Top Performers: 15 Most-Viewed Service Listings', fontsize=14, fontweight='bold', pad=20)
+
+    for i, bar in enumerate(bars):
+        width = bar.get_width()
+        category = top_listings.iloc[i]['category']
+        plt.text(width, bar.get_y() + bar.get_height()/2,
+                 f' {int(width):,} views | {category}',
+                 va='center', fontsize=8, fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig('charts/08_top_performing_listings.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def chart_09_category_performance_matrix(agg):
+    """Chart 9: Category Performance Matrix"""
+    plt.figure(figsize=(14, 7))
+    category_stats = agg.category_stats[['views', 'listings', 'avg_views']]
+
+    top_cats = category_stats.nlargest(8, 'views')
+    x = np.arange(len(top_cats))
+    width = 0.35
+
+    fig, ax1 = plt.subplots(figsize=(14, 7))
+    color1 = '#E63946'
+    ax1.bar(x - width/2, top_cats['views']/1000, width, label='Total Views (thousands)', color=color1, alpha=0.7)
+    ax1.set_xlabel('Service Category', fontsize=12, fontweight='bold')
+    ax1.set_ylabel('Total Views (thousands)', fontsize=12, fontweight='bold', color=color1)
+    ax1.tick_params(axis='y', labelcolor=color1)
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(top_cats.index, rotation=45, ha='right')
+
+    ax2 = ax1.twinx()
+    color2 = '#457B9D'
+    ax2.bar(x + width/2, top_cats['listings'], width, label=f'Number of {agg.unit}', color=color2, alpha=0.7)
+    ax2.set_ylabel(f'Number of {agg.unit}', fontsize=12, fontweight='bold', color=color2)
+    ax2.tick_params(axis='y', labelcolor=color2)
+
+    plt.title('Category Performance Matrix: Total Engagement vs Market Supply', fontsize=14, fontweight='bold', pad=20)
+    fig.legend(loc='upper right', bbox_to_anchor=(0.9, 0.9), fontsize=11)
+    plt.tight_layout()
+    plt.savefig('charts/09_category_performance_matrix.png', dpi=300, bbox_inches='tight')
+    plt.close('all')
+
+
+def chart_10_market_concentration_analysis(agg):
+    """Chart 10: Market Concentration Analysis"""
+    plt.figure(figsize=(12, 6))
+    baku = int(agg.city_counts.get('Bakı', 0))
+    baku_vs_others = pd.DataFrame({
+        'Location': ['Baku (Capital)', 'Other Cities'],
+        'Listings': [
+            baku,
+            agg.total - baku
+        ]
+    })
+
+    colors = ['#FF6B6B', '#4ECDC4']
+    bars = plt.bar(baku_vs_others['Location'], baku_vs_others['Listings'], color=colors)
+    plt.ylabel(f'Number of Active {agg.unit}', fontsize=12, fontweight='bold')
+    plt.title('Market Concentration: Capital vs Regional Distribution', fontsize=14, fontweight='bold', pad=20)
+
+    for i, bar in enumerate(bars):
         height = bar.get_height()
+        percentage = (height / agg.total) * 100
         plt.text(bar.get_x() + bar.get_width()/2, height,
-                 f'{int(height)} AZN',
-                 ha='center', va='bottom', fontsize=9, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('charts/05_pricing_analysis_top_categories.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 5: Pricing Analysis by Top Categories")
-
-# ============================================
-# Chart 6: Engagement Distribution
-# ============================================
-plt.figure(figsize=(12, 6))
-bins = [0, 1000, 2000, 3000, 5000, 10000, 30000]
-labels = ['0-1K', '1K-2K', '2K-3K', '3K-5K', '5K-10K', '10K+']
-df['view_range'] = pd.cut(df['views'], bins=bins, labels=labels, include_lowest=True)
-view_distribution = df['view_range'].value_counts().sort_index()
-
-colors = sns.color_palette("coolwarm", len(view_distribution))
-bars = plt.bar(range(len(view_distribution)), view_distribution.values, color=colors)
-plt.xlabel('View Range', fontsize=12, fontweight='bold')
-plt.ylabel('Number of Listings', fontsize=12, fontweight='bold')
-plt.title('Engagement Distribution: Listings by View Count Range', fontsize=14, fontweight='bold', pad=20)
-plt.xticks(range(len(view_distribution)), view_distribution.index, rotation=0)
-
-for i, bar in enumerate(bars):
-    height = bar.get_height()
-    percentage = (height / len(df)) * 100
-    plt.text(bar.get_x() + bar.get_width()/2, height,
-             f'{int(height)}\n({percentage:.1f}%)',
-             ha='center', va='bottom', fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('charts/06_engagement_distribution.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 6: Engagement Distribution")
-
-# ============================================
-# Chart 7: Monthly Activity Trends
-# ============================================
-plt.figure(figsize=(16, 7))
-monthly_activity = df.groupby('year_month').size().reset_index(name='count')
-monthly_activity = monthly_activity.sort_values('year_month')
-
-plt.plot(range(len(monthly_activity)), monthly_activity['count'],
-         marker='o', linewidth=2, markersize=6, color='#06A77D')
-plt.fill_between(range(len(monthly_activity)), monthly_activity['count'], alpha=0.2, color='#06A77D')
-plt.xlabel('Month', fontsize=12, fontweight='bold')
-plt.ylabel('New Listings', fontsize=12, fontweight='bold')
-plt.title('Activity Trends: Monthly Listing Volume Over Time', fontsize=14, fontweight='bold', pad=20)
-plt.xticks(range(0, len(monthly_activity), 6),
-           monthly_activity['year_month'].iloc[::6], rotation=45, ha='right')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.savefig('charts/07_monthly_activity_trends.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 7: Monthly Activity Trends")
-
-# ============================================
-# Chart 8: Top Performing Listings
-# ============================================
-plt.figure(figsize=(14, 8))
-top_listings = df.nlargest(15, 'views')[['title', 'views', 'category']].copy()
-top_listings['short_title'] = top_listings['title'].str[:50] + '...'
-
-colors_map = {cat: color for cat, color in zip(df['category'].unique(),
-              sns.color_palette("Set2", len(df['category'].unique())))}
-bar_colors = [colors_map[cat] for cat in top_listings['category']]
-
-bars = plt.barh(range(len(top_listings)), top_listings['views'], color=bar_colors)
-plt.yticks(range(len(top_listings)), top_listings['short_title'], fontsize=9)
-plt.xlabel('Total Views', fontsize=12, fontweight='bold')
-plt.ylabel('Listing', fontsize=12, fontweight='bold')
-plt.title('Top Performers: 15 Most-Viewed Service Listings', fontsize=14, fontweight='bold', pad=20)
-
-for i, bar in enumerate(bars):
-    width = bar.get_width()
-    category = top_listings.iloc[i]['category']
-    plt.text(width, bar.get_y() + bar.get_height()/2,
-             f' {int(width):,} views | {category}',
-             va='center', fontsize=8, fontweight='bold')
-
-plt.tight_layout()
-plt.savefig('charts/08_top_performing_listings.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 8: Top Performing Listings")
-
-# ============================================
-# Chart 9: Category Performance Matrix
-# ============================================
-plt.figure(figsize=(14, 7))
-category_stats = df.groupby('category').agg({
-    'views': 'sum',
-    'ad_id': 'count'
-}).rename(columns={'ad_id': 'listings'})
-category_stats['avg_views'] = df.groupby('category')['views'].mean()
-
-top_cats = category_stats.nlargest(8, 'views')
-x = np.arange(len(top_cats))
-width = 0.35
-
-fig, ax1 = plt.subplots(figsize=(14, 7))
-color1 = '#E63946'
-ax1.bar(x - width/2, top_cats['views']/1000, width, label='Total Views (thousands)', color=color1, alpha=0.7)
-ax1.set_xlabel('Service Category', fontsize=12, fontweight='bold')
-ax1.set_ylabel('Total Views (thousands)', fontsize=12, fontweight='bold', color=color1)
-ax1.tick_params(axis='y', labelcolor=color1)
-ax1.set_xticks(x)
-ax1.set_xticklabels(top_cats.index, rotation=45, ha='right')
-
-ax2 = ax1.twinx()
-color2 = '#457B9D'
-ax2.bar(x + width/2, top_cats['listings'], width, label='Number of Listings', color=color2, alpha=0.7)
-ax2.set_ylabel('Number of Listings', fontsize=12, fontweight='bold', color=color2)
-ax2.tick_params(axis='y', labelcolor=color2)
-
-plt.title('Category Performance Matrix: Total Engagement vs Market Supply', fontsize=14, fontweight='bold', pad=20)
-fig.legend(loc='upper right', bbox_to_anchor=(0.9, 0.9), fontsize=11)
-plt.tight_layout()
-plt.savefig('charts/09_category_performance_matrix.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 9: Category Performance Matrix")
-
-# ============================================
-# Chart 10: Market Concentration Analysis
-# ============================================
-plt.figure(figsize=(12, 6))
-baku_vs_others = pd.DataFrame({
-    'Location': ['Baku (Capital)', 'Other Cities'],
-    'Listings': [
-        len(df[df['city'] == 'Bakı']),
-        len(df[df['city'] != 'Bakı'])
-    ]
-})
-
-colors = ['#FF6B6B', '#4ECDC4']
-bars = plt.bar(baku_vs_others['Location'], baku_vs_others['Listings'], color=colors)
-plt.ylabel('Number of Active Listings', fontsize=12, fontweight='bold')
-plt.title('Market Concentration: Capital vs Regional Distribution', fontsize=14, fontweight='bold', pad=20)
-
-for i, bar in enumerate(bars):
-    height = bar.get_height()
-    percentage = (height / len(df)) * 100
-    plt.text(bar.get_x() + bar.get_width()/2, height,
-             f'{int(height)}\n({percentage:.1f}%)',
-             ha='center', va='bottom', fontweight='bold', fontsize=12)
-
-plt.tight_layout()
-plt.savefig('charts/10_market_concentration_analysis.png', dpi=300, bbox_inches='tight')
-plt.close()
-print("✓ Chart 10: Market Concentration Analysis")
-
-print("\n" + "="*60)
-print("All business analytics charts generated successfully!")
-print("Charts saved in: ./charts/")
-print("="*60)
+                 f'{int(height)}\n({percentage:.1f}%)',
+                 ha='center', va='bottom', fontweight='bold', fontsize=12)
+
+    plt.tight_layout()
+    plt.savefig('charts/10_market_concentration_analysis.png', dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+
+CHARTS = {
+    '01': ('Market Composition by Category', chart_01_market_composition_by_category),
+    '02': ('Average Engagement by Category', chart_02_average_engagement_by_category),
+    '03': ('Geographic Market Distribution', chart_03_geographic_market_distribution),
+    '04': ('Platform Growth Over Time', chart_04_platform_growth_over_time),
+    '05': ('Pricing Analysis by Top Categories', chart_05_pricing_analysis_top_categories),
+    '06': ('Engagement Distribution', chart_06_engagement_distribution),
+    '07': ('Monthly Activity Trends', chart_07_monthly_activity_trends),
+    '08': ('Top Performing Listings', chart_08_top_performing_listings),
+    '09': ('Category Performance Matrix', chart_09_category_performance_matrix),
+    '10': ('Market Concentration Analysis', chart_10_market_concentration_analysis),
+}
+
+# Aggregate snapshot handed to each worker process once
+_aggregates = None
+
+
+def _init_worker(aggregates):
+    global _aggregates
+    _aggregates = aggregates
+    setup_style()
+
+
+def _render(chart_id):
+    started = time.perf_counter()
+    CHARTS[chart_id][1](_aggregates)
+    return chart_id, time.perf_counter() - started
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the Temirci.az business analytics charts')
+    parser.add_argument('--only', help='Comma-separated chart numbers to render, e.g. 03,07')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Chart rendering processes')
+    parser.add_argument('--csv', default='temirci_listings.csv', help='Listings CSV to analyze')
+    parser.add_argument('--aggregates', default='temirci_aggregates.sqlite', metavar='PATH',
+                        help='Aggregate store synced from --csv (the scraper can also feed it directly)')
+    parser.add_argument('--db', metavar='PATH',
+                        help='Query the listings database written by scraper.py --db instead of --csv')
+    parser.add_argument('--providers', metavar='PATH',
+                        help='Count distinct providers from the dedup.py index instead of listings '
+                             '(category and city charts)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.only:
+        selected = [chart_id.strip().zfill(2) for chart_id in args.only.split(',')]
+        unknown = [chart_id for chart_id in selected if chart_id not in CHARTS]
+        if unknown:
+            raise SystemExit(f"Unknown chart(s): {', '.join(unknown)}; choose from {', '.join(CHARTS)}")
+    else:
+        selected = list(CHARTS)
+
+    if args.db:
+        # Indexed GROUP BY queries over the deduplicated listings table
+        store = ListingDatabase(args.db)
+    else:
+        # Apply only the listings that changed since the last sync, then read O(categories) rows
+        store = AggregateStore(args.aggregates)
+        if os.path.exists(args.csv):
+            store.sync_csv(args.csv)
+    if args.providers:
+        index = DedupIndex(args.providers)
+        store = ProviderCounts(store, index.providers())
+        index.close()
+    aggregates = store.snapshot()
+    store.close()
+    print("Generating business analytics charts...")
+    print(f"Total {aggregates.unit.lower()} analyzed: {aggregates.total}")
+
+    os.makedirs('charts', exist_ok=True)
+    started = time.perf_counter()
+    timings = {}
+    workers = max(1, min(args.workers, len(selected)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(aggregates,)) as pool:
+        futures = [pool.submit(_render, chart_id) for chart_id in selected]
+        for future in as_completed(futures):
+            chart_id, seconds = future.result()
+            timings[chart_id] = seconds
+            print(f"✓ Chart {int(chart_id)}: {CHARTS[chart_id][0]} ({seconds:.2f}s)")
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "="*60)
+    print("All business analytics charts generated successfully!")
+    print("Charts saved in: ./charts/")
+    print(f"Wall time {elapsed:.2f}s for {len(selected)} charts "
+          f"(sum of chart times {sum(timings.values()):.2f}s, slowest {max(timings.values()):.2f}s)")
+    print("="*60)
+
+
+if __name__ == '__main__':
+    main()
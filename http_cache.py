@@ -0,0 +1,156 @@
+"""
+Persistent HTTP response cache for the scraper
+Stores response bodies with their ETag/Last-Modified validators in SQLite so
+later crawls can send conditional requests and serve 304s from disk, or replay
+an entire crawl offline
+"""
+
+import logging
+import sqlite3
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class HttpCache:
+    """URL-keyed SQLite cache with size/age eviction and hit/miss counters"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,     -- last 200 or 304 from the server
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+    '''
+
+    def __init__(self, path='http_cache.sqlite', max_bytes=512 * 1024 * 1024,
+                 max_age=30 * 24 * 3600, offline=False, commit_every=100):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self.pending_writes = 0
+        self.hits = 0          # served from cache (304 or offline replay)
+        self.misses = 0        # full body downloaded
+        self.bytes_saved = 0   # body bytes not re-downloaded thanks to 304s
+
+    def get(self, url):
+        """Return the cached entry for a URL as a dict, or None"""
+        row = self.conn.execute(
+            'SELECT etag, last_modified, body, stored_at FROM responses WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, stored_at = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': zlib.decompress(body).decode('utf-8'),
+            'stored_at': stored_at,
+        }
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match / If-Modified-Since headers for a cached entry"""
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response_headers, body):
+        """Store a 200 response body and its validators"""
+        compressed = zlib.compress(body.encode('utf-8'))
+        now = time.time()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (url, response_headers.get('ETag'), response_headers.get('Last-Modified'),
+             compressed, len(compressed), now, now)
+        )
+        self.misses += 1
+        self._wrote()
+
+    def record_hit(self, url, entry, revalidated=False):
+        """Mark a cached entry as served (after a 304 or in offline mode)
+
+        A 304 (revalidated=True) confirms the body is current, so it also
+        restarts the entry's max_age; an offline replay does not.
+        """
+        now = time.time()
+        if revalidated:
+            self.conn.execute('UPDATE responses SET last_used = ?, stored_at = ? WHERE url = ?', (now, now, url))
+        else:
+            self.conn.execute('UPDATE responses SET last_used = ? WHERE url = ?', (now, url))
+        self.hits += 1
+        self.bytes_saved += len(entry['body'].encode('utf-8'))
+        self._wrote()
+
+    def _wrote(self):
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def evict(self):
+        """Drop entries not fetched or revalidated within max_age, then LRU ones until under max_bytes"""
+        removed = 0
+        if self.max_age is not None:
+            cursor = self.conn.execute(
+                'DELETE FROM responses WHERE stored_at < ?', (time.time() - self.max_age,)
+            )
+            removed += cursor.rowcount
+
+        if self.max_bytes is not None:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.conn.execute('SELECT url, size FROM responses ORDER BY last_used').fetchall()
+                doomed = []
+                for url, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((url,))
+                    total -= size
+                self.conn.executemany('DELETE FROM responses WHERE url = ?', doomed)
+                removed += len(doomed)
+
+        self.conn.commit()
+        if removed:
+            logger.info(f"Evicted {removed} cached responses")
+        return removed
+
+    def stats(self):
+        entries, size = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'bytes_saved': self.bytes_saved,
+            'entries': entries,
+            'stored_bytes': size,
+        }
+
+    def close(self):
+        if self.offline:
+            self.conn.commit()
+        else:
+            self.evict()
+        stats = self.stats()
+        logger.info(
+            f"HTTP cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_ratio']:.0%} hit ratio), {stats['bytes_saved']:,} bytes saved, "
+            f"{stats['entries']} entries on disk"
+        )
+        self.conn.close()
@@ -0,0 +1,351 @@
+"""
+Image pipeline for listing photos
+Downloads the og:image of every scraped listing in a stage of its own (own
+connection pool, concurrency limit and request rate), so images never hold
+up the listing crawl. Each image is streamed to a temporary file while it is
+hashed, then deduplicated by URL and by content hash: stock photos reused by
+many ads are stored once. Size and dimensions (read from the file header)
+and a 64-bit difference hash (dHash, when Pillow is installed) are recorded
+in SQLite.
+
+Run directly to fetch the images of an existing listings file, e.g.
+    python image_stage.py temirci_listings.jsonl --dir images
+"""
+
+import asyncio
+import csv
+import hashlib
+import itertools
+import logging
+import os
+import sqlite3
+import struct
+import time
+
+from rate_limit import TokenBucket
+from sinks import read_jsonl
+from transport import TransportConfig, create_session
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'gif': '.gif', 'webp': '.webp'}
+
+
+def png_size(head):
+    if head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    return None
+
+
+def gif_size(head):
+    return struct.unpack('<HH', head[6:10])
+
+
+def webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+
+def jpeg_size(f):
+    """Walk the JPEG segments up to the first SOF marker"""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+        if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+            _, height, width = struct.unpack('>HxHH', f.read(7))
+            return width, height
+        length = struct.unpack('>H', f.read(2))[0]
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def image_info(path):
+    """(format, width, height) from the file header without decoding the image"""
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        try:
+            if head.startswith(b'\xff\xd8'):
+                size = jpeg_size(f)
+                return ('jpeg', *size) if size else ('jpeg', None, None)
+            if head.startswith(b'\x89PNG\r\n\x1a\n'):
+                size = png_size(head)
+                return ('png', *size) if size else ('png', None, None)
+            if head[:6] in (b'GIF87a', b'GIF89a'):
+                return ('gif', *gif_size(head))
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+                size = webp_size(head)
+                return ('webp', *size) if size else ('webp', None, None)
+        except struct.error:
+            pass
+    return None, None, None
+
+
+def difference_hash(path, size=8):
+    """64-bit dHash as 16 hex digits; None when Pillow is missing or the image can't be decoded"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as image:
+            image.draft('L', (size * 4, size * 4))  # JPEGs decode at a fraction of full size
+            pixels = list(image.convert('L').resize((size + 1, size)).getdata())
+    except Exception as e:
+        logger.debug(f"Could not hash {path}: {e}")
+        return None
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return f'{bits:016x}'
+
+
+class ImageStore:
+    """SQLite index of image URLs and the deduplicated files they resolve to"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            fetched_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images (sha256);
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            format TEXT,
+            width INTEGER,
+            height INTEGER,
+            dhash TEXT,
+            first_url TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, path='temirci_images.sqlite', directory='images'):
+        self.path = path
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+
+    def known(self, url):
+        """Whether url was already fetched (or found broken) by an earlier run"""
+        return self.conn.execute('SELECT 1 FROM images WHERE url = ?', (url,)).fetchone() is not None
+
+    def has_blob(self, sha256):
+        return self.conn.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone() is not None
+
+    def add_blob(self, sha256, path, size, info, dhash, url):
+        self.conn.execute(
+            'INSERT OR IGNORE INTO blobs (sha256, path, bytes, format, width, height, dhash, first_url) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (sha256, path, size, *info, dhash, url)
+        )
+
+    def record(self, url, sha256=None, status='ok', error=None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO images (url, sha256, status, error, fetched_at) VALUES (?, ?, ?, ?, ?)',
+            (url, sha256, status, error, time.time())
+        )
+
+    def lookup(self, url):
+        """Metadata of the file behind an image URL, or None"""
+        row = self.conn.execute(
+            'SELECT b.sha256, b.path, b.bytes, b.format, b.width, b.height, b.dhash FROM images i '
+            'JOIN blobs b ON b.sha256 = i.sha256 WHERE i.url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('sha256', 'path', 'bytes', 'format', 'width', 'height', 'dhash'), row))
+
+    def most_reused(self, limit=10):
+        """[(sha256, url count, first url)] for the images shared by the most URLs"""
+        return self.conn.execute(
+            'SELECT i.sha256, COUNT(*), b.first_url FROM images i JOIN blobs b ON b.sha256 = i.sha256 '
+            'GROUP BY i.sha256 HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC LIMIT ?', (limit,)
+        ).fetchall()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class ImageStage:
+    """Background image downloader fed from the crawl with submit()
+
+    submit() never blocks: URLs go onto an unbounded queue and `concurrency`
+    workers drain it through their own session and rate limiter.
+    """
+
+    def __init__(self, store, concurrency=4, requests_per_second=5, max_bytes=20 * 1024 * 1024,
+                 transport=None, metrics=None):
+        self.store = store
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(requests_per_second, burst=concurrency)
+        self.max_bytes = max_bytes
+        self.transport = transport or TransportConfig(limit=concurrency, compress=False)
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        self.seen = set()
+        self.part_numbers = itertools.count()
+        self.session = None
+        self.workers = []
+        self.downloaded = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+        if metrics:
+            metrics.gauge('images_downloaded', lambda: self.downloaded, 'Images fetched by the image stage')
+            metrics.gauge('image_duplicates', lambda: self.duplicates,
+                          'Downloaded images identical to one already stored')
+            metrics.gauge('image_bytes', lambda: self.bytes_downloaded, 'Image bytes downloaded')
+            metrics.gauge('image_queue_depth', self.queue.qsize, 'Image URLs waiting for download')
+
+    async def start(self):
+        self.session = await create_session(self.transport).__aenter__()
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    def submit(self, url):
+        """Queue an image URL unless this or an earlier run already saw it"""
+        if not url or url in self.seen:
+            return
+        self.seen.add(url)
+        if self.store.known(url):
+            self.skipped += 1
+            return
+        self.queue.put_nowait(url)
+
+    async def worker(self):
+        while True:
+            url = await self.queue.get()
+            try:
+                await self.fetch(url)
+            except Exception as e:
+                self.failed += 1
+                self.store.record(url, status='failed', error=str(e)[:200])
+                logger.warning(f"Image {url} failed: {e}")
+            finally:
+                self.queue.task_done()
+                if (self.downloaded + self.failed) % 100 == 0:
+                    self.store.commit()
+
+    async def fetch(self, url):
+        """Stream one image to a temporary file, hashing as it goes, then dedup and index it"""
+        await self.rate_limiter.acquire()
+        started = time.monotonic()
+        tmp_path = os.path.join(self.store.directory, f'.{os.getpid()}-{next(self.part_numbers)}.part')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    self.failed += 1
+                    self.store.record(url, status='failed', error=f'HTTP {response.status}')
+                    return
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ValueError(f'larger than {self.max_bytes} bytes')
+                        digest.update(chunk)
+                        f.write(chunk)
+            if self.metrics:
+                self.metrics.observe('image_download_seconds', time.monotonic() - started)
+            self.downloaded += 1
+            self.bytes_downloaded += size
+            sha256 = digest.hexdigest()
+            if self.store.has_blob(sha256):
+                self.duplicates += 1
+            else:
+                await self.store_blob(tmp_path, sha256, size, url)
+            self.store.record(url, sha256)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def store_blob(self, tmp_path, sha256, size, url):
+        info = image_info(tmp_path)
+        # Decoding for the dHash runs in a thread so the event loop keeps downloading
+        dhash = await asyncio.to_thread(difference_hash, tmp_path)
+        subdirectory = os.path.join(self.store.directory, sha256[:2])
+        os.makedirs(subdirectory, exist_ok=True)
+        path = os.path.join(subdirectory, sha256 + EXTENSIONS.get(info[0], ''))
+        os.replace(tmp_path, path)
+        self.store.add_blob(sha256, path, size, info, dhash, url)
+
+    async def close(self):
+        """Wait for queued images, then stop the workers"""
+        if self.queue.qsize():
+            logger.info(f"Waiting for {self.queue.qsize()} queued images")
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self.session:
+            await self.session.__aexit__(None, None, None)
+        self.store.commit()
+        self.log_stats()
+
+    def log_stats(self):
+        logger.info(
+            f"Images: {self.downloaded} downloaded ({self.bytes_downloaded:,} bytes), "
+            f"{self.duplicates} duplicate content, {self.skipped} already fetched, {self.failed} failed"
+        )
+
+
+def image_urls(path):
+    if path.endswith('.jsonl'):
+        for record in read_jsonl(path):
+            yield record.get('image_url')
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            yield record.get('image_url')
+
+
+async def fetch_all(args):
+    store = ImageStore(args.db, args.dir)
+    stage = ImageStage(store, concurrency=args.concurrency, requests_per_second=args.rate)
+    await stage.start()
+    for url in image_urls(args.listings):
+        stage.submit(url)
+    await stage.close()
+    for sha256, count, url in store.most_reused(args.top):
+        print(f"{count:>5} URLs  {sha256[:12]}  {url}")
+    store.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Download and index the images of scraped listings')
+    parser.add_argument('listings', nargs='?', default='temirci_listings.jsonl', help='Listings JSONL or CSV')
+    parser.add_argument('--dir', default='images')
+    parser.add_argument('--db', default='temirci_images.sqlite')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=5, help='Image requests per second')
+    parser.add_argument('--top', type=int, default=10, help='Show this many of the most reused images')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(fetch_all(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+SQLite listings database
+One row per ad_id, written by batched upserts inside a transaction, so an ad
+listed in several categories is stored once (every category it appeared in
+is kept in listing_categories). Indexes on category, city and date_posted
+serve the analytics queries, and a trigger appends to views_history whenever
+an ad's view count changes. generate_charts.py can read its chart inputs
+straight from the database with --db.
+"""
+
+import csv
+import logging
+import sqlite3
+import time
+
+from aggregate_store import TOP_K, VIEW_BIN_EDGES, VIEW_BIN_LABELS, ChartAggregates
+from normalize import PRICE_FIELDS, parse_date, parse_price, parse_views
+from sinks import BatchedSink, read_jsonl
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    'ad_id', 'seq', 'category', 'title', 'phone', 'city', 'price', 'price_min', 'price_max',
+    'price_currency', 'description', 'views', 'date_posted', 'image_url', 'listing_url', 'scraped_at',
+    'first_seen_at',
+)
+# Kept from the first time an ad was stored
+KEPT_ON_UPDATE = ('ad_id', 'seq', 'first_seen_at')
+
+# SQL for the chart dimensions of a listings row
+VIEW_BIN_SQL = 'CASE ' + ' '.join(
+    f"WHEN views <= {edge} THEN '{label}'" for edge, label in zip(VIEW_BIN_EDGES, VIEW_BIN_LABELS)
+) + ' END'
+DIMENSION_SQL = {
+    'category': 'category',
+    'city': 'city',
+    'year': 'CAST(substr(date_posted, 1, 4) AS INTEGER)',
+    'year_month': 'substr(date_posted, 1, 7)',
+    'view_bin': f'CASE WHEN views >= 0 THEN {VIEW_BIN_SQL} END',
+}
+
+
+class ListingDatabase:
+    """Listings keyed by ad_id with category/city/date indexes and a views history"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS listings (
+            ad_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            category TEXT,
+            title TEXT,
+            phone TEXT,
+            city TEXT,
+            price TEXT,
+            price_min REAL,
+            price_max REAL,
+            price_currency TEXT,
+            description TEXT,
+            views INTEGER,
+            date_posted TEXT,
+            image_url TEXT,
+            listing_url TEXT,
+            scraped_at TEXT,
+            first_seen_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_listings_category ON listings (category, price_min);
+        CREATE INDEX IF NOT EXISTS idx_listings_city ON listings (city);
+        CREATE INDEX IF NOT EXISTS idx_listings_date_posted ON listings (date_posted);
+        CREATE INDEX IF NOT EXISTS idx_listings_views ON listings (views DESC, seq);
+        CREATE TABLE IF NOT EXISTS listing_categories (
+            ad_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            PRIMARY KEY (ad_id, category)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS views_history (
+            ad_id INTEGER NOT NULL,
+            observed_at TEXT NOT NULL,
+            views INTEGER NOT NULL,
+            PRIMARY KEY (ad_id, observed_at)
+        ) WITHOUT ROWID;
+        CREATE TRIGGER IF NOT EXISTS listings_views_inserted AFTER INSERT ON listings
+        WHEN NEW.views IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO views_history (ad_id, observed_at, views)
+            VALUES (NEW.ad_id, COALESCE(NEW.scraped_at, datetime('now')), NEW.views);
+        END;
+        CREATE TRIGGER IF NOT EXISTS listings_views_updated AFTER UPDATE OF views ON listings
+        WHEN NEW.views IS NOT NULL AND NEW.views IS NOT OLD.views BEGIN
+            INSERT OR REPLACE INTO views_history (ad_id, observed_at, views)
+            VALUES (NEW.ad_id, COALESCE(NEW.scraped_at, datetime('now')), NEW.views);
+        END;
+    '''
+
+    def __init__(self, path='temirci_listings.sqlite'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.next_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM listings').fetchone()[0]
+        updated = ', '.join(f'{column} = excluded.{column}' for column in COLUMNS if column not in KEPT_ON_UPDATE)
+        self.upsert_sql = (
+            f'INSERT INTO listings ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))}) '
+            f'ON CONFLICT (ad_id) DO UPDATE SET {updated}'
+        )
+
+    def row(self, record):
+        """Column values for a scraped or exported record, normalized as the scraper does"""
+        try:
+            ad_id = int(record['ad_id'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        price = tuple(record.get(field) for field in PRICE_FIELDS)
+        if not isinstance(price[0], (int, float)):
+            # Missing, or text from a CSV export ('' for an unpriced listing)
+            price = parse_price(record.get('price'))
+        seq = self.next_seq
+        self.next_seq += 1
+        return (
+            ad_id, seq, record.get('category') or None, record.get('title'), record.get('phone'),
+            record.get('city') or None, record.get('price'), *price, record.get('description'),
+            parse_views(record.get('views')), parse_date(record.get('date_posted')), record.get('image_url'),
+            record.get('listing_url'), record.get('scraped_at'), record.get('scraped_at'),
+        )
+
+    def upsert_many(self, records):
+        """Insert or update a batch of records in one transaction; returns how many were stored"""
+        rows = [row for row in map(self.row, records) if row is not None]
+        with self.conn:
+            self.conn.executemany(self.upsert_sql, rows)
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO listing_categories (ad_id, category) VALUES (?, ?)',
+                [(row[0], row[2]) for row in rows if row[2] is not None]
+            )
+        return len(rows)
+
+    def upsert_all(self, records, batch_size=1000):
+        count = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                count += self.upsert_many(batch)
+                batch = []
+        return count + self.upsert_many(batch)
+
+    def import_file(self, path, batch_size=1000):
+        """Upsert every record of a listings CSV or JSONL file"""
+        if path.endswith('.jsonl'):
+            return self.upsert_all(read_jsonl(path), batch_size)
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.upsert_all(csv.DictReader(f), batch_size)
+
+    def views_history(self, ad_id):
+        """[(observed_at, views)] for one ad, oldest first"""
+        return self.conn.execute(
+            'SELECT observed_at, views FROM views_history WHERE ad_id = ? ORDER BY observed_at', (ad_id,)
+        ).fetchall()
+
+    def categories_of(self, ad_id):
+        return [category for (category,) in self.conn.execute(
+            'SELECT category FROM listing_categories WHERE ad_id = ? ORDER BY category', (ad_id,))]
+
+    # Read interface shared with AggregateStore, so ChartAggregates can be built from either
+
+    def total(self):
+        return self.conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+
+    def groups(self, dimension):
+        """(key, listings, views_count, views_sum, price_count, price_sum) per group, in first-seen order"""
+        key = DIMENSION_SQL[dimension]
+        # The aggregate store keeps price totals for the category groups only
+        price_count, price_sum = ('COUNT(price_min)', 'COALESCE(SUM(price_min), 0)') \
+            if dimension == 'category' else ('0', '0')
+        return self.conn.execute(
+            f'SELECT {key} AS key, COUNT(*), COUNT(views), COALESCE(SUM(views), 0), {price_count}, {price_sum} '
+            f'FROM listings WHERE key IS NOT NULL GROUP BY key ORDER BY MIN(seq)'
+        ).fetchall()
+
+    def listing_keys(self, dimension):
+        """(ad_id, key) of every listing for one dimension (key is None when the listing has none)"""
+        return self.conn.execute(f'SELECT ad_id, {DIMENSION_SQL[dimension]} FROM listings').fetchall()
+
+    def price_quantile(self, category, q):
+        """Exact price quantile (linear interpolation, as pandas), read from the category index"""
+        count = self.conn.execute('SELECT COUNT(price_min) FROM listings WHERE category = ?',
+                                  (category,)).fetchone()[0]
+        if not count:
+            return None
+        position = q * (count - 1)
+        values = [price for (price,) in self.conn.execute(
+            'SELECT price_min FROM listings WHERE category = ? AND price_min IS NOT NULL '
+            'ORDER BY price_min LIMIT 2 OFFSET ?', (category, int(position)))]
+        lower = values[0]
+        upper = values[-1] if position > int(position) else lower
+        return lower + (upper - lower) * (position - int(position))
+
+    def top_listings(self, k=TOP_K):
+        return self.conn.execute(
+            'SELECT ad_id, title, views, category FROM listings WHERE views IS NOT NULL '
+            'ORDER BY views DESC, seq ASC LIMIT ?', (k,)
+        ).fetchall()
+
+    def snapshot(self):
+        """All chart inputs as small pandas objects"""
+        return ChartAggregates(self)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class ListingDatabaseSink(BatchedSink):
+    """Streaming sink that upserts every scraped listing into a ListingDatabase"""
+
+    def __init__(self, path='temirci_listings.sqlite', batch_size=100, **kwargs):
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.db = ListingDatabase(path)
+
+    def write_batch(self, records):
+        self.db.upsert_many(records)
+
+    def close(self):
+        super().close()
+        self.db.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Load listings into the SQLite listings database')
+    parser.add_argument('files', nargs='*', help='Listings CSV or JSONL files to upsert, in order')
+    parser.add_argument('--db', default='temirci_listings.sqlite')
+    parser.add_argument('--history', type=int, metavar='AD_ID', help='Print the views history of an ad')
+    args = parser.parse_args()
+
+    db = ListingDatabase(args.db)
+    for path in args.files:
+        started = time.perf_counter()
+        count = db.import_file(path)
+        elapsed = time.perf_counter() - started
+        print(f"Upserted {count} records from {path} in {elapsed:.2f}s ({count / elapsed:,.0f} records/s)")
+    if args.history is not None:
+        for observed_at, views in db.views_history(args.history):
+            print(f"{observed_at}  {views}")
+    listings = db.total()
+    links = db.conn.execute('SELECT COUNT(*) FROM listing_categories').fetchone()[0]
+    print(f"{args.db}: {listings} listings ({links} category listings)")
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
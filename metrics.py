@@ -0,0 +1,210 @@
+"""
+Crawl metrics for the scraper
+Latency histograms (job queue wait, rate-limit/slot wait, network, parse,
+sink writes), counters (status codes, retries, errors) and gauges read on
+demand from other components (bytes transferred, pages, concurrency limit).
+They can be served as Prometheus text over HTTP, written as a periodic JSON
+snapshot, or summarised in the log at the end of a crawl.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus-style cumulative buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip((*self.buckets, math.inf), self.counts):
+            total += count
+            yield upper, total
+
+    def quantile(self, q):
+        """Estimate from the buckets by linear interpolation, like histogram_quantile()"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower, seen = 0.0, 0
+        for upper, count in zip((*self.buckets, math.inf), self.counts):
+            if count and seen + count >= rank:
+                if upper == math.inf:
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class CrawlMetrics:
+    """Registry of histograms, counters and gauges, keyed by name and labels"""
+
+    def __init__(self, namespace='temirci'):
+        self.namespace = namespace
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+        self.started_at = time.time()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, function, help_text=None):
+        """Register a value read from function() whenever metrics are rendered"""
+        self.gauges[name] = function
+        if help_text:
+            self.help[name] = help_text
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def snapshot(self):
+        """JSON-serialisable view: histogram summaries, counters and gauge values"""
+        def flat(name, labels):
+            return name + ''.join(f'.{value}' for _, value in labels)
+
+        return {
+            'timestamp': time.time(),
+            'uptime_seconds': time.time() - self.started_at,
+            'histograms': {flat(*key): histogram.summary() for key, histogram in sorted(self.histograms.items())},
+            'counters': {flat(*key): value for key, value in sorted(self.counters.items())},
+            'gauges': {name: function() for name, function in sorted(self.gauges.items())},
+        }
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            full_name = f'{self.namespace}_{name}'
+            declare(full_name, 'histogram')
+            for upper, count in histogram.cumulative():
+                le = '+Inf' if upper == math.inf else repr(upper)
+                lines.append(f'{full_name}_bucket{label_text((*labels, ("le", le)))} {count}')
+            lines.append(f'{full_name}_sum{label_text(labels)} {histogram.sum}')
+            lines.append(f'{full_name}_count{label_text(labels)} {histogram.count}')
+        for (name, labels), value in sorted(self.counters.items()):
+            full_name = f'{self.namespace}_{name}_total'
+            declare(full_name, 'counter')
+            lines.append(f'{full_name}{label_text(labels)} {value}')
+        for name, function in sorted(self.gauges.items()):
+            full_name = f'{self.namespace}_{name}'
+            declare(full_name, 'gauge')
+            lines.append(f'{full_name} {function()}')
+        return '\n'.join(lines) + '\n'
+
+    def log_summary(self):
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            summary = histogram.summary()
+            logger.info(
+                f"{name}{label_text(labels)}: n={summary['count']}, mean {summary['mean'] * 1000:.1f} ms, "
+                f"p50 {summary['p50'] * 1000:.1f} ms, p99 {summary['p99'] * 1000:.1f} ms"
+            )
+        counters = ', '.join(f"{name}{label_text(labels)}={value}"
+                             for (name, labels), value in sorted(self.counters.items()))
+        if counters:
+            logger.info(f"Counters: {counters}")
+
+    def write_json(self, path):
+        """Atomically replace path with the current snapshot"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    async def write_json_periodically(self, path, interval=10.0):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.write_json(path)
+        finally:
+            self.write_json(path)
+
+    async def serve(self, host='127.0.0.1', port=9108):
+        """Serve /metrics (Prometheus text) and /metrics.json; returns the aiohttp runner"""
+        from aiohttp import web
+
+        async def prometheus(request):
+            return web.Response(text=self.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+        async def snapshot(request):
+            return web.json_response(self.snapshot())
+
+        app = web.Application()
+        app.router.add_get('/metrics', prometheus)
+        app.router.add_get('/metrics.json', snapshot)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return runner
+
+
+class Timer:
+    """Context manager observing the elapsed wall time into a histogram"""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
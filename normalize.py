@@ -0,0 +1,159 @@
+"""
+Listing field normalization shared by the scraper and the analytics loader
+Turns the raw price, views and date strings scraped from a listing into
+typed values: price min/max and currency (decimals, ranges and thousands
+separators included), integer views and ISO dates. The same precompiled
+patterns drive a per-record path for the scraper and a batched pass over whole
+DataFrame columns for analytics, which parses each distinct value once and
+broadcasts the results with numpy indexing.
+"""
+
+import re
+
+NUMBER = r'\d{1,3}(?:[ \u00a0.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?'
+PRICE_PATTERN = re.compile(rf'(?P<min>{NUMBER})(?:\s*[-–—]\s*(?P<max>{NUMBER}))?')
+THOUSANDS_SEPARATOR = re.compile(r'[ \u00a0.,](?=\d{3}(?!\d))')
+CURRENCY_PATTERN = re.compile(r'(azn|₼|manat|usd|\$|eur|€|rub|₽|try|tl|₺)', re.IGNORECASE)
+NON_DIGITS = re.compile(r'\D')
+ISO_DATE_PATTERN = re.compile(r'(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})'
+                              r'(?:[ T](?P<hour>\d{1,2}):(?P<minute>\d{2}))?')
+DOTTED_DATE_PATTERN = re.compile(r'(?P<day>\d{1,2})[./](?P<month>\d{1,2})[./](?P<year>\d{4})'
+                                 r'(?:,?\s+(?P<hour>\d{1,2}):(?P<minute>\d{2}))?')
+
+CURRENCY_CODES = {
+    'azn': 'AZN', '₼': 'AZN', 'manat': 'AZN',
+    'usd': 'USD', '$': 'USD',
+    'eur': 'EUR', '€': 'EUR',
+    'rub': 'RUB', '₽': 'RUB',
+    'try': 'TRY', 'tl': 'TRY', '₺': 'TRY',
+}
+
+PRICE_FIELDS = ('price_min', 'price_max', 'price_currency')
+
+
+def to_number(text):
+    """'1 200,50' -> 1200.5; groups of exactly three digits after a separator are thousands"""
+    return float(THOUSANDS_SEPARATOR.sub('', text).replace(',', '.'))
+
+
+def parse_price(text):
+    """(min, max, currency) from a price string; max equals min for a single price"""
+    if not text:
+        return None, None, None
+    text = str(text)
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None, None, None
+    price_min = to_number(match.group('min'))
+    price_max = to_number(match.group('max')) if match.group('max') else price_min
+    currency = CURRENCY_PATTERN.search(text)
+    return price_min, price_max, CURRENCY_CODES[currency.group(1).lower()] if currency else None
+
+
+def parse_views(value):
+    """Integer view count from '1 234', '1,234' or an int; None when there are no digits"""
+    if value is None or isinstance(value, int):
+        return value
+    digits = NON_DIGITS.sub('', str(value))
+    return int(digits) if digits else None
+
+
+def parse_phone(value):
+    """Digits of an Azerbaijani phone number with the 994 country code: '(055) 927-7294' -> '994559277294'"""
+    if not value:
+        return None
+    digits = NON_DIGITS.sub('', str(value))
+    if len(digits) == 10 and digits.startswith('0'):
+        digits = '994' + digits[1:]
+    elif len(digits) == 9:
+        digits = '994' + digits
+    return digits or None
+
+
+def format_date(parts):
+    date = f"{int(parts['year']):04d}-{int(parts['month']):02d}-{int(parts['day']):02d}"
+    if parts.get('hour'):
+        date += f" {int(parts['hour']):02d}:{int(parts['minute']):02d}"
+    return date
+
+
+def parse_date(text):
+    """ISO 'YYYY-MM-DD HH:MM' (or 'YYYY-MM-DD' without a time) from the formats the site uses"""
+    if not text:
+        return None
+    text = str(text)
+    match = ISO_DATE_PATTERN.search(text) or DOTTED_DATE_PATTERN.search(text)
+    return format_date(match.groupdict()) if match else None
+
+
+def normalize_record(record):
+    """Copy of a scraped record with typed views/date_posted and the parsed price fields after price"""
+    normalized = {}
+    for key, value in record.items():
+        if key in PRICE_FIELDS:
+            continue
+        if key == 'views':
+            value = parse_views(value)
+        elif key == 'date_posted':
+            value = parse_date(value)
+        normalized[key] = value
+        if key == 'price':
+            normalized.update(zip(PRICE_FIELDS, parse_price(value)))
+    return normalized
+
+
+def parse_distinct(values, parse):
+    """Run parse once per distinct value; returns (codes, results) with a trailing None for
+    missing values, so numpy.take(results, codes) broadcasts them back (code -1 is missing)"""
+    import pandas as pd
+
+    codes, distinct = pd.factorize(values)
+    return codes, [parse(value) for value in distinct] + [None]
+
+
+def normalize_price_column(prices):
+    """Batched parse_price: DataFrame with price_min, price_max and price_currency"""
+    import numpy as np
+    import pandas as pd
+
+    codes, parsed = parse_distinct(prices, parse_price)
+    parsed[-1] = (None, None, None)
+    price_min, price_max, currency = zip(*parsed)
+    return pd.DataFrame({
+        'price_min': np.array(price_min, dtype='float64')[codes],
+        'price_max': np.array(price_max, dtype='float64')[codes],
+        'price_currency': pd.array(np.array(currency, dtype=object)[codes], dtype='string'),
+    }, index=prices.index)
+
+
+def normalize_views_column(views):
+    """Batched parse_views as a nullable Int64 column"""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_integer_dtype(views):
+        return views.astype('Int64')
+    codes, parsed = parse_distinct(views, parse_views)
+    return pd.Series(pd.array(np.array(parsed, dtype=object)[codes], dtype='Int64'), index=views.index)
+
+
+def normalize_date_column(dates):
+    """Batched parse_date: ISO date strings, missing where no known format matches"""
+    import numpy as np
+    import pandas as pd
+
+    codes, parsed = parse_distinct(dates, parse_date)
+    return pd.Series(pd.array(np.array(parsed, dtype=object)[codes], dtype='string'), index=dates.index)
+
+
+def normalize_frame(df):
+    """Normalize the price, views and date_posted columns of a listings DataFrame in place"""
+    if 'price' in df:
+        prices = normalize_price_column(df['price'])
+        for column in PRICE_FIELDS:
+            df[column] = prices[column]
+    if 'views' in df:
+        df['views'] = normalize_views_column(df['views'])
+    if 'date_posted' in df:
+        df['date_posted'] = normalize_date_column(df['date_posted'])
+    return df
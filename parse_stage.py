@@ -0,0 +1,136 @@
+"""
+Parse stage for the scraper
+Runs HTML extraction from parsers.py in a process or thread pool behind a
+bounded queue, so the event loop keeps fetching while pages are parsed and a
+slow parse stage pushes back on the fetchers instead of buffering pages
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from parsers import get_parser
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _init_worker(parser_name):
+    _local.engine = get_parser(parser_name)
+
+
+def _run_parse(method, html, args, engine=None):
+    """Executor entry point: returns (result, cpu seconds spent parsing)"""
+    started = time.process_time()
+    result = getattr(engine or _local.engine, method)(html, *args)
+    return result, time.process_time() - started
+
+
+class ParseStage:
+    """Bounded queue in front of a parsing pool, with queue-depth and parse-time metrics
+
+    executor is 'process', 'thread' or 'inline' (parse on the event loop,
+    the previous behaviour).
+    """
+
+    def __init__(self, parser_name='auto', executor='inline', workers=None, max_pending=None):
+        self.parser_name = parser_name
+        self.executor_kind = executor
+        self.workers = workers or 4
+        self.max_pending = max_pending or self.workers * 4
+        self.executor = None
+        self.queue = None
+        self.dispatchers = []
+        self.engine = get_parser(parser_name) if executor == 'inline' else None
+        # Metrics
+        self.parse_counts = {}
+        self.parse_seconds = {}
+        self.queue_wait_seconds = 0.0
+        self.max_queue_depth = 0
+        self.queue_depth_total = 0
+        self.queue_depth_samples = 0
+
+    def start(self):
+        if self.executor_kind == 'inline' or self.executor is not None:
+            return
+        pool_class = ProcessPoolExecutor if self.executor_kind == 'process' else ThreadPoolExecutor
+        self.executor = pool_class(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.parser_name,))
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+
+    async def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.dispatchers = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.queue = None
+
+    async def dispatch(self):
+        """Move queued pages into the pool, one in flight per worker"""
+        loop = asyncio.get_running_loop()
+        while True:
+            future, method, html, args, enqueued_at = await self.queue.get()
+            self.queue_wait_seconds += time.monotonic() - enqueued_at
+            try:
+                result, seconds = await loop.run_in_executor(self.executor, _run_parse, method, html, args)
+                self.record(method, seconds)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def record(self, method, seconds):
+        self.parse_counts[method] = self.parse_counts.get(method, 0) + 1
+        self.parse_seconds[method] = self.parse_seconds.get(method, 0.0) + seconds
+
+    async def parse(self, method, html, *args):
+        """Run parser engine `method` on html; waits for queue space when the pool is saturated"""
+        if self.executor_kind == 'inline':
+            result, seconds = _run_parse(method, html, args, self.engine)
+            self.record(method, seconds)
+            return result
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((future, method, html, args, time.monotonic()))
+        depth = self.queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.queue_depth_total += depth
+        self.queue_depth_samples += 1
+        return await future
+
+    def stats(self):
+        parsed = sum(self.parse_counts.values())
+        return {
+            'executor': self.executor_kind,
+            'workers': self.workers if self.executor_kind != 'inline' else 0,
+            'pages_parsed': parsed,
+            'parse_ms_avg': {
+                method: self.parse_seconds[method] / count * 1000
+                for method, count in self.parse_counts.items()
+            },
+            'queue_depth_max': self.max_queue_depth,
+            'queue_depth_avg': (self.queue_depth_total / self.queue_depth_samples
+                                if self.queue_depth_samples else 0.0),
+            'queue_wait_ms_avg': self.queue_wait_seconds / parsed * 1000 if parsed else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        per_method = ', '.join(f"{method} {ms:.2f} ms" for method, ms in stats['parse_ms_avg'].items())
+        logger.info(
+            f"Parse stage ({stats['executor']}, {stats['workers']} workers): "
+            f"{stats['pages_parsed']} pages, avg parse time {per_method or 'n/a'}; "
+            f"queue depth max {stats['queue_depth_max']}, avg {stats['queue_depth_avg']:.1f}, "
+            f"avg wait {stats['queue_wait_ms_avg']:.2f} ms"
+        )
@@ -0,0 +1,353 @@
+"""
+HTML parsing engines for temirci.az pages
+Every engine extracts the same fields with the same rules; the lxml and
+selectolax engines use precompiled XPath/CSS selectors instead of walking a
+BeautifulSoup tree. BeautifulSoup stays available as the reference fallback.
+"""
+
+import re
+from urllib.parse import urljoin
+
+PHONE_PATTERN = re.compile(r'phone=([+\d]+)')
+WHATSAPP_PATTERN = re.compile(r'whatsapp\.com')
+TEL_PATTERN = re.compile(r'^tel:')
+
+
+def phone_from_whatsapp(whatsapp_url):
+    """Extract phone number from WhatsApp URL"""
+    # Example: https://api.whatsapp.com/send/?phone=+994707044477&text=...
+    match = PHONE_PATTERN.search(whatsapp_url or '')
+    return match.group(1) if match else None
+
+
+def phone_from_tel(tel_url):
+    """Extract phone from tel: link"""
+    # Example: tel:(070) 704-4477
+    return tel_url.replace('tel:', '').strip()
+
+
+def max_page_number(texts):
+    """Highest numeric pagination label, 1 when there is none"""
+    page_numbers = [int(text) for text in (t.strip() for t in texts) if text.isdigit()]
+    return max(page_numbers) if page_numbers else 1
+
+
+class SoupParser:
+    """BeautifulSoup engine (html.parser by default, the original behaviour)"""
+
+    def __init__(self, features='html.parser'):
+        from bs4 import BeautifulSoup
+        self.BeautifulSoup = BeautifulSoup
+        self.features = features
+        self.name = 'soup' if features == 'html.parser' else f'soup-{features}'
+
+    def soup(self, html):
+        return self.BeautifulSoup(html, self.features)
+
+    def categories(self, html, base_url):
+        categories = []
+        category_container = self.soup(html).find('div', class_='service_category')
+        if category_container:
+            for link in category_container.find_all('a', class_='services'):
+                categories.append({'name': link.text.strip(), 'url': urljoin(base_url, link.get('href'))})
+        return categories
+
+    def total_pages(self, html):
+        pagination = self.soup(html).find('ul', class_='pagination')
+        if not pagination:
+            return 1
+        return max_page_number(link.text for link in pagination.find_all('a'))
+
+    def listing_urls(self, html, base_url):
+        return [
+            urljoin(base_url, gallery.get('href'))
+            for gallery in self.soup(html).find_all('a', class_='gallery')
+            if gallery.get('href')
+        ]
+
+    def listing_detail(self, html):
+        soup = self.soup(html)
+
+        # Title from og:title meta tag or h1
+        title = None
+        og_title = soup.find('meta', property='og:title')
+        if og_title:
+            title = og_title.get('content')
+        if not title:
+            h1 = soup.find('h1')
+            if h1:
+                title = h1.text.strip()
+
+        # Phone from WhatsApp link, then tel: link
+        phone = None
+        whatsapp_link = soup.find('a', href=WHATSAPP_PATTERN)
+        if whatsapp_link:
+            phone = phone_from_whatsapp(whatsapp_link.get('href'))
+        if not phone:
+            tel_link = soup.find('a', href=TEL_PATTERN)
+            if tel_link:
+                phone = phone_from_tel(tel_link.get('href'))
+
+        city = None
+        city_elem = soup.find('div', class_='city')
+        if city_elem:
+            city_text = city_elem.find('b')
+            if city_text:
+                city = city_text.text.strip()
+
+        description = None
+        text_elem = soup.find('div', class_='text')
+        if text_elem:
+            description = text_elem.get_text(strip=True, separator='\n')
+
+        price = None
+        price_elem = soup.find('div', class_='gallery-price')
+        if price_elem:
+            price_val = price_elem.find('span', class_='price-val')
+            price_cur = price_elem.find('span', class_='price-cur')
+            if price_val and price_cur:
+                price = f"{price_val.text.strip()} {price_cur.text.strip()}"
+
+        views = None
+        date_posted = None
+        info_section = soup.find('div', class_='info')
+        if info_section:
+            views_elem = info_section.find('p', class_='views')
+            if views_elem and views_elem.find('b'):
+                views = views_elem.find('b').text.strip()
+            date_elem = info_section.find('p', class_='date')
+            if date_elem and date_elem.find('b'):
+                date_posted = date_elem.find('b').text.strip()
+
+        image_url = None
+        og_image = soup.find('meta', property='og:image')
+        if og_image:
+            image_url = og_image.get('content')
+
+        return {
+            'title': title, 'phone': phone, 'city': city, 'price': price,
+            'description': description, 'views': views, 'date_posted': date_posted,
+            'image_url': image_url,
+        }
+
+
+def has_class(name):
+    """XPath predicate matching one token of a space-separated class attribute"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser:
+    """lxml engine with XPath expressions compiled once per process"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html
+        self.html_parser = html.HTMLParser(encoding='utf-8')
+        self.fromstring = html.fromstring
+        xpath = etree.XPath
+        self.category_links = xpath(f"(//div[{has_class('service_category')}])[1]//a[{has_class('services')}]")
+        self.pagination_labels = xpath(f"(//ul[{has_class('pagination')}])[1]//a")
+        self.gallery_hrefs = xpath(f"//a[{has_class('gallery')}]/@href")
+        self.og_title = xpath("(//meta[@property='og:title'])[1]/@content")
+        self.h1 = xpath("(//h1)[1]")
+        self.whatsapp_href = xpath("(//a[contains(@href, 'whatsapp.com')])[1]/@href")
+        self.tel_href = xpath("(//a[starts-with(@href, 'tel:')])[1]/@href")
+        self.city = xpath(f"(//div[{has_class('city')}])[1]/descendant::b[1]")
+        self.description_text = xpath(f"(//div[{has_class('text')}])[1]/descendant::text()")
+        self.description_div = xpath(f"(//div[{has_class('text')}])[1]")
+        self.price_div = xpath(f"(//div[{has_class('gallery-price')}])[1]")
+        self.price_val = xpath(f"descendant::span[{has_class('price-val')}][1]")
+        self.price_cur = xpath(f"descendant::span[{has_class('price-cur')}][1]")
+        self.info_div = xpath(f"(//div[{has_class('info')}])[1]")
+        self.views = xpath(f"(descendant::p[{has_class('views')}])[1]/descendant::b[1]")
+        self.date = xpath(f"(descendant::p[{has_class('date')}])[1]/descendant::b[1]")
+        self.og_image = xpath("(//meta[@property='og:image'])[1]/@content")
+
+    def tree(self, html):
+        return self.fromstring(html.encode('utf-8'), parser=self.html_parser)
+
+    @staticmethod
+    def first_text(nodes):
+        return nodes[0].text_content().strip() if nodes else None
+
+    def categories(self, html, base_url):
+        return [
+            {'name': link.text_content().strip(), 'url': urljoin(base_url, link.get('href'))}
+            for link in self.category_links(self.tree(html))
+        ]
+
+    def total_pages(self, html):
+        return max_page_number(link.text_content() for link in self.pagination_labels(self.tree(html)))
+
+    def listing_urls(self, html, base_url):
+        return [urljoin(base_url, href) for href in self.gallery_hrefs(self.tree(html)) if href]
+
+    def listing_detail(self, html):
+        tree = self.tree(html)
+
+        titles = self.og_title(tree)
+        title = titles[0] if titles else None
+        if not title:
+            title = self.first_text(self.h1(tree))
+
+        phone = None
+        whatsapp = self.whatsapp_href(tree)
+        if whatsapp:
+            phone = phone_from_whatsapp(whatsapp[0])
+        if not phone:
+            tel = self.tel_href(tree)
+            if tel:
+                phone = phone_from_tel(tel[0])
+
+        description = None
+        if self.description_div(tree):
+            parts = (text.strip() for text in self.description_text(tree))
+            description = '\n'.join(part for part in parts if part)
+
+        price = None
+        price_divs = self.price_div(tree)
+        if price_divs:
+            price_val = self.first_text(self.price_val(price_divs[0]))
+            price_cur = self.first_text(self.price_cur(price_divs[0]))
+            if price_val is not None and price_cur is not None:
+                price = f"{price_val} {price_cur}"
+
+        views = None
+        date_posted = None
+        info = self.info_div(tree)
+        if info:
+            views = self.first_text(self.views(info[0]))
+            date_posted = self.first_text(self.date(info[0]))
+
+        images = self.og_image(tree)
+
+        return {
+            'title': title, 'phone': phone, 'city': self.first_text(self.city(tree)),
+            'price': price, 'description': description, 'views': views,
+            'date_posted': date_posted, 'image_url': images[0] if images else None,
+        }
+
+
+class SelectolaxParser:
+    """selectolax (lexbor) engine using CSS selectors"""
+
+    name = 'selectolax'
+
+    CATEGORY_LINKS = 'div.service_category a.services'
+    PAGINATION_LINKS = 'ul.pagination a'
+    GALLERY_LINKS = 'a.gallery'
+    OG_TITLE = 'meta[property="og:title"]'
+    OG_IMAGE = 'meta[property="og:image"]'
+    WHATSAPP_LINK = 'a[href*="whatsapp.com"]'
+    TEL_LINK = 'a[href^="tel:"]'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.HTMLParser = LexborHTMLParser
+
+    @staticmethod
+    def first_text(node, selector):
+        found = node.css_first(selector)
+        return found.text().strip() if found is not None else None
+
+    def categories(self, html, base_url):
+        tree = self.HTMLParser(html)
+        container = tree.css_first('div.service_category')
+        if container is None:
+            return []
+        return [
+            {'name': link.text().strip(), 'url': urljoin(base_url, link.attributes.get('href'))}
+            for link in container.css('a.services')
+        ]
+
+    def total_pages(self, html):
+        pagination = self.HTMLParser(html).css_first('ul.pagination')
+        if pagination is None:
+            return 1
+        return max_page_number(link.text() for link in pagination.css('a'))
+
+    def listing_urls(self, html, base_url):
+        hrefs = (link.attributes.get('href') for link in self.HTMLParser(html).css(self.GALLERY_LINKS))
+        return [urljoin(base_url, href) for href in hrefs if href]
+
+    def listing_detail(self, html):
+        tree = self.HTMLParser(html)
+
+        title = None
+        og_title = tree.css_first(self.OG_TITLE)
+        if og_title is not None:
+            title = og_title.attributes.get('content')
+        if not title:
+            title = self.first_text(tree, 'h1')
+
+        phone = None
+        whatsapp = tree.css_first(self.WHATSAPP_LINK)
+        if whatsapp is not None:
+            phone = phone_from_whatsapp(whatsapp.attributes.get('href'))
+        if not phone:
+            tel = tree.css_first(self.TEL_LINK)
+            if tel is not None:
+                phone = phone_from_tel(tel.attributes.get('href'))
+
+        city = None
+        city_elem = tree.css_first('div.city')
+        if city_elem is not None:
+            city = self.first_text(city_elem, 'b')
+
+        description = None
+        text_elem = tree.css_first('div.text')
+        if text_elem is not None:
+            parts = (node.text_content.strip() for node in text_elem.traverse(include_text=True)
+                     if node.tag == '-text')
+            description = '\n'.join(part for part in parts if part)
+
+        price = None
+        price_elem = tree.css_first('div.gallery-price')
+        if price_elem is not None:
+            price_val = self.first_text(price_elem, 'span.price-val')
+            price_cur = self.first_text(price_elem, 'span.price-cur')
+            if price_val is not None and price_cur is not None:
+                price = f"{price_val} {price_cur}"
+
+        views = None
+        date_posted = None
+        info = tree.css_first('div.info')
+        if info is not None:
+            views_elem = info.css_first('p.views')
+            if views_elem is not None:
+                views = self.first_text(views_elem, 'b')
+            date_elem = info.css_first('p.date')
+            if date_elem is not None:
+                date_posted = self.first_text(date_elem, 'b')
+
+        image_url = None
+        og_image = tree.css_first(self.OG_IMAGE)
+        if og_image is not None:
+            image_url = og_image.attributes.get('content')
+
+        return {
+            'title': title, 'phone': phone, 'city': city, 'price': price,
+            'description': description, 'views': views, 'date_posted': date_posted,
+            'image_url': image_url,
+        }
+
+
+PARSER_ENGINES = {
+    'selectolax': SelectolaxParser,
+    'lxml': LxmlParser,
+    'soup-lxml': lambda: SoupParser('lxml'),
+    'soup': SoupParser,
+}
+
+
+def get_parser(name='auto'):
+    """Instantiate a parser engine; 'auto' picks the fastest one that is installed"""
+    if name != 'auto':
+        return PARSER_ENGINES[name]()
+    for engine in ('selectolax', 'lxml', 'soup'):
+        try:
+            return PARSER_ENGINES[engine]()
+        except ImportError:
+            continue
+    raise ImportError('No HTML parser available: install lxml or beautifulsoup4')
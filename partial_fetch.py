@@ -0,0 +1,172 @@
+"""
+Selective field extraction for refresh crawls
+A refresh that only needs a few fields of an ad page (views and date_posted
+from div.info by default) scans the response body as it streams in and stops
+reading once every requested field has been found, instead of downloading
+the whole page and building a DOM. Fields are found the way parsers.py finds
+them: the first div.info (div.city, div.gallery-price) is located, nested
+divs included, and the values are searched for within it. Apart from an
+element that is still open, only a window around newly received text is
+rescanned, so the work per page is linear in the bytes actually read.
+"""
+
+import codecs
+import html
+import re
+
+DEFAULT_FIELDS = ('views', 'date_posted')
+
+
+def class_token(name):
+    """Pattern for a class attribute with name as one of its tokens"""
+    return rf'''class=["'](?:[^"']*\s)?{re.escape(name)}(?:\s[^"']*)?["']'''
+
+
+def compile_pattern(pattern):
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+
+def div_with_class(name):
+    return compile_pattern(rf'<div\b[^>]*{class_token(name)}[^>]*>')
+
+
+def element_text(tag, name=None):
+    attributes = rf'[^>]*{class_token(name)}' if name else ''
+    return compile_pattern(rf'<{tag}\b{attributes}[^>]*>(?P<value>.*?)</{tag}>')
+
+
+def bold_in_paragraph(name):
+    """Text of the first <b> in the first p with class name"""
+    return compile_pattern(rf'<p\b[^>]*{class_token(name)}[^>]*>(?:(?!</p\b).)*?<b\b[^>]*>(?P<value>.*?)</b>')
+
+
+DIV_TAG = compile_pattern(r'<(/?)div\b[^>]*>')
+CONTAINERS = {name: div_with_class(name) for name in ('info', 'city', 'gallery-price')}
+
+# field -> (div class the values are searched within or None, value patterns)
+FIELD_RULES = {
+    'views': ('info', (bold_in_paragraph('views'),)),
+    'date_posted': ('info', (bold_in_paragraph('date'),)),
+    'city': ('city', (element_text('b'),)),
+    'price': ('gallery-price', (element_text('span', 'price-val'), element_text('span', 'price-cur'))),
+    'image_url': (None, (compile_pattern(
+        r'''<meta\b(?=[^>]*property=["']og:image["'])[^>]*content=["'](?P<value>[^"']*)["']'''),)),
+}
+TAGS = re.compile(r'<[^>]*>')
+
+
+def text_of(fragment):
+    return html.unescape(TAGS.sub('', fragment)).strip()
+
+
+def field_value(field, matches):
+    if field == 'image_url':
+        return html.unescape(matches[0].group('value'))
+    if field == 'price':
+        return ' '.join(text_of(match.group('value')) for match in matches)
+    return text_of(matches[0].group('value'))
+
+
+def locate(container, text):
+    """(opening tag position, content start, content end, closed) of the first div with the
+    container class, or None; the end is the end of text while the div is still open"""
+    opening = CONTAINERS[container].search(text)
+    if opening is None:
+        return None
+    depth = 1
+    for tag in DIV_TAG.finditer(text, opening.end()):
+        depth += -1 if tag.group(1) else 1
+        if not depth:
+            return opening.start(), opening.end(), tag.start(), True
+    return opening.start(), opening.end(), len(text), False
+
+
+def field_list(text):
+    """'views,date_posted' -> ('views', 'date_posted'); ValueError for fields that cannot be scanned"""
+    fields = tuple(field.strip() for field in text.split(',') if field.strip())
+    unknown = [field for field in fields if field not in FIELD_RULES]
+    if not fields or unknown:
+        raise ValueError(f"fields must be among {', '.join(FIELD_RULES)}")
+    return fields
+
+
+class FieldScanner:
+    """Finds a set of fields in text fed chunk by chunk
+
+    A field inside an element (div.info for views and date_posted) is only
+    looked for once that element has opened, and only within it. The text of
+    an element that is still open is kept; otherwise only the last overlap
+    characters of earlier text are kept and rescanned with each chunk. Fields
+    that never match stay None, like a missing element in the parsers.
+    """
+
+    def __init__(self, fields=DEFAULT_FIELDS, overlap=8192):
+        self.pending = {field: FIELD_RULES[field] for field in fields}
+        self.values = dict.fromkeys(fields)
+        self.overlap = overlap
+        self.window = ''
+        self.chars_scanned = 0
+
+    @property
+    def complete(self):
+        return not self.pending
+
+    def feed(self, text):
+        """Scan newly received text; True once every field has been found"""
+        window = self.window + text
+        self.chars_scanned += len(text)
+        keep = max(0, len(window) - self.overlap)
+        located = {}
+        for field, (container, patterns) in list(self.pending.items()):
+            start, end, closed = 0, len(window), False
+            if container:
+                if container not in located:
+                    located[container] = locate(container, window)
+                if located[container] is None:
+                    continue
+                opening, start, end, closed = located[container]
+            matches = [pattern.search(window, start, end) for pattern in patterns]
+            if all(matches):
+                self.values[field] = field_value(field, matches)
+            elif not closed:
+                if container:
+                    keep = min(keep, opening)
+                continue
+            del self.pending[field]
+        self.window = window[keep:]
+        return self.complete
+
+
+def scan_fields(page, fields=DEFAULT_FIELDS):
+    """Requested fields of a whole page (a cached body, say) without parsing it"""
+    scanner = FieldScanner(fields)
+    scanner.feed(page)
+    return scanner.values
+
+
+async def read_fields(response, fields=DEFAULT_FIELDS, chunk_size=16384, drain_below=16384):
+    """Stream a response body through a FieldScanner until every field is found
+
+    Returns (values, body bytes read, whether reading stopped before the end).
+    Stopping early closes the connection instead of returning it to the pool,
+    so an uncompressed body whose unread rest (by Content-Length) is under
+    drain_below bytes is read to the end and dropped.
+    """
+    from transport import iter_body  # aiohttp, only when streaming
+
+    scanner = FieldScanner(fields)
+    decoder = codecs.getincrementaldecoder(getattr(response, 'charset', None) or 'utf-8')(errors='replace')
+    content_length = response.headers.get('Content-Length')
+    drain_limit = None
+    if content_length and content_length.isdigit() and not response.headers.get('Content-Encoding'):
+        drain_limit = int(content_length) - drain_below
+    bytes_read = 0
+    async for chunk in iter_body(response, chunk_size):
+        bytes_read += len(chunk)
+        if scanner.complete:
+            continue  # draining
+        if scanner.feed(decoder.decode(chunk)) and (drain_limit is None or bytes_read < drain_limit):
+            return scanner.values, bytes_read, True
+    if not scanner.complete:
+        scanner.feed(decoder.decode(b'', final=True))
+    return scanner.values, bytes_read, False
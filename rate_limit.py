@@ -0,0 +1,135 @@
+"""
+Rate limiting for the scraper
+A global token bucket paces requests per second, and an AIMD limiter adapts
+the number of in-flight requests to observed latency and 429/5xx responses
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds to wait"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Global requests-per-second limit, independent of how many requests are in flight"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (used for Retry-After)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def take(self, count):
+        """Take up to count tokens without waiting; returns how many were granted"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until:
+            return 0
+        granted = min(count, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def refund(self, count):
+        """Return tokens from take() that were not used"""
+        self.tokens = min(self.capacity, self.tokens + count)
+
+    def delay(self):
+        """Seconds until take() can grant a token"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        tokens = self.tokens + (now - self.updated) * self.rate
+        return max(0.0, (1 - tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """AIMD in-flight limit: +1 per window of fast successes, halved on overload
+
+    Use as an async context manager around each request, then report the
+    outcome with on_success(latency) or on_overload().
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial=None, latency_target=2.0,
+                 backoff=0.5, cooldown=1.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial if initial is not None else max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self, latency):
+        if latency > self.latency_target:
+            self.decrease(f"latency {latency:.2f}s above target")
+        elif self.limit < self.max_limit:
+            # Additive increase: about +1 slot once a full window of requests succeeds
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_overload(self):
+        self.decrease("server overloaded")
+
+    def decrease(self, reason):
+        # Requests that were already in flight fail together; count that as one signal
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        if int(self.limit) != previous:
+            logger.warning(f"Concurrency {previous} -> {int(self.limit)} ({reason})")
@@ -1,12 +1,22 @@
+import argparse
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
+from collections import OrderedDict
 import json
 import csv
 import re
-from urllib.parse import urljoin, urlparse, parse_qs
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+import os
+import time
+
+from frontier import DONE, FAILED, IN_FLIGHT, Frontier
+from metrics import CrawlMetrics
+from normalize import normalize_record, parse_date
+from parse_stage import ParseStage
+from parsers import phone_from_tel, phone_from_whatsapp
+from rate_limit import AdaptiveConcurrency, TokenBucket, parse_retry_after
+from sinks import JsonlSink, ParquetSink, export_stream, read_jsonl
+from transport import TransportConfig, TransportStats, create_session
 
 # Configure logging
 logging.basicConfig(
@@ -15,40 +25,225 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+AD_ID_PATTERN = re.compile(r'/ads/(\d+)\.html')
+
+
+def extract_ad_id(listing_url):
+    """Extract the numeric ad ID from a /ads/<id>.html URL"""
+    match = AD_ID_PATTERN.search(listing_url)
+    return match.group(1) if match else None
+
+
+def load_known_listings(json_path='temirci_listings.json', csv_path='temirci_listings.csv'):
+    """Load previously scraped listings keyed by (ad_id, category)
+
+    The JSON file is preferred; the CSV is used when the JSON is missing.
+    """
+    records = []
+    if os.path.exists(json_path):
+        with open(json_path, encoding='utf-8') as f:
+            records = json.load(f)
+    elif os.path.exists(csv_path):
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            records = list(csv.DictReader(f))
+
+    known = {}
+    for record in records:
+        ad_id = record.get('ad_id') or extract_ad_id(record.get('listing_url') or '')
+        if ad_id:
+            known[(str(ad_id), record.get('category'))] = record
+    return known
+
 
 class TemirciScraper:
-    def __init__(self, base_url='https://www.temirci.az', max_concurrent=10):
+    # Lower value is taken off the crawl queue first
+    JOB_PRIORITY = {'listing': 0, 'refresh': 0, 'page': 1, 'category': 2}
+
+    def __init__(self, base_url='https://www.temirci.az', max_concurrent=10,
+                 requests_per_second=20, known_listings=None, refresh_after=None, refresh_age_ratio=0.1,
+                 http_cache=None, parser='auto', parse_executor='inline', parse_workers=None,
+                 sinks=None, keep_listings=True, frontier=None, memo_max_bytes=64 * 1024 * 1024,
+                 transport=None, metrics=None, fingerprints=None, image_stage=None, refresh_fields=None):
         self.base_url = base_url
+        # HTML engine from parsers.py ('auto', 'selectolax', 'lxml', 'soup-lxml' or 'soup'),
+        # run on the event loop ('inline') or in a 'process'/'thread' pool
+        self.parse_stage = ParseStage(parser, executor=parse_executor, workers=parse_workers)
         self.max_concurrent = max_concurrent
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        # Requests/sec pacing is separate from the in-flight limit, which adapts
+        # between 1 and max_concurrent based on latency and 429/5xx responses
+        self.rate_limiter = TokenBucket(requests_per_second, burst=max_concurrent)
+        self.concurrency = AdaptiveConcurrency(max_concurrent)
+        # Connection pool, DNS cache, compression and timeouts (pool sized to max_concurrent)
+        self.transport = transport or TransportConfig(limit=max_concurrent)
+        self.transport_stats = TransportStats()
         self.all_listings = []
+        # Streaming sinks from sinks.py receive every record as it is scraped;
+        # keep_listings=False stops accumulating them in all_listings
+        self.sinks = sinks or []
+        self.keep_listings = keep_listings
+        self.listings_scraped = 0
+        # Incremental mode: previously scraped records keyed by (ad_id, category).
+        # refresh_after (a timedelta) re-fetches known ads older than that to update views;
+        # refresh_age_ratio stretches it to that fraction of an ad's age (from date_posted).
+        self.known_listings = known_listings
+        self.refresh_after = refresh_after
+        self.refresh_age_ratio = refresh_age_ratio
+        # refresh_fields (e.g. ('views', 'date_posted')) makes those refreshes read only
+        # these fields, streaming each page until they are found (partial_fetch.py)
+        self.refresh_fields = refresh_fields
+        # Optional HttpCache: conditional requests, 304s served from disk, offline replay
+        self.http_cache = http_cache
+        # Optional Frontier: every job and its state is checkpointed to SQLite for --resume
+        self.frontier = frontier
+        # Optional FingerprintStore: ad pages whose content is unchanged since the last
+        # crawl reuse the stored fields instead of being parsed again
+        self.fingerprints = fingerprints
+        # Optional ImageStage: every listing's image_url is handed to it and downloaded
+        # in the background with its own connection pool and rate limit
+        self.image_stage = image_stage
+        # Per-crawl page memo and in-flight request coalescing
+        self.page_memo = OrderedDict()
+        self.memo_bytes = 0
+        self.memo_max_bytes = memo_max_bytes
+        self.inflight = {}
+        self.memo_hits = 0
+        self.coalesced_requests = 0
+        self.job_counter = 0
+        self.pages_fetched = 0
+        self.started_at = None
+        self.finished_at = None
+        # Latency histograms and counters from metrics.py, plus gauges read from the components
+        self.metrics = metrics or CrawlMetrics()
+        self.register_gauges()
+
+    def register_gauges(self):
+        metrics = self.metrics
+        metrics.gauge('pages_fetched', lambda: self.pages_fetched, 'Pages downloaded or served from the HTTP cache')
+        metrics.gauge('listings_scraped', lambda: self.listings_scraped, 'Listings handed to the sinks')
+        metrics.gauge('memo_hits', lambda: self.memo_hits, 'Repeat URLs served from the page memo')
+        metrics.gauge('coalesced_requests', lambda: self.coalesced_requests,
+                      'Requests that joined an identical in-flight download')
+        metrics.gauge('concurrency_limit', lambda: self.concurrency.limit, 'Adaptive in-flight request limit')
+        metrics.gauge('requests_in_flight', lambda: self.concurrency.in_flight, 'Requests holding a slot')
+        metrics.gauge('wire_bytes', lambda: self.transport_stats.wire_bytes,
+                      'Response bytes on the wire (Content-Length sum under aiohttp)')
+        metrics.gauge('unsized_responses', lambda: self.transport_stats.unsized_responses,
+                      'Responses without Content-Length, not counted in wire_bytes')
+        metrics.gauge('body_bytes', lambda: self.transport_stats.body_bytes, 'Decoded response body bytes')
+        metrics.gauge('connections_created', lambda: self.transport_stats.connections_created,
+                      'TCP connections opened')
+        metrics.gauge('connections_reused', lambda: self.transport_stats.connections_reused,
+                      'Requests sent on a pooled connection')
+        metrics.gauge('parse_queue_depth', lambda: self.parse_stage.queue.qsize() if self.parse_stage.queue else 0,
+                      'Pages waiting for the parse pool')
 
     async def fetch(self, session, url, retries=3):
-        """Fetch a URL with retry logic and rate limiting"""
-        async with self.semaphore:
-            for attempt in range(retries):
-                try:
-                    await asyncio.sleep(0.5)  # Rate limiting
-                    async with session.get(url, timeout=30) as response:
+        """Fetch a URL at most once per crawl
+
+        Successful bodies are memoized (LRU, bounded by memo_max_bytes) and
+        concurrent requests for the same URL share one in-flight download.
+        """
+        if url in self.page_memo:
+            self.page_memo.move_to_end(url)
+            self.memo_hits += 1
+            return self.page_memo[url]
+        if url in self.inflight:
+            self.coalesced_requests += 1
+            return await asyncio.shield(self.inflight[url])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[url] = future
+        try:
+            html = await self.download(session, url, retries)
+        except Exception as e:
+            # Coalesced waiters get the same error, not a CancelledError that would stop their worker
+            future.set_exception(e)
+            future.exception()  # retrieved here, so an unshared failure is not logged as unhandled
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self.inflight[url]
+        future.set_result(html)
+        if html:
+            self.remember_page(url, html)
+        return html
+
+    def remember_page(self, url, html):
+        self.page_memo[url] = html
+        self.memo_bytes += len(html)
+        while self.memo_bytes > self.memo_max_bytes and self.page_memo:
+            _, evicted = self.page_memo.popitem(last=False)
+            self.memo_bytes -= len(evicted)
+
+    async def download(self, session, url, retries=3, reader=None):
+        """Fetch a URL with retry logic and rate limiting
+
+        reader, a coroutine function taking the response, replaces reading the
+        whole body as text; its result is returned and the HTTP cache is not used.
+        """
+        http_cache = self.http_cache if reader is None else None
+        cached = http_cache.get(url) if http_cache else None
+        if http_cache and http_cache.offline:
+            if cached is None:
+                logger.warning(f"Offline replay: {url} is not in the HTTP cache")
+                return None
+            http_cache.record_hit(url, cached)
+            self.metrics.increment('cache_responses', source='offline')
+            self.pages_fetched += 1
+            return cached['body']
+        headers = http_cache.conditional_headers(cached) if http_cache else None
+
+        metrics = self.metrics
+        for attempt in range(retries):
+            backoff = 2 ** attempt
+            if attempt:
+                metrics.increment('retries')
+            try:
+                waiting = time.monotonic()
+                await self.rate_limiter.acquire()
+                async with self.concurrency:
+                    started = time.monotonic()
+                    metrics.observe('slot_wait_seconds', started - waiting)
+                    async with session.get(url, headers=headers) as response:
+                        metrics.increment('responses', status=response.status)
+                        if response.status == 304 and cached:
+                            self.concurrency.on_success(time.monotonic() - started)
+                            metrics.observe('network_seconds', time.monotonic() - started)
+                            metrics.increment('cache_responses', source='revalidated')
+                            http_cache.record_hit(url, cached, revalidated=True)
+                            self.pages_fetched += 1
+                            return cached['body']
                         if response.status == 200:
-                            return await response.text()
+                            body = await (reader(response) if reader else response.text())
+                            self.concurrency.on_success(time.monotonic() - started)
+                            metrics.observe('network_seconds', time.monotonic() - started)
+                            if http_cache:
+                                http_cache.store(url, response.headers, body)
+                            self.pages_fetched += 1
+                            return body
+
+                        logger.warning(f"Status {response.status} for {url}")
+                        if response.status == 429 or response.status >= 500:
+                            self.concurrency.on_overload()
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            if retry_after is not None:
+                                self.rate_limiter.pause(retry_after)
+                                backoff = 0
                         else:
-                            logger.warning(f"Status {response.status} for {url}")
-                except Exception as e:
-                    logger.error(f"Attempt {attempt + 1}/{retries} failed for {url}: {e}")
-                    if attempt < retries - 1:
-                        await asyncio.sleep(2 ** attempt)  # Exponential backoff
-                    else:
-                        return None
-            return None
+                            self.concurrency.on_success(time.monotonic() - started)
+            except Exception as e:
+                metrics.increment('request_errors', error=type(e).__name__)
+                logger.error(f"Attempt {attempt + 1}/{retries} failed for {url}: {e}")
+            if attempt < retries - 1 and backoff:
+                await asyncio.sleep(backoff)  # Exponential backoff, outside the concurrency slot
+        return None
 
     def extract_phone_from_whatsapp(self, whatsapp_url):
         """Extract phone number from WhatsApp URL"""
         try:
-            # Example: https://api.whatsapp.com/send/?phone=+994707044477&text=...
-            match = re.search(r'phone=([+\d]+)', whatsapp_url)
-            if match:
-                return match.group(1)
+            return phone_from_whatsapp(whatsapp_url)
         except Exception as e:
             logger.error(f"Error extracting phone: {e}")
         return None
@@ -56,9 +251,7 @@ class TemirciScraper:
     def extract_phone_from_tel(self, tel_url):
         """Extract phone from tel: link"""
         try:
-            # Example: tel:(070) 704-4477
-            phone = tel_url.replace('tel:', '').strip()
-            return phone
+            return phone_from_tel(tel_url)
         except Exception as e:
             logger.error(f"Error extracting tel: {e}")
         return None
@@ -70,22 +263,9 @@ class TemirciScraper:
         if not html:
             return []
 
-        soup = BeautifulSoup(html, 'html.parser')
-        categories = []
-
-        # Find all category links
-        category_container = soup.find('div', class_='service_category')
-        if category_container:
-            category_links = category_container.find_all('a', class_='services')
-            for link in category_links:
-                category_url = urljoin(self.base_url, link.get('href'))
-                category_name = link.text.strip()
-                categories.append({
-                    'name': category_name,
-                    'url': category_url
-                })
-                logger.info(f"Found category: {category_name}")
-
+        categories = await self.parse('categories', html, self.base_url)
+        for category in categories:
+            logger.info(f"Found category: {category['name']}")
         return categories
 
     async def get_total_pages(self, session, category_url):
@@ -93,25 +273,18 @@ class TemirciScraper:
         html = await self.fetch(session, category_url)
         if not html:
             return 1
+        return await self.parse('total_pages', html)
 
-        soup = BeautifulSoup(html, 'html.parser')
-        pagination = soup.find('ul', class_='pagination')
-
-        if pagination:
-            page_links = pagination.find_all('a')
-            page_numbers = []
-            for link in page_links:
-                try:
-                    # Extract page number from URL or text
-                    text = link.text.strip()
-                    if text.isdigit():
-                        page_numbers.append(int(text))
-                except:
-                    continue
-
-            return max(page_numbers) if page_numbers else 1
+    async def get_category_page(self, session, page_url):
+        """Fetch a category page once and return (total_pages, listing_urls)"""
+        html = await self.fetch(session, page_url)
+        if not html:
+            return None, []
 
-        return 1
+        total_pages = await self.parse('total_pages', html)
+        listing_urls = await self.parse('listing_urls', html, self.base_url)
+        logger.debug(f"Found {len(listing_urls)} listings on {page_url}")
+        return total_pages, listing_urls
 
     async def get_listing_urls_from_page(self, session, page_url):
         """Extract all listing URLs from a category page"""
@@ -119,124 +292,95 @@ class TemirciScraper:
         if not html:
             return []
 
-        soup = BeautifulSoup(html, 'html.parser')
-        listing_urls = []
-
-        # Find all gallery items (listings)
-        galleries = soup.find_all('a', class_='gallery')
-        for gallery in galleries:
-            listing_url = gallery.get('href')
-            if listing_url:
-                full_url = urljoin(self.base_url, listing_url)
-                listing_urls.append(full_url)
-
-        logger.info(f"Found {len(listing_urls)} listings on {page_url}")
+        listing_urls = await self.parse('listing_urls', html, self.base_url)
+        logger.debug(f"Found {len(listing_urls)} listings on {page_url}")
         return listing_urls
 
+    async def parse(self, method, html, *args):
+        """Run a parse_stage method, timing it (pool queue wait included)"""
+        with self.metrics.timer('parse_seconds', method=method):
+            return await self.parse_stage.parse(method, html, *args)
+
     async def scrape_listing_detail(self, session, listing_url, category_name):
-        """Scrape detailed information from a single listing page"""
+        """Scrape detailed information from a single listing page
+
+        With a fingerprint store, an unchanged page is not parsed: its stored fields
+        are reused. The record is still returned with a new scraped_at, so a views
+        refresh of an unchanged ad is recorded and not due again next run.
+        """
         html = await self.fetch(session, listing_url)
         if not html:
             return None
 
-        soup = BeautifulSoup(html, 'html.parser')
-
         try:
-            # Extract ad ID from URL
-            ad_id_match = re.search(r'/ads/(\d+)\.html', listing_url)
-            ad_id = ad_id_match.group(1) if ad_id_match else None
-
-            # Extract title from og:title meta tag or h1
-            title = None
-            og_title = soup.find('meta', property='og:title')
-            if og_title:
-                title = og_title.get('content')
-            if not title:
-                h1 = soup.find('h1')
-                if h1:
-                    title = h1.text.strip()
-
-            # Extract phone number from WhatsApp link
-            phone = None
-            whatsapp_link = soup.find('a', href=re.compile(r'whatsapp\.com'))
-            if whatsapp_link:
-                phone = self.extract_phone_from_whatsapp(whatsapp_link.get('href'))
-
-            # If no WhatsApp, try tel: link
-            if not phone:
-                tel_link = soup.find('a', href=re.compile(r'^tel:'))
-                if tel_link:
-                    phone = self.extract_phone_from_tel(tel_link.get('href'))
-
-            # Extract city
-            city = None
-            city_elem = soup.find('div', class_='city')
-            if city_elem:
-                city_text = city_elem.find('b')
-                if city_text:
-                    city = city_text.text.strip()
-
-            # Extract description
-            description = None
-            text_elem = soup.find('div', class_='text')
-            if text_elem:
-                description = text_elem.get_text(strip=True, separator='\n')
-
-            # Extract price
-            price = None
-            price_elem = soup.find('div', class_='gallery-price')
-            if price_elem:
-                price_val = price_elem.find('span', class_='price-val')
-                price_cur = price_elem.find('span', class_='price-cur')
-                if price_val and price_cur:
-                    price = f"{price_val.text.strip()} {price_cur.text.strip()}"
-
-            # Extract views, date, etc. from info section
-            views = None
-            date_posted = None
-
-            info_section = soup.find('div', class_='info')
-            if info_section:
-                views_elem = info_section.find('p', class_='views')
-                if views_elem:
-                    views_b = views_elem.find('b')
-                    if views_b:
-                        views = views_b.text.strip()
-
-                date_elem = info_section.find('p', class_='date')
-                if date_elem:
-                    date_b = date_elem.find('b')
-                    if date_b:
-                        date_posted = date_b.text.strip()
-
-            # Extract image URL
-            image_url = None
-            og_image = soup.find('meta', property='og:image')
-            if og_image:
-                image_url = og_image.get('content')
-
-            listing_data = {
+            fields = None
+            if self.fingerprints:
+                state, fields, digest, _ = self.fingerprints.lookup(listing_url, html)
+                self.metrics.increment('listing_pages', state=state)
+            if fields is None:
+                fields = await self.parse('listing_detail', html)
+                if self.fingerprints:
+                    self.fingerprints.record(listing_url, digest, fields)
+            ad_id = extract_ad_id(listing_url)
+
+            listing_data = normalize_record({
                 'ad_id': ad_id,
                 'category': category_name,
-                'title': title,
-                'phone': phone,
-                'city': city,
-                'price': price,
-                'description': description,
-                'views': views,
-                'date_posted': date_posted,
-                'image_url': image_url,
+                'title': fields['title'],
+                'phone': fields['phone'],
+                'city': fields['city'],
+                'price': fields['price'],
+                'description': fields['description'],
+                'views': fields['views'],
+                'date_posted': fields['date_posted'],
+                'image_url': fields['image_url'],
                 'listing_url': listing_url,
                 'scraped_at': datetime.now().isoformat()
-            }
+            })
 
-            logger.info(f"Scraped listing {ad_id}: {title}")
+            logger.debug(f"Scraped listing {ad_id}: {fields['title']}")
             return listing_data
 
         except Exception as e:
             logger.error(f"Error scraping {listing_url}: {e}")
             return None
 
+    async def refresh_listing(self, session, listing_url, category_name):
+        """Re-read only refresh_fields of a known ad and return its updated record
+
+        Without an HTTP cache the page is streamed and the download stops once
+        the fields have been found; it skips the page memo, fingerprints and the
+        parse stage. With a cache the cached or revalidated page is scanned
+        instead. Ads missing from known_listings, and pages where a field the
+        known record had was not found, get a full scrape; a field the ad never
+        had stays empty without a second request.
+        """
+        known = self.known_listings.get((extract_ad_id(listing_url), category_name))
+        if known is None:
+            return await self.scrape_listing_detail(session, listing_url, category_name)
+        if self.http_cache:
+            from partial_fetch import scan_fields
+            html = await self.fetch(session, listing_url)
+            fields = scan_fields(html, self.refresh_fields) if html else None
+        else:
+            fields = await self.download(session, listing_url, reader=self.read_refresh_fields)
+        if fields is None:
+            return None
+        missing = [field for field, value in fields.items() if value is None and known.get(field) not in (None, '')]
+        if missing:
+            self.metrics.increment('refresh_fallbacks')
+            logger.debug(f"No {', '.join(missing)} found in {listing_url}, scraping the whole page")
+            return await self.scrape_listing_detail(session, listing_url, category_name)
+        logger.debug(f"Refreshed {listing_url}: {fields}")
+        return normalize_record({**known, **fields, 'scraped_at': datetime.now().isoformat()})
+
+    async def read_refresh_fields(self, response):
+        from partial_fetch import read_fields
+        fields, bytes_read, stopped_early = await read_fields(response, self.refresh_fields)
+        self.metrics.increment('refresh_pages', read='partial' if stopped_early else 'full')
+        self.metrics.increment('refresh_body_bytes', bytes_read)
+        return fields
+
     async def scrape_category(self, session, category):
         """Scrape all listings from a category"""
         category_name = category['name']
@@ -249,13 +393,7 @@ class TemirciScraper:
         logger.info(f"Category '{category_name}' has {total_pages} pages")
 
         # Generate all page URLs
-        base_category_url = category_url.replace('.html', '')
-        page_urls = []
-        for page_num in range(1, total_pages + 1):
-            if page_num == 1:
-                page_urls.append(category_url)
-            else:
-                page_urls.append(f"{base_category_url}/{page_num}.html")
+        page_urls = self.build_page_urls(category_url, total_pages)
 
         # Get all listing URLs from all pages
         all_listing_urls = []
@@ -276,9 +414,216 @@ class TemirciScraper:
 
         return listing_data
 
+    def build_page_urls(self, category_url, total_pages):
+        """Build the URLs of every page in a category"""
+        base_category_url = category_url.replace('.html', '')
+        page_urls = []
+        for page_num in range(1, total_pages + 1):
+            if page_num == 1:
+                page_urls.append(category_url)
+            else:
+                page_urls.append(f"{base_category_url}/{page_num}.html")
+        return page_urls
+
+    @property
+    def incremental(self):
+        return self.known_listings is not None
+
+    def is_known(self, listing_url, category_name):
+        """Whether an ad was already scraped in this category by an earlier run"""
+        return (extract_ad_id(listing_url), category_name) in self.known_listings
+
+    def refresh_interval(self, record, scraped_at):
+        """How long a known ad's views stay fresh: refresh_after, or refresh_age_ratio of the
+        ad's age when it was last scraped if that is longer
+
+        Views of a new ad move quickly; with the default ratio of 0.1 an ad that
+        was a year old is refreshed about every five weeks instead of every run.
+        """
+        posted = parse_date(record.get('date_posted'))
+        if not posted or not self.refresh_age_ratio:
+            return self.refresh_after
+        age = scraped_at - datetime.fromisoformat(posted)
+        return max(self.refresh_after, age * self.refresh_age_ratio)
+
+    def stale_known_listings(self):
+        """Known records scraped longer ago than their refresh_interval"""
+        if self.refresh_after is None:
+            return []
+        now = datetime.now()
+        stale = []
+        for record in self.known_listings.values():
+            try:
+                scraped_at = datetime.fromisoformat(record.get('scraped_at') or '')
+            except ValueError:
+                scraped_at = datetime.min
+            if record.get('listing_url') and now - scraped_at > self.refresh_interval(record, scraped_at):
+                stale.append(record)
+        return stale
+
+    async def crawl_worker(self, session, queue):
+        """Take jobs off the shared queue until the crawl is cancelled"""
+        while True:
+            _, _, job, enqueued_at = await queue.get()
+            self.metrics.observe('job_queue_wait_seconds', time.monotonic() - enqueued_at, kind=job['kind'])
+            if self.frontier:
+                self.frontier.mark(job, IN_FLIGHT)
+            state = DONE
+            try:
+                if job['kind'] == 'category':
+                    await self.process_category_job(session, queue, job)
+                elif job['kind'] == 'page':
+                    await self.process_page_job(session, queue, job)
+                else:
+                    if job['kind'] == 'refresh':
+                        listing_data = await self.refresh_listing(session, job['url'], job['category'])
+                    else:
+                        listing_data = await self.scrape_listing_detail(session, job['url'], job['category'])
+                    if listing_data is not None:
+                        self.emit(listing_data)
+                    else:
+                        state = FAILED
+            except Exception as e:
+                state = FAILED
+                logger.error(f"Error processing {job['kind']} job {job['url']}: {e}")
+            finally:
+                if self.frontier:
+                    self.frontier.mark(job, state)
+                    if self.frontier.needs_commit():
+                        self.checkpoint()
+                queue.task_done()
+
+    async def process_category_job(self, session, queue, job):
+        """Handle page 1 of a category and queue the rest of its pages
+
+        Page 1 is fetched once: its pagination gives the page count and its
+        listings are queued right away, alongside the later pages.
+        """
+        total_pages, listing_urls = await self.get_category_page(session, job['url'])
+        if total_pages is None:
+            raise RuntimeError(f"could not fetch category page {job['url']}")
+        logger.info(f"Category '{job['category']}' has {total_pages} pages")
+        first_page = {'url': job['url'], 'category': job['category'], 'category_url': job['url'],
+                      'page_num': 1, 'total_pages': total_pages}
+        self.queue_page_listings(queue, first_page, listing_urls)
+        if self.incremental:
+            # Pages are walked in order so pagination can stop at the first page of known ads
+            return
+        for page_num, page_url in enumerate(self.build_page_urls(job['url'], total_pages)[1:], start=2):
+            self.enqueue(queue, 'page', page_url, job['category'],
+                         category_url=job['url'], page_num=page_num, total_pages=total_pages)
+
+    async def process_page_job(self, session, queue, job):
+        """Queue the listings on a category page"""
+        listing_urls = await self.get_listing_urls_from_page(session, job['url'])
+        self.queue_page_listings(queue, job, listing_urls)
+
+    def queue_page_listings(self, queue, job, listing_urls):
+        """Queue a page's listings, and in incremental mode the next page"""
+        if self.incremental:
+            new_urls = [url for url in listing_urls if not self.is_known(url, job['category'])]
+            if new_urls and job['page_num'] < job['total_pages']:
+                next_url = self.build_page_urls(job['category_url'], job['page_num'] + 1)[-1]
+                self.enqueue(queue, 'page', next_url, job['category'],
+                             category_url=job['category_url'], page_num=job['page_num'] + 1,
+                             total_pages=job['total_pages'])
+            elif not new_urls:
+                logger.info(f"Only known ads on {job['url']}, stopping pagination for '{job['category']}'")
+            listing_urls = new_urls
+        for listing_url in listing_urls:
+            self.enqueue(queue, 'listing', listing_url, job['category'])
+
+    def enqueue(self, queue, kind, url, category_name, **extra):
+        """Put a job on the crawl queue, listings first so the frontier stays small"""
+        job = {'kind': kind, 'url': url, 'category': category_name, **extra}
+        if self.frontier:
+            self.frontier.add(job)
+        self.put_job(queue, job)
+
+    def put_job(self, queue, job):
+        self.job_counter += 1
+        queue.put_nowait((self.JOB_PRIORITY[job['kind']], self.job_counter, job, time.monotonic()))
+
+    def checkpoint(self):
+        """Flush sinks before committing the frontier, so a job marked done is never lost"""
+        for sink in self.sinks:
+            sink.flush()
+        if self.fingerprints:
+            self.fingerprints.commit()
+        if self.frontier:
+            self.frontier.commit()
+
+    def emit(self, listing_data):
+        """Hand a scraped record to the sinks (and all_listings when kept in memory)"""
+        self.listings_scraped += 1
+        for sink in self.sinks:
+            with self.metrics.timer('sink_write_seconds', sink=type(sink).__name__):
+                sink.write(listing_data)
+        if self.image_stage:
+            self.image_stage.submit(listing_data.get('image_url'))
+        if self.keep_listings:
+            self.all_listings.append(listing_data)
+
+    def merge_known_listings(self):
+        """Fold newly scraped and refreshed records into the known set"""
+        merged = dict(self.known_listings)
+        for record in self.all_listings:
+            merged[(record['ad_id'], record['category'])] = record
+        self.all_listings = list(merged.values())
+
     async def scrape_all(self):
-        """Main scraping function"""
-        async with aiohttp.ClientSession() as session:
+        """Main scraping function: categories, pages and listings share one worker pool"""
+        self.started_at = time.monotonic()
+        self.pages_fetched = 0
+        queue = asyncio.PriorityQueue()
+
+        async with create_session(self.transport, self.transport_stats) as session:
+            if self.frontier and not self.frontier.is_empty():
+                resumed = self.frontier.resume_jobs()
+                logger.info(f"Resuming crawl with {len(resumed)} unfinished jobs")
+                for job in resumed:
+                    self.put_job(queue, job)
+            else:
+                # Get all categories
+                categories = await self.get_categories(session)
+                logger.info(f"Found {len(categories)} categories")
+
+                for category in categories:
+                    self.enqueue(queue, 'category', category['url'], category['name'])
+
+            if self.incremental:
+                stale = self.stale_known_listings()
+                logger.info(f"Incremental crawl: {len(self.known_listings)} known ads, "
+                            f"{len(stale)} due for refresh")
+                kind = 'refresh' if self.refresh_fields else 'listing'
+                for record in stale:
+                    self.enqueue(queue, kind, record['listing_url'], record['category'])
+
+            workers = [
+                asyncio.create_task(self.crawl_worker(session, queue))
+                for _ in range(self.max_concurrent)
+            ]
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        await self.parse_stage.close()
+        self.checkpoint()
+        self.finished_at = time.monotonic()
+        self.log_throughput()
+        if self.incremental:
+            logger.info(f"Scraped {self.listings_scraped} new or refreshed listings")
+            if self.keep_listings:
+                self.merge_known_listings()
+        return self.all_listings
+
+    async def scrape_all_sequential(self):
+        """Scrape categories one at a time (the original crawl order, kept for benchmarking)"""
+        self.started_at = time.monotonic()
+        self.pages_fetched = 0
+
+        async with create_session(self.transport, self.transport_stats) as session:
             # Get all categories
             categories = await self.get_categories(session)
             logger.info(f"Found {len(categories)} categories")
@@ -286,11 +631,37 @@ class TemirciScraper:
             # Scrape all categories
             for category in categories:
                 category_listings = await self.scrape_category(session, category)
-                self.all_listings.extend(category_listings)
-                logger.info(f"Total listings scraped so far: {len(self.all_listings)}")
+                for listing_data in category_listings:
+                    self.emit(listing_data)
+                logger.info(f"Total listings scraped so far: {self.listings_scraped}")
 
+        await self.parse_stage.close()
+        self.finished_at = time.monotonic()
+        self.log_throughput()
         return self.all_listings
 
+    def pages_per_second(self):
+        """Pages fetched per second of wall-clock time for the last crawl"""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        elapsed = end - self.started_at
+        return self.pages_fetched / elapsed if elapsed > 0 else 0.0
+
+    def log_throughput(self):
+        """Log page count, elapsed time and pages/sec for the last crawl"""
+        elapsed = self.finished_at - self.started_at
+        logger.info(
+            f"Fetched {self.pages_fetched} pages in {elapsed:.1f}s "
+            f"({self.pages_per_second():.2f} pages/sec); "
+            f"{self.memo_hits} repeat URLs served from memo, {self.coalesced_requests} coalesced"
+        )
+        self.transport_stats.log_stats()
+        self.parse_stage.log_stats()
+        if self.fingerprints:
+            self.fingerprints.log_stats()
+        self.metrics.log_summary()
+
     def save_to_json(self, filename='temirci_listings.json'):
         """Save scraped data to JSON file"""
         with open(filename, 'w', encoding='utf-8') as f:
@@ -311,23 +682,200 @@ class TemirciScraper:
         logger.info(f"Saved {len(self.all_listings)} listings to {filename}")
 
 
-async def main():
-    scraper = TemirciScraper(max_concurrent=10)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape service listings from temirci.az')
+    parser.add_argument('--base-url', default='https://www.temirci.az')
+    parser.add_argument('--max-concurrent', type=int, default=10,
+                        help='Upper bound for the adaptive in-flight request limit')
+    parser.add_argument('--rate', type=float, default=20,
+                        help='Global request rate limit in requests per second')
+    parser.add_argument('--connect-timeout', type=float, default=10)
+    parser.add_argument('--read-timeout', type=float, default=30)
+    parser.add_argument('--keepalive', type=float, default=30,
+                        help='Seconds an idle pooled connection is kept open')
+    parser.add_argument('--dns-cache-ttl', type=float, default=300)
+    parser.add_argument('--no-compression', action='store_true',
+                        help='Ask for uncompressed responses')
+    parser.add_argument('--http2', action='store_true',
+                        help='Use httpx with HTTP/2 instead of aiohttp (requires httpx[http2])')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only fetch ads missing from the existing JSON/CSV output')
+    parser.add_argument('--refresh-views-after', type=float, metavar='HOURS',
+                        help='In incremental mode, re-fetch known ads scraped more than HOURS ago')
+    parser.add_argument('--refresh-age-ratio', type=float, default=0.1, metavar='RATIO',
+                        help='Refresh older ads less often: wait RATIO times the ad\'s age (from '
+                             'date_posted) when that is longer than --refresh-views-after; 0 disables')
+    parser.add_argument('--refresh-fields', nargs='?', const='views,date_posted',
+                        metavar='FIELDS',
+                        help='Refresh stale ads by reading only these comma-separated fields (views, '
+                             'date_posted, city, price, image_url; default views,date_posted), '
+                             'stopping each download once they are found')
+    parser.add_argument('--parser', default='auto',
+                        choices=['auto', 'selectolax', 'lxml', 'soup-lxml', 'soup'],
+                        help='HTML parsing engine (soup is the html.parser fallback)')
+    parser.add_argument('--parse-executor', default='process', choices=['process', 'thread', 'inline'],
+                        help='Where HTML parsing runs; inline parses on the event loop')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count(),
+                        help='Parse pool size')
+    parser.add_argument('--stream', default='temirci_listings.jsonl', metavar='PATH',
+                        help='JSON Lines file each listing is appended to as it is scraped')
+    parser.add_argument('--parquet', metavar='PATH',
+                        help='Also stream listings to a Parquet file (requires pyarrow)')
+    parser.add_argument('--aggregates', metavar='PATH',
+                        help='Also apply each listing to the chart aggregate store (SQLite)')
+    parser.add_argument('--db', metavar='PATH',
+                        help='Also upsert each listing into the SQLite listings database (one row per ad_id)')
+    parser.add_argument('--search-index', metavar='PATH',
+                        help='Also index each listing for full-text search (see search_index.py)')
+    parser.add_argument('--dedup', metavar='PATH',
+                        help='Also add each listing to the near-duplicate/provider index (see dedup.py)')
+    parser.add_argument('--views-snapshots', metavar='DIR',
+                        help='Append this crawl\'s view counts to the snapshot store (see snapshot_store.py)')
+    parser.add_argument('--fingerprints', metavar='PATH',
+                        help='SQLite store of page fingerprints and the listing change feed; '
+                             'unchanged ad pages skip parsing')
+    parser.add_argument('--images', metavar='DIR',
+                        help='Download listing images to DIR in a background stage, deduplicated by content')
+    parser.add_argument('--image-db', default='temirci_images.sqlite', metavar='PATH',
+                        help='SQLite index of downloaded images and their metadata')
+    parser.add_argument('--image-concurrency', type=int, default=4,
+                        help='Concurrent image downloads, separate from --max-concurrent')
+    parser.add_argument('--image-rate', type=float, default=5, help='Image requests per second')
+    parser.add_argument('--flush-every', type=int, default=100,
+                        help='Flush the streaming sinks after this many listings')
+    parser.add_argument('--frontier', default='crawl_frontier.sqlite', metavar='PATH',
+                        help='SQLite file recording every crawl job and its state')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted crawl from --frontier and append to --stream')
+    parser.add_argument('--http-cache', metavar='PATH',
+                        help='SQLite file for the conditional-request response cache')
+    parser.add_argument('--offline', action='store_true',
+                        help='Replay the crawl from --http-cache without touching the network')
+    parser.add_argument('--cache-max-mb', type=float, default=512,
+                        help='Evict least-recently-used cache entries above this size')
+    parser.add_argument('--cache-max-age-days', type=float, default=30,
+                        help='Evict cache entries stored more than this many days ago')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve Prometheus text on /metrics (and JSON on /metrics.json) on this port')
+    parser.add_argument('--metrics-host', default='127.0.0.1')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                        help='Write a JSON metrics snapshot to PATH every --metrics-interval seconds')
+    parser.add_argument('--metrics-interval', type=float, default=10)
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='DEBUG also logs every page and listing')
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    logging.getLogger().setLevel(args.log_level)
+    known_listings = load_known_listings() if args.incremental else None
+    refresh_after = (timedelta(hours=args.refresh_views_after)
+                     if args.refresh_views_after is not None else None)
+    http_cache = None
+    if args.http_cache:
+        from http_cache import HttpCache
+        http_cache = HttpCache(args.http_cache, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                               max_age=args.cache_max_age_days * 24 * 3600, offline=args.offline)
+    elif args.offline:
+        raise SystemExit('--offline requires --http-cache')
+    refresh_fields = None
+    if args.refresh_fields:
+        from partial_fetch import field_list
+        if refresh_after is None:
+            raise SystemExit('--refresh-fields requires --incremental and --refresh-views-after')
+        try:
+            refresh_fields = field_list(args.refresh_fields)
+        except ValueError as e:
+            raise SystemExit(f'--refresh-fields: {e}')
+    fingerprints = None
+    if args.fingerprints:
+        from fingerprint import FingerprintStore
+        fingerprints = FingerprintStore(args.fingerprints)
+    frontier = Frontier(args.frontier)
+    if not args.resume:
+        frontier.reset()
+    elif frontier.is_empty():
+        logger.info("Nothing to resume, starting a fresh crawl")
+    sinks = [JsonlSink(args.stream, append=args.resume, batch_size=args.flush_every)]
+    if args.parquet:
+        sinks.append(ParquetSink(args.parquet, batch_size=args.flush_every))
+    if args.aggregates:
+        from aggregate_store import AggregateSink
+        sinks.append(AggregateSink(args.aggregates, batch_size=args.flush_every))
+    if args.db:
+        from listing_db import ListingDatabaseSink
+        sinks.append(ListingDatabaseSink(args.db, batch_size=args.flush_every))
+    if args.search_index:
+        from search_index import SearchSink
+        sinks.append(SearchSink(args.search_index, batch_size=args.flush_every))
+    if args.dedup:
+        from dedup import DedupSink  # numpy, only when deduplicating
+        sinks.append(DedupSink(args.dedup, batch_size=args.flush_every))
+    if args.views_snapshots:
+        from snapshot_store import SnapshotSink  # numpy, only when recording snapshots
+        sinks.append(SnapshotSink(args.views_snapshots, batch_size=args.flush_every))
+    transport = TransportConfig(limit=args.max_concurrent, keepalive_timeout=args.keepalive,
+                                dns_cache_ttl=args.dns_cache_ttl, connect_timeout=args.connect_timeout,
+                                read_timeout=args.read_timeout, compress=not args.no_compression,
+                                http2=args.http2)
+    image_store = image_stage = None
+    if args.images:
+        from image_stage import ImageStage, ImageStore
+        image_store = ImageStore(args.image_db, args.images)
+    scraper = TemirciScraper(base_url=args.base_url, max_concurrent=args.max_concurrent,
+                             requests_per_second=args.rate,
+                             known_listings=known_listings, refresh_after=refresh_after,
+                             refresh_age_ratio=args.refresh_age_ratio,
+                             http_cache=http_cache, parser=args.parser,
+                             parse_executor=args.parse_executor, parse_workers=args.parse_workers,
+                             sinks=sinks, keep_listings=False, frontier=frontier,
+                             transport=transport, fingerprints=fingerprints,
+                             refresh_fields=refresh_fields)
+    if image_store:
+        image_stage = scraper.image_stage = ImageStage(image_store, concurrency=args.image_concurrency,
+                                                       requests_per_second=args.image_rate,
+                                                       metrics=scraper.metrics)
+        await image_stage.start()
+
+    metrics_runner = None
+    metrics_writer = None
+    if args.metrics_port:
+        metrics_runner = await scraper.metrics.serve(args.metrics_host, args.metrics_port)
+    if args.metrics_json:
+        metrics_writer = asyncio.create_task(
+            scraper.metrics.write_json_periodically(args.metrics_json, args.metrics_interval))
 
     logger.info("Starting scraper...")
-    await scraper.scrape_all()
-
-    logger.info(f"Scraping complete! Total listings: {len(scraper.all_listings)}")
-
-    # Save to both JSON and CSV
-    scraper.save_to_json()
-    scraper.save_to_csv()
+    try:
+        await scraper.scrape_all()
+        if image_stage:
+            await image_stage.close()
+    finally:
+        if metrics_writer:
+            metrics_writer.cancel()
+            await asyncio.gather(metrics_writer, return_exceptions=True)
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        for sink in sinks:
+            sink.close()
+        frontier.close()
+        if image_store:
+            image_store.close()
+        if fingerprints:
+            fingerprints.close()
+        if http_cache:
+            http_cache.close()
+
+    # Rebuild the JSON and CSV files from the stream
+    total = export_stream(args.stream, base_records=(known_listings or {}).values())
+    logger.info(f"Scraping complete! Total listings: {total}")
 
     # Print sample data
-    if scraper.all_listings:
+    sample = next(read_jsonl(args.stream), None)
+    if sample:
         logger.info("\nSample listing:")
-        logger.info(json.dumps(scraper.all_listings[0], ensure_ascii=False, indent=2))
+        logger.info(json.dumps(sample, ensure_ascii=False, indent=2))
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
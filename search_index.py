@@ -0,0 +1,256 @@
+"""
+Full-text search over listing titles and descriptions
+An SQLite FTS5 index of every listing, with Azerbaijani letters folded to
+their transliterated forms (ə/e, ı/i, ş/s, ç/c, ğ/g, ö/o, ü/u) on both the
+indexed text and the query, so "kamera ustası" and "kamera ustasi" find the
+same ads. Listings are upserted as they are scraped (SearchSink) or imported
+from the exported files; a listing whose text did not change is not
+re-indexed. Results are ranked by BM25 with title matches weighted above
+description matches. Category and city are indexed as facet tokens, so
+filters are posting-list intersections inside FTS5 rather than a join.
+
+    python search_index.py build temirci_listings.jsonl
+    python search_index.py query "kamera ustasi" --city baki
+"""
+
+import argparse
+import csv
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+
+from normalize import parse_views
+from sinks import BatchedSink, read_jsonl
+
+logger = logging.getLogger(__name__)
+
+AZERBAIJANI_FOLDING = str.maketrans({
+    'Ə': 'e', 'ə': 'e', 'I': 'i', 'ı': 'i', 'İ': 'i', 'Ş': 's', 'ş': 's', 'Ç': 'c', 'ç': 'c',
+    'Ğ': 'g', 'ğ': 'g', 'Ö': 'o', 'ö': 'o', 'Ü': 'u', 'ü': 'u',
+})
+QUERY_TERM = re.compile(r'\w+')
+NON_WORD = re.compile(r'\W+')
+# BM25 column weights: title, description, facets
+RANK = 'bm25(5.0, 1.0, 0.0)'
+
+
+def fold(text):
+    """Lowercase text with Azerbaijani letters folded to ASCII (other diacritics are left to FTS5)"""
+    if not text:
+        return ''
+    return str(text).translate(AZERBAIJANI_FOLDING).lower()
+
+
+def facet(name, value):
+    """Single-token filter value indexed in the facets column, e.g. city_baki"""
+    return f"{name}_{NON_WORD.sub('_', fold(value)).strip('_')}"
+
+
+def match_expression(query, prefix=True, category=None, city=None):
+    """FTS5 MATCH expression requiring every term of query (the last one also as a prefix)
+    and the category/city facets"""
+    terms = QUERY_TERM.findall(fold(query))
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    if prefix:
+        phrases[-1] += '*'
+    expression = '{title description} : (' + ' AND '.join(phrases) + ')'
+    for name, value in (('category', category), ('city', city)):
+        if value:
+            expression += f' AND facets : "{facet(name, value)}"'
+    return expression
+
+
+class SearchIndex:
+    """FTS5 index of folded title/description text plus the fields results display and filter on"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS documents (
+            ad_id INTEGER PRIMARY KEY,
+            title TEXT,
+            category TEXT,
+            city TEXT,
+            views INTEGER,
+            listing_url TEXT,
+            text_hash TEXT NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+            title, description, facets,
+            tokenize = "unicode61 remove_diacritics 2 tokenchars '_'", prefix = '2 3'
+        );
+    '''
+
+    def __init__(self, path='temirci_search.sqlite', newest=None):
+        self.path = path
+        # Rank only among the newest matches when set; None ranks every match
+        self.newest = newest
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        # ORDER BY rank lets FTS5 keep only the best LIMIT rows while it scores the matches
+        self.conn.execute(f"INSERT INTO search (search, rank) VALUES ('rank', '{RANK}')")
+
+    def upsert_many(self, records):
+        """Index a batch of listings in one transaction; returns how many were (re)indexed"""
+        documents = {}
+        texts = {}
+        for record in records:
+            try:
+                ad_id = int(record['ad_id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            title = fold(record.get('title'))
+            description = fold(record.get('description'))
+            facets = ' '.join(facet(name, record.get(name)) for name in ('category', 'city') if record.get(name))
+            text = (title, description, facets)
+            text_hash = hashlib.blake2b('\0'.join(text).encode('utf-8'), digest_size=8).hexdigest()
+            documents[ad_id] = (ad_id, record.get('title'), record.get('category'), record.get('city'),
+                                parse_views(record.get('views')), record.get('listing_url'), text_hash)
+            texts[ad_id] = text
+        if not documents:
+            return 0
+
+        with self.conn:
+            previous = dict(self.conn.execute(
+                f'SELECT ad_id, text_hash FROM documents WHERE ad_id IN ({",".join("?" * len(documents))})',
+                list(documents)
+            ))
+            changed = [ad_id for ad_id, document in documents.items() if previous.get(ad_id) != document[-1]]
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO documents (ad_id, title, category, city, views, listing_url, text_hash) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                documents.values()
+            )
+            self.conn.executemany('DELETE FROM search WHERE rowid = ?',
+                                  [(ad_id,) for ad_id in changed if ad_id in previous])
+            self.conn.executemany('INSERT INTO search (rowid, title, description, facets) VALUES (?, ?, ?, ?)',
+                                  [(ad_id, *texts[ad_id]) for ad_id in changed])
+        return len(changed)
+
+    def remove(self, ad_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM search WHERE rowid = ?', (ad_id,))
+            self.conn.execute('DELETE FROM documents WHERE ad_id = ?', (ad_id,))
+
+    def import_file(self, path, batch_size=1000):
+        """Index every record of a listings CSV or JSONL file; returns how many were (re)indexed"""
+        if path.endswith('.jsonl'):
+            return self.index_all(read_jsonl(path), batch_size)
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.index_all(csv.DictReader(f), batch_size)
+
+    def index_all(self, records, batch_size=1000):
+        indexed = 0
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                indexed += self.upsert_many(batch)
+                batch = []
+        return indexed + self.upsert_many(batch)
+
+    def optimize(self):
+        """Merge the FTS5 b-tree segments (worth running after a large import)"""
+        with self.conn:
+            self.conn.execute("INSERT INTO search (search) VALUES ('optimize')")
+
+    def search(self, query, category=None, city=None, limit=20, prefix=True):
+        """Best-ranked listings matching every query term, as dicts
+
+        Listings matching the terms exactly come first; when there are fewer
+        than limit of those, the last term is also matched as a prefix.
+        """
+        results = self.ranked(match_expression(query, False, category, city), limit)
+        if prefix and len(results) < limit:
+            seen = {result['ad_id'] for result in results}
+            more = self.ranked(match_expression(query, True, category, city), limit)
+            results += [result for result in more if result['ad_id'] not in seen][:limit - len(results)]
+        return results
+
+    def ranked(self, expression, limit):
+        if expression is None:
+            return []
+        floor = None
+        if self.newest:
+            # BM25 scoring is linear in the number of matches, so optionally rank a query
+            # matching more than self.newest listings among its newest (highest ad_id) ones only
+            floor = self.conn.execute(
+                'SELECT rowid FROM search WHERE search MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?',
+                (expression, self.newest - 1)
+            ).fetchone()
+        rows = self.conn.execute(
+            'SELECT d.ad_id, d.title, d.category, d.city, d.views, d.listing_url, m.snippet, m.rank FROM ('
+            "    SELECT rowid, snippet(search, 1, '[', ']', '...', 12) AS snippet, rank FROM search "
+            '    WHERE search MATCH ? AND rowid >= ? ORDER BY rank LIMIT ?'
+            ') m JOIN documents d ON d.ad_id = m.rowid ORDER BY m.rank',
+            (expression, floor[0] if floor else 0, limit)
+        ).fetchall()
+        columns = ('ad_id', 'title', 'category', 'city', 'views', 'listing_url', 'snippet', 'score')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class SearchSink(BatchedSink):
+    """Streaming sink that indexes every scraped listing as it arrives"""
+
+    def __init__(self, path='temirci_search.sqlite', batch_size=100, **kwargs):
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.index = SearchIndex(path)
+
+    def write_batch(self, records):
+        self.index.upsert_many(records)
+
+    def close(self):
+        super().close()
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the listing search index')
+    parser.add_argument('--index', default='temirci_search.sqlite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Index listings CSV/JSONL files (incremental)')
+    build.add_argument('files', nargs='+')
+    query = commands.add_parser('query', help='Search titles and descriptions')
+    query.add_argument('text')
+    query.add_argument('--category')
+    query.add_argument('--city')
+    query.add_argument('--limit', type=int, default=20)
+    query.add_argument('--exact', action='store_true', help='Do not match the last term as a prefix')
+    query.add_argument('--newest', type=int, metavar='N',
+                       help='Rank only the N newest matches of each query (faster for very common '
+                            'terms; by default every match is ranked)')
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index, newest=getattr(args, 'newest', None))
+    if args.command == 'build':
+        for path in args.files:
+            started = time.perf_counter()
+            indexed = index.import_file(path)
+            print(f"{path}: {indexed} listings (re)indexed in {time.perf_counter() - started:.2f}s")
+        index.optimize()
+        print(f"{args.index}: {index.count()} listings")
+    else:
+        started = time.perf_counter()
+        results = index.search(args.text, category=args.category, city=args.city, limit=args.limit,
+                               prefix=not args.exact)
+        elapsed = time.perf_counter() - started
+        for result in results:
+            print(f"{result['ad_id']:>9}  {result['title']}  [{result['category']}, {result['city']}]")
+            print(f"{'':>11}{' '.join(result['snippet'].split())}")
+        print(f"{len(results)} results in {elapsed * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Streaming output sinks for scraped listings
+Each record is written as soon as it is produced, in batches with periodic
+flushes, so memory stays flat and a crash keeps everything written so far.
+The JSON array and CSV files are rebuilt from the stream when the crawl ends.
+"""
+
+import csv
+import json
+import logging
+import os
+import textwrap
+import time
+
+logger = logging.getLogger(__name__)
+
+LISTING_FIELDS = (
+    'ad_id', 'category', 'title', 'phone', 'city', 'price', 'price_min', 'price_max',
+    'price_currency', 'description', 'views', 'date_posted', 'image_url', 'listing_url', 'scraped_at',
+)
+
+
+class BatchedSink:
+    """Buffers records and flushes every batch_size records or flush_interval seconds"""
+
+    def __init__(self, path, batch_size=100, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.records_written = 0
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.records_written += len(self.buffer)
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write_batch(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+        logger.info(f"Wrote {self.records_written} listings to {self.path}")
+
+
+class JsonlSink(BatchedSink):
+    """One JSON object per line; append=False starts a fresh file"""
+
+    def __init__(self, path='temirci_listings.jsonl', append=False, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write_batch(self, records):
+        self.file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class CsvSink(BatchedSink):
+    """Append-mode CSV; the header is written only when the file is new or empty"""
+
+    def __init__(self, path, append=False, fieldnames=LISTING_FIELDS, **kwargs):
+        super().__init__(path, **kwargs)
+        write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction='ignore')
+        if write_header:
+            self.writer.writeheader()
+
+    def write_batch(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(BatchedSink):
+    """Parquet file with one row group per batch (requires pyarrow)"""
+
+    def __init__(self, path, fieldnames=LISTING_FIELDS, batch_size=1000, **kwargs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.pa = pa
+        self.fieldnames = fieldnames
+        self.schema = pa.schema([(name, pa.string()) for name in fieldnames])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write_batch(self, records):
+        columns = {
+            name: [None if record.get(name) is None else str(record[name]) for record in records]
+            for name in self.fieldnames
+        }
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+def read_jsonl(path):
+    """Yield records from a JSON Lines file, skipping a torn final line"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping truncated line in {path}")
+
+
+def listing_key(record):
+    return (str(record.get('ad_id')), record.get('category'))
+
+
+def latest_records(stream_path, base_records=None):
+    """Yield the last record per (ad_id, category) of a JSONL stream, in stream order
+
+    base_records (e.g. the known listings of an incremental crawl) come first
+    unless the stream holds a newer record with the same ad_id and category.
+    """
+    last_position = {listing_key(record): index for index, record in enumerate(read_jsonl(stream_path))}
+    for record in base_records or ():
+        if listing_key(record) not in last_position:
+            yield record
+    for index, record in enumerate(read_jsonl(stream_path)):
+        if last_position[listing_key(record)] == index:
+            yield record
+
+
+def export_stream(stream_path, json_path='temirci_listings.json', csv_path='temirci_listings.csv',
+                  base_records=None):
+    """Rebuild the JSON array and CSV files from a JSONL stream, one record at a time
+
+    Only the latest record per key is written (see latest_records), so listings
+    re-scraped after a resume or a views refresh are not duplicated. Either
+    output can be skipped by passing None for its path.
+    Returns the number of records exported.
+    """
+    count = 0
+    with open(json_path or os.devnull, 'w', encoding='utf-8') as json_file, \
+            open(csv_path or os.devnull, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=LISTING_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        json_file.write('[')
+        for record in latest_records(stream_path, base_records):
+            # Same layout json.dump(..., indent=2) produces for the whole list
+            json_file.write(',\n' if count else '\n')
+            json_file.write(textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), '  '))
+            writer.writerow(record)
+            count += 1
+        json_file.write('\n]' if count else ']')
+
+    logger.info(f"Exported {count} listings to {' and '.join(path for path in (json_path, csv_path) if path)}")
+    return count
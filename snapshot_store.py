@@ -0,0 +1,442 @@
+"""
+Append-only time series of listing view counts
+Every crawl appends one segment of (ad_id, scraped_at, views) observations
+to a directory of column files. A segment is sorted by ad_id and stored
+delta-encoded in the narrowest integer dtype that fits each column: ad_id
+gaps, seconds since the segment's first observation, and views either as
+counts (keyframe segments) or as the change since the latest keyframe, so a
+segment decodes from itself and at most one keyframe. Columns are
+memory-mapped when read and a range query keeps only the first and last
+observation of each ad, so query memory is O(listings) however many
+snapshots are stored; compact() thins out old snapshots to bound the disk.
+
+Views per day between an ad's first and last observation in a date range
+rank listings by current engagement instead of lifetime views, which
+favour old ads.
+
+    python snapshot_store.py import temirci_listings.csv
+    python snapshot_store.py top --days 30
+    python snapshot_store.py categories --days 30
+"""
+
+import argparse
+import array
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+from normalize import parse_views
+from sinks import BatchedSink, read_jsonl
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+UNSIGNED = (np.uint8, np.uint16, np.uint32, np.uint64)
+SIGNED = (np.int8, np.int16, np.int32, np.int64)
+
+
+def narrowest(values, signed=False):
+    """values cast to the smallest integer dtype that holds all of them"""
+    for dtype in SIGNED if signed else UNSIGNED:
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+
+def to_epoch(value):
+    """Unix seconds from an ISO timestamp (naive ones are local time, as the scraper writes them)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+class Observations:
+    """(ad_id, epoch, views) of scraped records in int64 arrays, plus each ad's category"""
+
+    def __init__(self):
+        self.ad_ids, self.times, self.views = array.array('q'), array.array('q'), array.array('q')
+        self.categories = {}
+
+    def __len__(self):
+        return len(self.ad_ids)
+
+    def add(self, records, observed_at=None):
+        """Keep the observation of every record with an ad_id, a view count and a time"""
+        for record in records:
+            try:
+                ad_id = int(record['ad_id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            count = parse_views(record.get('views'))
+            scraped_at = to_epoch(record.get('scraped_at')) if observed_at is None else observed_at
+            if count is None or scraped_at is None:
+                continue
+            self.ad_ids.append(ad_id)
+            self.times.append(scraped_at)
+            self.views.append(count)
+            self.categories[ad_id] = record.get('category') or self.categories.get(ad_id)
+
+    def columns(self):
+        return self.ad_ids, self.times, self.views, self.categories
+
+
+class SnapshotStore:
+    """Directory of delta-encoded, memory-mapped view count segments with an SQLite manifest"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY,
+            file TEXT NOT NULL,
+            started_at INTEGER NOT NULL,
+            ended_at INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            keyframe_id INTEGER,
+            columns TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_segments_time ON segments (started_at, ended_at);
+        CREATE TABLE IF NOT EXISTS ads (
+            ad_id INTEGER PRIMARY KEY,
+            category TEXT
+        );
+    '''
+
+    def __init__(self, directory='views_snapshots', keyframe_every=7):
+        self.directory = directory
+        # Also a keyframe when fewer than half of a new segment's ads are in the latest keyframe,
+        # since ads missing from it are stored as full counts rather than deltas
+        self.keyframe_every = keyframe_every
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'manifest.sqlite'))
+        self.conn.executescript(self.SCHEMA)
+        self.keyframe_cache = None
+
+    def append(self, ad_ids, times, views, categories=None):
+        """Write one segment of observations (the last one per ad_id wins); returns the segment id"""
+        ad_ids = np.asarray(ad_ids, dtype=np.int64)
+        if not len(ad_ids):
+            return None
+        times = np.asarray(times, dtype=np.int64)
+        views = np.asarray(views, dtype=np.int64)
+        # Last observation of each ad, sorted by ad_id
+        order = np.argsort(ad_ids, kind='stable')[::-1]
+        _, first = np.unique(ad_ids[order], return_index=True)
+        keep = order[first]
+        ad_ids, times, views = ad_ids[keep], times[keep], views[keep]
+
+        latest = self.conn.execute(
+            'SELECT id, COALESCE(keyframe_id, id) FROM segments ORDER BY id DESC LIMIT 1').fetchone()
+        keyframe_id = None
+        if latest:
+            keyframe_id = latest[1]
+            since_keyframe = self.conn.execute(
+                'SELECT COUNT(*) FROM segments WHERE id > ?', (keyframe_id,)).fetchone()[0]
+            key_ads, key_views = self.read_keyframe(keyframe_id)
+            found = np.isin(ad_ids, key_ads)
+            if since_keyframe + 1 >= self.keyframe_every or found.mean() < 0.5:
+                keyframe_id = None
+            else:
+                views = views - self.reference_views(ad_ids, key_ads, key_views)
+        segment_id = self.write_segment(ad_ids, times, views, keyframe_id)
+
+        if categories is not None:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO ads (ad_id, category) VALUES (?, ?) '
+                    'ON CONFLICT (ad_id) DO UPDATE SET category = COALESCE(excluded.category, category)',
+                    [(int(ad_id), categories.get(int(ad_id))) for ad_id in ad_ids]
+                )
+        return segment_id
+
+    def write_segment(self, ad_ids, times, views, keyframe_id, segment_id=None):
+        started_at = int(times.min())
+        encoded = {
+            'ad_gap': narrowest(np.diff(ad_ids, prepend=0)),
+            'offset': narrowest(times - started_at),
+            'views': narrowest(views, signed=keyframe_id is not None),
+        }
+        if segment_id is None:
+            segment_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM segments').fetchone()[0]
+        file = f'segment_{segment_id:06d}_{int(time.time() * 1000)}.bin'
+        path = os.path.join(self.directory, file)
+        columns = {}
+        position = 0
+        with open(path + '.tmp', 'wb') as f:
+            for name, values in encoded.items():
+                columns[name] = (position, values.dtype.str, len(values))
+                f.write(values.tobytes())
+                position += values.nbytes
+        os.replace(path + '.tmp', path)
+        previous = self.conn.execute('SELECT file FROM segments WHERE id = ?', (segment_id,)).fetchone()
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO segments (id, file, started_at, ended_at, rows, keyframe_id, columns) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (segment_id, file, started_at, int(times.max()), len(ad_ids), keyframe_id, json.dumps(columns))
+            )
+        if previous:
+            os.remove(os.path.join(self.directory, previous[0]))
+        self.keyframe_cache = None
+        return segment_id
+
+    def columns(self, file, columns):
+        """Memory-mapped column arrays of a segment file"""
+        path = os.path.join(self.directory, file)
+        return {
+            name: np.memmap(path, dtype=np.dtype(dtype), mode='r', offset=offset, shape=(count,))
+            if count else np.zeros(0, dtype=np.dtype(dtype))
+            for name, (offset, dtype, count) in json.loads(columns).items()
+        }
+
+    @staticmethod
+    def reference_views(ad_ids, key_ads, key_views):
+        """Keyframe views of each ad (0 for ads missing from the keyframe)"""
+        if not len(key_ads):
+            return np.zeros(len(ad_ids), dtype=np.int64)
+        position = np.minimum(np.searchsorted(key_ads, ad_ids), len(key_ads) - 1)
+        return np.where(key_ads[position] == ad_ids, key_views[position], 0)
+
+    def read_keyframe(self, keyframe_id):
+        """(ad_ids, views) of a keyframe segment; the most recent one is kept decoded"""
+        if self.keyframe_cache is None or self.keyframe_cache[0] != keyframe_id:
+            file, columns = self.conn.execute(
+                'SELECT file, columns FROM segments WHERE id = ?', (keyframe_id,)).fetchone()
+            data = self.columns(file, columns)
+            self.keyframe_cache = (keyframe_id, np.cumsum(data['ad_gap'], dtype=np.int64),
+                                   np.asarray(data['views'], dtype=np.int64))
+        return self.keyframe_cache[1:]
+
+    def read(self, segment):
+        """(ad_ids, times, views) of a segments row"""
+        segment_id, file, started_at, keyframe_id, columns = segment
+        data = self.columns(file, columns)
+        ad_ids = np.cumsum(data['ad_gap'], dtype=np.int64)
+        times = started_at + data['offset'].astype(np.int64)
+        views = data['views'].astype(np.int64)
+        if keyframe_id is not None:
+            views += self.reference_views(ad_ids, *self.read_keyframe(keyframe_id))
+        return ad_ids, times, views
+
+    def segments(self, since=None, until=None):
+        return self.conn.execute(
+            'SELECT id, file, started_at, keyframe_id, columns FROM segments '
+            'WHERE ended_at >= ? AND started_at <= ? ORDER BY started_at, id',
+            (since if since is not None else 0, until if until is not None else 2 ** 62)
+        ).fetchall()
+
+    def history(self, ad_id):
+        """[(scraped_at, views)] of one ad, oldest first"""
+        observations = []
+        for segment in self.segments():
+            ad_ids, times, views = self.read(segment)
+            position = np.searchsorted(ad_ids, ad_id)
+            if position < len(ad_ids) and ad_ids[position] == ad_id:
+                observations.append((int(times[position]), int(views[position])))
+        return observations
+
+    def velocity(self, since=None, until=None, min_hours=1.0):
+        """Per-ad views/day between the first and last observation in [since, until] (Unix seconds)
+
+        Returns a dict of equal-length arrays: ad_id, first_at, last_at, views
+        (the last observed count), gained and per_day, for ads observed at least
+        min_hours apart.
+        """
+        universe = np.array([ad_id for (ad_id,) in self.conn.execute('SELECT ad_id FROM ads ORDER BY ad_id')],
+                            dtype=np.int64)
+        segments = self.segments(since, until)
+        if not len(universe):
+            universe = np.unique(np.concatenate([self.read(segment)[0] for segment in segments] or [[]]))
+            universe = universe.astype(np.int64)
+        first_at = np.full(len(universe), -1, dtype=np.int64)
+        first_views = np.zeros(len(universe), dtype=np.int64)
+        last_at = np.full(len(universe), -1, dtype=np.int64)
+        last_views = np.zeros(len(universe), dtype=np.int64)
+        for segment in segments:
+            ad_ids, times, views = self.read(segment)
+            mask = np.ones(len(ad_ids), dtype=bool)
+            if since is not None:
+                mask &= times >= since
+            if until is not None:
+                mask &= times <= until
+            position = np.searchsorted(universe, ad_ids[mask])
+            known = position < len(universe)
+            known[known] = universe[position[known]] == ad_ids[mask][known]
+            position, times, views = position[known], times[mask][known], views[mask][known]
+            new = first_at[position] < 0
+            first_at[position[new]] = times[new]
+            first_views[position[new]] = views[new]
+            last_at[position] = times
+            last_views[position] = views
+
+        spanned = (first_at >= 0) & (last_at - first_at >= min_hours * 3600)
+        gained = (last_views - first_views)[spanned]
+        return {
+            'ad_id': universe[spanned],
+            'first_at': first_at[spanned],
+            'last_at': last_at[spanned],
+            'views': last_views[spanned],
+            'gained': gained,
+            'per_day': gained / ((last_at - first_at)[spanned] / DAY),
+        }
+
+    def top(self, k=15, since=None, until=None):
+        """[(ad_id, category, views_per_day, views)] of the k fastest-growing ads"""
+        result = self.velocity(since, until)
+        best = np.argsort(-result['per_day'], kind='stable')[:k]
+        categories = self.categories(result['ad_id'][best])
+        return [(int(result['ad_id'][i]), categories.get(int(result['ad_id'][i])),
+                 float(result['per_day'][i]), int(result['views'][i])) for i in best]
+
+    def category_velocity(self, since=None, until=None):
+        """[(category, ads, views_per_day, views_per_day_per_ad)], fastest-growing first"""
+        result = self.velocity(since, until)
+        categories = self.categories(result['ad_id'])
+        names, codes = np.unique(np.array([str(categories.get(ad_id)) for ad_id in result['ad_id'].tolist()],
+                                          dtype=object), return_inverse=True)
+        ads = np.bincount(codes, minlength=len(names))
+        totals = np.bincount(codes, weights=result['per_day'], minlength=len(names))
+        rows = [(None if name == 'None' else name, int(count), float(total), float(total) / int(count))
+                for name, count, total in zip(names, ads, totals) if count]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def categories(self, ad_ids):
+        categories = {}
+        ad_ids = [int(ad_id) for ad_id in ad_ids]
+        # SQLite's default limit on bound parameters
+        for start in range(0, len(ad_ids), 999):
+            chunk = ad_ids[start:start + 999]
+            categories.update(self.conn.execute(
+                f'SELECT ad_id, category FROM ads WHERE ad_id IN ({",".join("?" * len(chunk))})', chunk))
+        return categories
+
+    def compact(self, before, interval=7 * DAY):
+        """Keep one snapshot per interval among those that ended before `before`; returns segments removed"""
+        old = self.conn.execute(
+            'SELECT id, started_at FROM segments WHERE ended_at < ? ORDER BY started_at, id', (before,)
+        ).fetchall()
+        kept_buckets = set()
+        drop = set()
+        for segment_id, started_at in old:
+            bucket = started_at // interval
+            if bucket in kept_buckets:
+                drop.add(segment_id)
+            kept_buckets.add(bucket)
+        if not drop:
+            return 0
+        # Segments that stay but decode against a dropped keyframe are rewritten as keyframes
+        for segment in self.conn.execute(
+                f'SELECT id, file, started_at, keyframe_id, columns FROM segments WHERE keyframe_id IN '
+                f'({",".join("?" * len(drop))}) ORDER BY id', list(drop)).fetchall():
+            if segment[0] not in drop:
+                ad_ids, times, views = self.read(segment)
+                self.write_segment(ad_ids, times, views, None, segment_id=segment[0])
+        files = [file for (file,) in self.conn.execute(
+            f'SELECT file FROM segments WHERE id IN ({",".join("?" * len(drop))})', list(drop))]
+        with self.conn:
+            self.conn.execute(f'DELETE FROM segments WHERE id IN ({",".join("?" * len(drop))})', list(drop))
+        for file in files:
+            os.remove(os.path.join(self.directory, file))
+        self.keyframe_cache = None
+        return len(drop)
+
+    def import_records(self, records, observed_at=None):
+        """Append one segment from scraped or exported records; returns how many were stored"""
+        observations = Observations()
+        observations.add(records, observed_at)
+        self.append(*observations.columns())
+        return len(observations)
+
+    def import_file(self, path, observed_at=None):
+        if path.endswith('.jsonl'):
+            return self.import_records(read_jsonl(path), observed_at)
+        with open(path, newline='', encoding='utf-8') as f:
+            return self.import_records(csv.DictReader(f), observed_at)
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(os.path.join(self.directory, file))
+                   for (file,) in self.conn.execute('SELECT file FROM segments'))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class SnapshotSink(BatchedSink):
+    """Streaming sink that appends the view counts of a crawl to a SnapshotStore as one segment
+
+    Each batch is reduced to (ad_id, epoch, views) in int64 arrays (24 bytes
+    per observation, plus each ad's category) as it arrives; the records
+    themselves are not kept. The observations are written when the crawl
+    ends, or early once max_rows are buffered.
+    """
+
+    def __init__(self, path='views_snapshots', batch_size=100, max_rows=1_000_000, **kwargs):
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self.store = SnapshotStore(path)
+        self.max_rows = max_rows
+        self.pending = Observations()
+
+    def write_batch(self, records):
+        self.pending.add(records)
+        if len(self.pending) >= self.max_rows:
+            self.write_segment()
+
+    def write_segment(self):
+        self.store.append(*self.pending.columns())
+        self.pending = Observations()
+
+    def close(self):
+        super().close()
+        self.write_segment()
+        self.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Views snapshot store: import crawls, query views/day')
+    parser.add_argument('--store', default='views_snapshots', metavar='DIR')
+    parser.add_argument('--days', type=float, default=30, help='Query the last DAYS days')
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('import', help='Append each listings CSV/JSONL file as one snapshot')
+    load.add_argument('files', nargs='+')
+    top = commands.add_parser('top', help='Fastest-growing listings by views/day')
+    top.add_argument('-k', type=int, default=15)
+    commands.add_parser('categories', help='Views/day by category')
+    compact = commands.add_parser('compact', help='Thin out old snapshots')
+    compact.add_argument('--older-than-days', type=float, default=90)
+    compact.add_argument('--interval-days', type=float, default=7,
+                         help='Keep one snapshot per this many days among the old ones')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.store)
+    since = time.time() - args.days * DAY
+    started = time.perf_counter()
+    if args.command == 'import':
+        for path in args.files:
+            print(f"{path}: {store.import_file(path)} observations")
+    elif args.command == 'top':
+        for ad_id, category, per_day, views in store.top(args.k, since=since):
+            print(f"{ad_id:>9}  {per_day:>10,.1f} views/day  {views:>9,} views  {category or '-'}")
+    elif args.command == 'categories':
+        for category, ads, per_day, per_ad in store.category_velocity(since=since):
+            print(f"{category or '-':<40}{ads:>7} ads{per_day:>12,.1f} views/day{per_ad:>10,.2f} per ad")
+    else:
+        removed = store.compact(time.time() - args.older_than_days * DAY, int(args.interval_days * DAY))
+        print(f"Removed {removed} snapshots")
+    elapsed = time.perf_counter() - started
+    segments, rows = store.conn.execute('SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM segments').fetchone()
+    print(f"{args.store}: {segments} snapshots, {rows:,} observations, {store.disk_bytes() / 1e6:.1f} MB "
+          f"({elapsed * 1000:.0f} ms)")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Local stub of temirci.az for benchmarks
+Serves a synthetic homepage, paginated category pages and ad pages with the
+same markup the scraper looks for, so crawls can be timed without the live site.
+The catalog is computed lazily, so it scales from a handful of ads to millions,
+and responses can be delayed (with jitter) or fail at a configurable rate.
+Pages recorded in a scraper HTTP cache can be replayed instead.
+
+Run directly to serve a catalog for manual crawls, e.g.
+    python stub_server.py --ads 100000 --port 8080 --latency 0.05 --error-rate 0.01
+    python scraper.py --base-url http://127.0.0.1:8080
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+
+from aiohttp import web
+
+# Category pages link every page up to this many pages, then a window around the current one
+FULL_PAGINATION_PAGES = 10
+
+
+class StubCatalog:
+    """Deterministic synthetic catalog: categories -> pages -> ads
+
+    Ad ids are computed on demand from each category's first id and size, so
+    a million-ad catalog costs no more memory than a small one. With ads set,
+    that many ads are split evenly across the categories; otherwise each
+    category gets between min_pages and max_pages full pages.
+    """
+
+    def __init__(self, categories=6, ads_per_page=12, min_pages=1, max_pages=6, seed=42,
+                 cross_listed=0, ads=None):
+        # cross_listed: the last N ads of each category are ads of the previous category,
+        # like providers that post the same ad under several categories
+        rng = random.Random(seed)
+        self.ads_per_page = ads_per_page
+        self.cross_listed = cross_listed
+        self.categories = []
+        next_ad_id = 1000
+        for index in range(categories):
+            if ads is not None:
+                ad_count = ads // categories + (1 if index < ads % categories else 0)
+            else:
+                ad_count = rng.randint(min_pages, max_pages) * ads_per_page
+            self.categories.append({
+                'index': index,
+                'slug': f'category-{index + 1}',
+                'name': f'Kateqoriya {index + 1}',
+                'total_pages': max(1, -(-ad_count // ads_per_page)),
+                'ad_count': ad_count,
+                'first_ad_id': next_ad_id,
+            })
+            next_ad_id += ad_count
+        self.by_slug = {category['slug']: category for category in self.categories}
+
+    def replaced_count(self, category):
+        """How many trailing ads of a category are cross-listed from the previous one"""
+        if not self.cross_listed or category['index'] == 0:
+            return 0
+        previous = self.categories[category['index'] - 1]
+        return min(self.cross_listed, category['ad_count'], previous['ad_count'])
+
+    def ad_id(self, category, position):
+        own = category['ad_count'] - self.replaced_count(category)
+        if position < own:
+            return category['first_ad_id'] + position
+        return self.ad_id(self.categories[category['index'] - 1], position - own)
+
+    def page_ad_ids(self, category, page_num):
+        start = (page_num - 1) * self.ads_per_page
+        stop = min(start + self.ads_per_page, category['ad_count'])
+        return [self.ad_id(category, position) for position in range(start, stop)]
+
+    @property
+    def total_ads(self):
+        return sum(category['ad_count'] - self.replaced_count(category) for category in self.categories)
+
+    @property
+    def total_pages(self):
+        """Every URL a full crawl has to fetch at least once"""
+        return 1 + sum(category['total_pages'] for category in self.categories) + self.total_ads
+
+
+def render_homepage(catalog):
+    links = ''.join(
+        f'<a class="services" href="/{category["slug"]}.html">{category["name"]}</a>'
+        for category in catalog.categories
+    )
+    return f'<html><body><div class="service_category">{links}</div></body></html>'
+
+
+def pagination_numbers(page_num, total_pages):
+    if total_pages <= FULL_PAGINATION_PAGES:
+        return range(1, total_pages + 1)
+    shown = {1, 2, 3, total_pages, *range(page_num - 2, page_num + 3)}
+    return sorted(num for num in shown if 1 <= num <= total_pages)
+
+
+def render_category_page(catalog, category, page_num):
+    galleries = ''.join(
+        f'<div class="item"><a class="gallery" href="/ads/{ad_id}.html">Elan {ad_id}</a></div>'
+        for ad_id in catalog.page_ad_ids(category, page_num)
+    )
+    pages = ''.join(
+        f'<li><a href="/{category["slug"]}/{num}.html">{num}</a></li>'
+        for num in pagination_numbers(page_num, category['total_pages'])
+    )
+    return (
+        f'<html><body><div class="list">{galleries}</div>'
+        f'<ul class="pagination">{pages}</ul></body></html>'
+    )
+
+
+def render_ad_page(ad_id):
+    return f'''<html><head>
+<meta property="og:title" content="Temirci - usta xidmeti {ad_id}">
+<meta property="og:image" content="https://www.temirci.az/image/elan/{ad_id}.jpg">
+</head><body>
+<h1>usta xidmeti {ad_id}</h1>
+<div class="gallery-price"><span class="price-val">{20 + ad_id % 80}</span> <span class="price-cur">AZN</span></div>
+<div class="city">Şəhər: <b>Bakı</b></div>
+<a href="https://api.whatsapp.com/send/?phone=+99455{ad_id:07d}&amp;text=salam">WhatsApp</a>
+<a href="tel:(055) {ad_id:07d}">Zəng et</a>
+<div class="text">Temir ve qurasdirma xidmeti.<br>Elan {ad_id}</div>
+<div class="info">
+<p class="views">Baxış: <b>{ad_id * 7 % 5000}</b></p>
+<p class="date">Tarix: <b>2024-01-{ad_id % 28 + 1:02d} 10:00</b></p>
+</div>
+</body></html>'''
+
+
+class RecordedPages:
+    """Pages from a scraper HTTP cache (--http-cache), looked up by path on the original site"""
+
+    def __init__(self, cache_path, origin='https://www.temirci.az'):
+        from http_cache import HttpCache
+        self.cache = HttpCache(cache_path, offline=True)
+        self.origin = origin.rstrip('/')
+
+    def get(self, path_qs):
+        for url in (self.origin + path_qs, self.origin) if path_qs == '/' else (self.origin + path_qs,):
+            entry = self.cache.get(url)
+            if entry is not None:
+                return entry['body']
+        return None
+
+
+def create_app(catalog, latency=0.05, jitter=0.0, error_rate=0.0, error_status=503, seed=42,
+               recorded=None):
+    """Build the aiohttp app
+
+    Every response is delayed by `latency` seconds, varied by +/- `jitter`
+    (a fraction of latency); `error_rate` of the requests fail with
+    `error_status`. With `recorded` (a RecordedPages), recorded pages are served
+    instead of the synthetic catalog, with links to the original site rewritten
+    to point at the stub.
+    """
+    app = web.Application()
+    rng = random.Random(seed)
+
+    async def respond(request, body):
+        delay = latency * (1 + jitter * rng.uniform(-1, 1)) if latency else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if error_rate and rng.random() < error_rate:
+            return web.Response(status=error_status, text='stub error')
+        etag = '"' + hashlib.md5(body.encode('utf-8')).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=body, content_type='text/html', headers={'ETag': etag})
+
+    async def homepage(request):
+        return await respond(request, render_homepage(catalog))
+
+    async def category_first_page(request):
+        category = catalog.by_slug.get(request.match_info['slug'])
+        if category is None:
+            raise web.HTTPNotFound()
+        return await respond(request, render_category_page(catalog, category, 1))
+
+    async def category_page(request):
+        category = catalog.by_slug.get(request.match_info['slug'])
+        page_num = int(request.match_info['page'])
+        if category is None or not 1 <= page_num <= category['total_pages']:
+            raise web.HTTPNotFound()
+        return await respond(request, render_category_page(catalog, category, page_num))
+
+    async def ad_page(request):
+        return await respond(request, render_ad_page(int(request.match_info['ad_id'])))
+
+    async def recorded_page(request):
+        body = recorded.get(request.path_qs)
+        if body is None:
+            raise web.HTTPNotFound()
+        return await respond(request, body.replace(recorded.origin, f'{request.scheme}://{request.host}'))
+
+    if recorded is not None:
+        app.router.add_get('/{path:.*}', recorded_page)
+        return app
+    app.router.add_get('/', homepage)
+    app.router.add_get(r'/ads/{ad_id:\d+}.html', ad_page)
+    app.router.add_get(r'/{slug}/{page:\d+}.html', category_page)
+    app.router.add_get(r'/{slug}.html', category_first_page)
+    return app
+
+
+async def start_stub_server(catalog, latency=0.05, host='127.0.0.1', port=0, **options):
+    """Start the stub server in the running loop, return (runner, base_url)
+
+    options are passed to create_app (jitter, error_rate, error_status, seed, recorded).
+    """
+    runner = web.AppRunner(create_app(catalog, latency=latency, **options), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{bound_port}'
+
+
+def add_stub_arguments(parser):
+    parser.add_argument('--ads', type=int, help='Catalog size (default: 1-6 random pages per category)')
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--ads-per-page', type=int, default=12)
+    parser.add_argument('--cross-listed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latency variation as a fraction of --latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--recorded', metavar='PATH', help='Replay pages from a scraper HTTP cache file')
+    parser.add_argument('--origin', default='https://www.temirci.az', help='Site the recorded pages came from')
+
+
+def stub_from_args(args):
+    """(catalog, start_stub_server options) for the arguments from add_stub_arguments"""
+    catalog = StubCatalog(categories=args.categories, ads_per_page=args.ads_per_page,
+                          cross_listed=args.cross_listed, ads=args.ads)
+    options = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+               'error_status': args.error_status}
+    if args.recorded:
+        options['recorded'] = RecordedPages(args.recorded, args.origin)
+    return catalog, options
+
+
+async def serve(args):
+    catalog, options = stub_from_args(args)
+    runner, base_url = await start_stub_server(catalog, host=args.host, port=args.port, **options)
+    source = f"recorded pages from {args.recorded}" if args.recorded else f"{catalog.total_ads} synthetic ads"
+    print(f"Serving {source} on {base_url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stub of temirci.az')
+    add_stub_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Command-line entry point for the scraper and the analytics tools
+
+    python temirci.py crawl [scraper.py options]
+    python temirci.py export --format jsonl -o latest.jsonl
+    python temirci.py charts [generate_charts.py options]
+    python temirci.py stats
+
+Each subcommand imports what it needs when it runs, so the quick ones never
+load aiohttp, numpy, pandas or matplotlib: stats reads the SQLite aggregate
+store (or the listings database) and export streams the JSONL file with the
+standard library (pyarrow only for --format parquet). bench_startup.py
+reports the startup time and imports of each subcommand.
+"""
+
+import argparse
+import os
+
+DEFAULT_OUTPUTS = {
+    'json': 'temirci_listings.json',
+    'csv': 'temirci_listings.csv',
+    'jsonl': 'temirci_listings.latest.jsonl',
+    'parquet': 'temirci_listings.parquet',
+}
+
+
+def crawl(argv):
+    import asyncio
+
+    import scraper
+    asyncio.run(scraper.main(scraper.parse_args(argv)))
+
+
+def charts(argv):
+    import generate_charts
+    generate_charts.main(argv)
+
+
+def export(argv):
+    parser = argparse.ArgumentParser(prog='temirci.py export',
+                                     description='Export the latest record of every listing in the JSONL stream')
+    parser.add_argument('--stream', default='temirci_listings.jsonl', help='JSONL stream written by the crawl')
+    parser.add_argument('--format', choices=list(DEFAULT_OUTPUTS), default='json')
+    parser.add_argument('-o', '--output', help='Output file (default: temirci_listings.<format>)')
+    args = parser.parse_args(argv)
+    output = args.output or DEFAULT_OUTPUTS[args.format]
+    if not os.path.exists(args.stream):
+        raise SystemExit(f"{args.stream} not found; run a crawl first or pass --stream")
+    if os.path.abspath(output) == os.path.abspath(args.stream):
+        raise SystemExit('--output must differ from --stream')
+
+    from sinks import JsonlSink, ParquetSink, export_stream, latest_records
+    if args.format in ('json', 'csv'):
+        count = export_stream(args.stream, json_path=output if args.format == 'json' else None,
+                              csv_path=output if args.format == 'csv' else None)
+    else:
+        sink = JsonlSink(output, batch_size=1000) if args.format == 'jsonl' else ParquetSink(output)
+        for record in latest_records(args.stream):
+            sink.write(record)
+        sink.close()
+        count = sink.records_written
+    print(f"Exported {count} listings to {output}")
+
+
+def stats(argv):
+    parser = argparse.ArgumentParser(prog='temirci.py stats',
+                                     description='Listing counts, views and prices by category and city')
+    parser.add_argument('--csv', default='temirci_listings.csv', help='Listings CSV synced into --aggregates')
+    parser.add_argument('--aggregates', default='temirci_aggregates.sqlite', metavar='PATH')
+    parser.add_argument('--db', metavar='PATH', help='Read the listings database instead of --csv')
+    parser.add_argument('--top', type=int, default=10, help='Rows per table')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        from listing_db import ListingDatabase
+        store = ListingDatabase(args.db)
+    else:
+        from aggregate_store import AggregateStore
+        store = AggregateStore(args.aggregates)
+        if os.path.exists(args.csv):
+            store.sync_csv(args.csv)
+
+    years = [int(row[0]) for row in store.groups('year')]
+    print(f"{store.total()} listings" + (f", posted {min(years)}-{max(years)}" if years else ''))
+    for dimension in ('category', 'city'):
+        rows = sorted(store.groups(dimension), key=lambda row: row[1], reverse=True)[:args.top]
+        print(f"\n{dimension.title():<40}{'listings':>10}{'avg views':>12}"
+              + (f"{'median price':>14}" if dimension == 'category' else ''))
+        for key, listings, views_count, views_sum, price_count, _ in rows:
+            line = f"{key:<40}{listings:>10}{views_sum / views_count if views_count else 0:>12,.0f}"
+            if dimension == 'category':
+                median = store.price_quantile(key, 0.5) if price_count else None
+                line += f"{median:>14,.0f}" if median is not None else f"{'-':>14}"
+            print(line)
+    store.close()
+
+
+COMMANDS = {
+    'crawl': (crawl, 'Scrape temirci.az (takes the scraper.py options)'),
+    'export': (export, 'Write the latest listings from the JSONL stream as JSON, CSV, JSONL or Parquet'),
+    'charts': (charts, 'Render the analytics charts (takes the generate_charts.py options)'),
+    'stats': (stats, 'Print listing counts, average views and median prices'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='temirci.py', description='Temirci.az scraper and analytics tools',
+        epilog='commands:\n' + '\n'.join(f'  {name:<8}{text}' for name, (_, text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Options of the command (temirci.py COMMAND -h)')
+    args = parser.parse_args(argv)
+    COMMANDS[args.command][0](args.args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import json
+
+from listing_db import ListingDatabase
+from normalize import normalize_record
+from sinks import export_stream
+
+
+def test_csv_round_trip_with_unpriced_listings(tmp_path):
+    stream = tmp_path / 'listings.jsonl'
+    records = [
+        {'ad_id': '1', 'category': 'Santexnik', 'price': '50 AZN', 'views': '10', 'date_posted': '2024-01-02'},
+        {'ad_id': '2', 'category': 'Santexnik', 'price': None, 'views': '20', 'date_posted': '2024-01-03'},
+        {'ad_id': '3', 'category': 'Santexnik', 'price': '70 AZN', 'views': '30', 'date_posted': '2024-01-04'},
+    ]
+    stream.write_text(''.join(json.dumps(normalize_record(record)) + '\n' for record in records))
+    csv_path = tmp_path / 'listings.csv'
+    export_stream(str(stream), json_path=None, csv_path=str(csv_path))
+
+    db = ListingDatabase(str(tmp_path / 'listings.sqlite'))
+    assert db.import_file(str(csv_path)) == 3
+    rows = db.conn.execute('SELECT ad_id, price_min, typeof(price_min) FROM listings ORDER BY ad_id').fetchall()
+    assert rows == [(1, 50.0, 'real'), (2, None, 'null'), (3, 70.0, 'real')]
+    assert [group[4] for group in db.groups('category')] == [2]
+    assert db.price_quantile('Santexnik', 0.5) == 60.0
+    db.close()
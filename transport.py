@@ -0,0 +1,221 @@
+"""
+HTTP transport for the scraper
+Builds the client session from one config: a keep-alive connection pool
+sized to the concurrency limit, DNS caching, compressed responses, separate
+connect/read timeouts and, optionally, HTTP/2 through httpx. Trace hooks
+count connection reuse and bytes transferred.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def supports_brotli():
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+class TransportConfig:
+    """Connection pool, DNS, compression and timeout settings"""
+
+    def __init__(self, limit=10, limit_per_host=None, keepalive_timeout=30, dns_cache_ttl=300,
+                 connect_timeout=10, read_timeout=30, total_timeout=60, compress=True, http2=False):
+        self.limit = limit
+        self.limit_per_host = limit_per_host if limit_per_host is not None else limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.compress = compress
+        self.http2 = http2
+
+    def accept_encoding(self):
+        if not self.compress:
+            return 'identity'
+        return 'gzip, deflate, br' if supports_brotli() else 'gzip, deflate'
+
+
+class TransportStats:
+    """Connection reuse and bytes-on-wire counters fed by aiohttp trace hooks"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        # Compressed response size: bytes downloaded under httpx, the sum of Content-Length
+        # headers under aiohttp, whose trace hooks only see decoded chunks
+        self.wire_bytes = 0
+        self.unsized_responses = 0  # aiohttp responses without Content-Length, not in wire_bytes
+        self.body_bytes = 0  # decoded body bytes handed to the scraper
+
+    def trace_config(self):
+        import aiohttp
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self.on_request_end)
+        trace.on_connection_create_end.append(self.on_connection_create_end)
+        trace.on_connection_reuseconn.append(self.on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(self.on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(self.on_dns_cache_miss)
+        trace.on_response_chunk_received.append(self.on_response_chunk_received)
+        return trace
+
+    async def on_request_end(self, session, context, params):
+        self.requests += 1
+        content_length = params.response.headers.get('Content-Length')
+        if content_length and content_length.isdigit():
+            self.wire_bytes += int(content_length)
+        else:
+            self.unsized_responses += 1
+
+    async def on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    async def on_dns_cache_hit(self, session, context, params):
+        self.dns_cache_hits += 1
+
+    async def on_dns_cache_miss(self, session, context, params):
+        self.dns_cache_misses += 1
+
+    async def on_response_chunk_received(self, session, context, params):
+        self.body_bytes += len(params.chunk)
+
+    def reuse_ratio(self):
+        connections = self.connections_created + self.connections_reused
+        return self.connections_reused / connections if connections else 0.0
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': self.reuse_ratio(),
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses,
+            'wire_bytes': self.wire_bytes,
+            'unsized_responses': self.unsized_responses,
+            'body_bytes': self.body_bytes,
+        }
+
+    def log_stats(self):
+        logger.info(
+            f"Transport: {self.requests} requests, {self.connections_created} connections opened, "
+            f"{self.reuse_ratio():.0%} reuse; {self.wire_bytes:,} bytes on wire "
+            f"({self.unsized_responses} responses without Content-Length not counted), "
+            f"{self.body_bytes:,} body bytes"
+        )
+
+
+def create_session(config, stats=None):
+    """Client session for the scraper; an httpx HTTP/2 client when config.http2 is set"""
+    if config.http2:
+        return HttpxSession(config, stats)
+    import aiohttp  # here so `--help` and the other quick commands never load it
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.dns_cache_ttl,
+        use_dns_cache=True,
+        keepalive_timeout=config.keepalive_timeout,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=config.total_timeout,
+        sock_connect=config.connect_timeout,
+        sock_read=config.read_timeout,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={'Accept-Encoding': config.accept_encoding()},
+        auto_decompress=True,
+        trace_configs=[stats.trace_config()] if stats else None,
+    )
+
+
+def iter_body(response, chunk_size=16384):
+    """Async iterator over the decoded body of an aiohttp or HttpxSession response"""
+    if isinstance(response, HttpxResponse):
+        return response.iter_chunked(chunk_size)
+    return response.content.iter_chunked(chunk_size)
+
+
+class HttpxSession:
+    """Minimal aiohttp-style wrapper around httpx.AsyncClient for HTTP/2"""
+
+    def __init__(self, config, stats=None):
+        import httpx
+        self.stats = stats
+        self.client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=config.limit,
+                                max_keepalive_connections=config.limit,
+                                keepalive_expiry=config.keepalive_timeout),
+            timeout=httpx.Timeout(config.total_timeout, connect=config.connect_timeout,
+                                  read=config.read_timeout),
+            headers={'Accept-Encoding': config.accept_encoding()},
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.client.aclose()
+
+    def get(self, url, headers=None, **kwargs):
+        return HttpxResponse(self, url, headers)
+
+
+class HttpxResponse:
+    """Async context manager exposing .status, .headers and .text() like aiohttp"""
+
+    def __init__(self, session, url, headers):
+        self.session = session
+        self.url = url
+        self.request_headers = headers
+        self.response = None
+
+    async def __aenter__(self):
+        client = self.session.client
+        request = client.build_request('GET', self.url, headers=self.request_headers)
+        self.response = await client.send(request, stream=True)
+        self.status = self.response.status_code
+        self.headers = self.response.headers
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.response.aclose()
+        stats = self.session.stats
+        if stats:
+            stats.requests += 1
+            stats.wire_bytes += self.response.num_bytes_downloaded
+
+    async def read(self):
+        body = await self.response.aread()
+        if self.session.stats:
+            self.session.stats.body_bytes += len(body)
+        return body
+
+    async def text(self):
+        await self.read()
+        return self.response.text
+
+    @property
+    def charset(self):
+        return self.response.charset_encoding
+
+    async def iter_chunked(self, chunk_size):
+        async for chunk in self.response.aiter_bytes(chunk_size):
+            if self.session.stats:
+                self.session.stats.body_bytes += len(chunk)
+            yield chunk